@@ -6,7 +6,8 @@ import traceback
 
 warnings.filterwarnings("ignore")
 from helper_functions import *
-from data_analysis_agent import DataAnalysisAgent, DataAnalysisAgentState
+from data_analysis_agent import DataAnalysisAgent, DataAnalysisAgentState, stream_answer
+from plot_agent import wait_for_plot_file
 import os
 
 
@@ -26,8 +27,33 @@ def pretty_print_answer(answer: str | None):
     print(textwrap.fill(str(answer), width=100))
     print("-" * 72)
 
+def print_progress(message: str):
+    print(f"  ... {message}", flush=True)
+
+def stream_and_print_answer(app, state: DataAnalysisAgentState) -> DataAnalysisAgentState:
+    """Print progress lines and the answer tokens as they arrive, and return the final state."""
+    final_state = None
+    streamed = False
+    for event in stream_answer(app, state):
+        if event.kind == "progress":
+            print_progress(event.content)
+        elif event.kind == "token":
+            if not streamed:
+                print("\nAnswer:\n" + "-" * 72)
+                streamed = True
+            print(event.content, end="", flush=True)
+        else:
+            final_state = event.content
+
+    if streamed:
+        print("\n" + "-" * 72)
+    else:
+        # Answers served from a cache arrive whole, without tokens.
+        pretty_print_answer(final_state.get("chat_response"))
+    return final_state
+
 def show_plot_if_any(plot_path: str | None):
-    if not plot_path or not os.path.exists(plot_path):
+    if not wait_for_plot_file(plot_path):
         return
     try:
         from PIL import Image
@@ -49,7 +75,10 @@ def main():
 
     app = DataAnalysisAgent().get_data_analysis_agent()
 
-    memory_messages = []
+    # Bounded conversation memory and the conversation's scan budget, created by the agent on the first turn
+    # and carried forward.
+    memory = None
+    scan_budget = None
 
     while True:
         try:
@@ -67,21 +96,21 @@ def main():
 
         state: DataAnalysisAgentState = {
             "user_question": user_q,
-            "messages": memory_messages,
+            "messages": [],
+            "memory": memory,
+            "scan_budget": scan_budget,
         }
 
         try:
-            final_state = app.invoke(state)
+            final_state = stream_and_print_answer(app, state)
         except Exception as e:
             full_trace = "".join(traceback.format_exception(e))
             print("\n[Error] Sorry—something went wrong processing your question.\n")
             logging.error(full_trace)
             continue
 
-        memory_messages = final_state.get("messages")
-
-        answer = final_state.get("chat_response")
-        pretty_print_answer(answer)
+        memory = final_state.get("memory")
+        scan_budget = final_state.get("scan_budget")
 
         plot_path = final_state.get("plot_file_path")
         show_plot_if_any(plot_path)
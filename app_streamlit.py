@@ -1,3 +1,4 @@
+import io
 import traceback
 from datetime import datetime
 
@@ -7,7 +8,9 @@ setup_logging()
 import streamlit as st
 from PIL import Image
 
-from data_analysis_agent import DataAnalysisAgent, DataAnalysisAgentState
+from data_analysis_agent import DataAnalysisAgent, DataAnalysisAgentState, stream_answer, get_streaming_metrics
+from plot_agent import get_plot_artifact_store
+from tracing import get_tracer
 
 # ---------------- UI Setup ----------------
 st.set_page_config(page_title="Data Analysis Chat", page_icon="💬", layout="wide")
@@ -29,6 +32,12 @@ if "agent" not in st.session_state:
 if "chat" not in st.session_state:
     st.session_state.chat = []
 
+if "agent_memory" not in st.session_state:
+    st.session_state.agent_memory = None
+
+if "agent_scan_budget" not in st.session_state:
+    st.session_state.agent_scan_budget = None
+
 if "agent_messages" not in st.session_state:
     st.session_state.agent_messages = []
 
@@ -39,12 +48,23 @@ def render_message(role: str, content: str, plot_path: str | None = None):
     """
     with st.chat_message("user" if role == "user" else "assistant"):
         st.markdown(content if content else "")
-        if plot_path and os.path.exists(plot_path):
-            st.image(Image.open(plot_path), caption=os.path.basename(plot_path), use_column_width=True)
-            with open(plot_path, "rb") as f:
-                st.download_button("Download plot", f, file_name=os.path.basename(plot_path), key=f"dl-{plot_path}-{os.path.getmtime(plot_path)}")
-        elif plot_path:
-            st.info(f"Plot path returned but file not found: `{plot_path}`")
+        render_plot(plot_path)
+
+def render_plot(plot_path: str | None):
+    """
+    Render an optional plot image + download button inside the current container.
+    """
+    if not plot_path:
+        return
+    store = get_plot_artifact_store()
+    key = store.key_from_path(plot_path)
+    artifact = store.get(key)
+    png_bytes = store.load(key) if artifact is not None else None
+    if png_bytes is not None:
+        st.image(Image.open(io.BytesIO(png_bytes)), caption=artifact.question, use_column_width=True)
+        st.download_button("Download plot", png_bytes, file_name=f"plot-{key[:12]}.png", mime="image/png", key=f"dl-{key}")
+    else:
+        st.info(f"Plot `{key[:12]}` is no longer in the plot store.")
 
 def append_and_render(role: str, content: str, plot_path: str | None = None):
     st.session_state.chat.append({"role": role, "content": content, "plot_path": plot_path})
@@ -63,30 +83,61 @@ if prompt:
     # 2) Build agent state
     state: DataAnalysisAgentState = {
         "user_question": prompt,
-        "messages": st.session_state.agent_messages,  # pass prior memory to agent
+        "messages": [],  # this turn's log
+        "memory": st.session_state.agent_memory,  # pass prior memory to agent
+        "scan_budget": st.session_state.agent_scan_budget,  # bytes scanned so far in this conversation
     }
 
-    # 3) Invoke agent
-    try:
-        with st.spinner("Thinking…"):
-            final_state = st.session_state.agent.invoke(state)
-    except Exception as e:
-        st.error("Sorry—something went wrong.")
-        if show_debug:
-            st.exception(e)
-            st.code("".join(traceback.format_exception(e)), language="text")
-        # Add an assistant error bubble
-        append_and_render("assistant", "An error occurred. Please try again.")
-    else:
-        # 4) Persist agent memory + render assistant message and plot
-        st.session_state.agent_messages = final_state.get("messages", st.session_state.agent_messages)
-        answer = final_state.get("chat_response") or "_No answer returned._"
-        plot_path = final_state.get("plot_file_path")
-        append_and_render("assistant", answer, plot_path)
+    # 3) Stream the agent: progress lines in a status box, answer tokens into the assistant bubble
+    with st.chat_message("assistant"):
+        status = st.status("Thinking…", expanded=False)
+        answer_placeholder = st.empty()
+        streamed_answer = ""
+        final_state = None
+        try:
+            for event in stream_answer(st.session_state.agent, state):
+                if event.kind == "progress":
+                    status.update(label=event.content)
+                    status.write(event.content)
+                elif event.kind == "token":
+                    streamed_answer += event.content
+                    answer_placeholder.markdown(streamed_answer + "▌")
+                else:
+                    final_state = event.content
+        except Exception as e:
+            status.update(label="Failed", state="error")
+            answer_placeholder.markdown("An error occurred. Please try again.")
+            st.error("Sorry—something went wrong.")
+            if show_debug:
+                st.exception(e)
+                st.code("".join(traceback.format_exception(e)), language="text")
+            st.session_state.chat.append({"role": "assistant", "content": "An error occurred. Please try again.", "plot_path": None})
+        else:
+            status.update(label="Done", state="complete")
+            # 4) Persist agent memory + show the full answer and the plot
+            st.session_state.agent_memory = final_state.get("memory", st.session_state.agent_memory)
+            st.session_state.agent_scan_budget = final_state.get("scan_budget", st.session_state.agent_scan_budget)
+            st.session_state.agent_messages = final_state.get("messages", st.session_state.agent_messages)
+            answer = final_state.get("chat_response") or "_No answer returned._"
+            plot_path = final_state.get("plot_file_path")
+            answer_placeholder.markdown(answer)
+            render_plot(plot_path)
+            st.session_state.chat.append({"role": "assistant", "content": answer, "plot_path": plot_path})
 
 # ---------------- Debug Panel ----------------
 if show_debug:
     st.divider()
     st.subheader("Debug")
-    st.write("Agent memory/messages:")
+    st.write("Streaming (time to first token / total, seconds):")
+    st.write(get_streaming_metrics().stats())
+    st.write("Plot store:")
+    st.write(get_plot_artifact_store().stats())
+    st.write("Last turn trace (per span, slowest first):")
+    st.dataframe(get_tracer().summary(), use_container_width=True)
+    if get_tracer().export_path:
+        st.caption(f"Traces are exported as OTLP JSON to `{get_tracer().export_path}`.")
+    st.write("Agent memory:")
+    if st.session_state.agent_memory is not None:
+        st.write(st.session_state.agent_memory.history_messages())
+    st.write("Last turn messages:")
     st.write(st.session_state.agent_messages)
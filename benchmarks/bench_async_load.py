@@ -0,0 +1,107 @@
+"""Load-test the data analysis graph with fake Gemini and BigQuery stand-ins (see benchmarks/fakes.py).
+
+Runs N concurrent sessions (one question each) through the compiled graph with `ainvoke` on one event loop,
+and the same N questions one after another with the blocking `invoke` path as a baseline. Nothing leaves
+the machine: LLM calls and query jobs only sleep for the simulated latencies.
+
+Run from the project root:
+    python -m benchmarks.bench_async_load --sessions 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+import data_analysis_agent.agent
+import plot_agent.agent
+import plot_agent.artifact_store
+import sql_agent.agent
+from benchmarks.fakes import FakeBigQueryClient, FakeChatModel
+from bq_client import get_big_query_runner
+from data_analysis_agent import DataAnalysisAgent
+from schema_catalog import get_schema_catalog
+
+
+def build_graph(llm_latency_seconds: float, job_latency_seconds: float, with_plots: bool):
+    def fake_llm(model: str, cache=None) -> FakeChatModel:
+        return FakeChatModel(model=model, latency_seconds=llm_latency_seconds, with_plots=with_plots)
+
+    for module in (sql_agent.agent, plot_agent.agent, data_analysis_agent.agent):
+        module.ChatGoogleGenerativeAI = fake_llm
+
+    get_big_query_runner()._client = FakeBigQueryClient(job_latency_seconds=job_latency_seconds)
+    get_schema_catalog().refresh_interval_seconds = float("inf")
+    # Plots go to a throwaway artifact store instead of plot_agent/plots.
+    plot_agent.artifact_store._plot_artifact_store = plot_agent.artifact_store.PlotArtifactStore(
+        directory=tempfile.mkdtemp(prefix="bench-plots-")
+    )
+
+    agent = DataAnalysisAgent()
+    # Every session asks a different question; the question cache would only hide the work being measured.
+    agent.question_cache_enabled = False
+    return agent.get_data_analysis_agent()
+
+
+def make_states(run: str, sessions: int) -> list:
+    return [
+        {"user_question": f"load-test {run} session {i} orders per day by category", "messages": []}
+        for i in range(sessions)
+    ]
+
+
+def run_sync(graph, states: list) -> tuple:
+    latencies = []
+    start = time.perf_counter()
+    for state in states:
+        question_start = time.perf_counter()
+        graph.invoke(state)
+        latencies.append(time.perf_counter() - question_start)
+    return time.perf_counter() - start, latencies
+
+
+async def run_async(graph, states: list) -> tuple:
+    async def one_session(state: dict) -> float:
+        question_start = time.perf_counter()
+        await graph.ainvoke(state)
+        return time.perf_counter() - question_start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one_session(state) for state in states))
+    return time.perf_counter() - start, list(latencies)
+
+
+def report(mode: str, sessions: int, elapsed: float, latencies: list) -> None:
+    print(f"{mode:>6} {sessions:>8} {elapsed:>9.2f} {sessions / elapsed:>10.2f} "
+          f"{statistics.median(latencies):>8.2f} {max(latencies):>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--job-latency", type=float, default=0.2, help="Simulated seconds per BigQuery job")
+    parser.add_argument("--sync-max-sessions", type=int, default=10,
+                        help="Only run the sequential baseline up to this many sessions")
+    parser.add_argument("--no-plots", action="store_true", help="Skip the plot agent")
+    args = parser.parse_args()
+
+    graph = build_graph(args.llm_latency, args.job_latency, with_plots=not args.no_plots)
+    try:
+        print(f"{'mode':>6} {'sessions':>8} {'elapsed s':>9} {'questions/s':>10} {'p50 s':>8} {'max s':>8}")
+        for sessions in args.sessions:
+            if sessions <= args.sync_max_sessions:
+                elapsed, latencies = run_sync(graph, make_states("sync", sessions))
+                report("sync", sessions, elapsed, latencies)
+            elapsed, latencies = asyncio.run(run_async(graph, make_states("async", sessions)))
+            report("async", sessions, elapsed, latencies)
+    finally:
+        shutil.rmtree(plot_agent.artifact_store.get_plot_artifact_store().directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
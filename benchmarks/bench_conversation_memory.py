@@ -0,0 +1,107 @@
+"""Compare the memory carried between turns by the old message list and by ConversationMemory over a long session.
+
+Each turn builds the same prompts the data analysis agent builds (real templates and SQL_tables_summary.txt, no
+LLM or BigQuery calls) with scripted answers. The old strategy appends every turn's log, including full system
+prompts, to one list that is carried forward and filtered on every turn; the new one carries a ConversationMemory
+and keeps system prompts by reference in a per-turn log.
+
+Run from the project root:
+    python -m benchmarks.bench_conversation_memory --turns 200
+"""
+import argparse
+import gc
+import json
+import os
+import pickle
+import time
+import tracemalloc
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, filter_messages
+
+from data_analysis_agent.memory import ConversationMemory, get_prompt_store
+from helper_functions import truncate_message
+
+
+def load_prompts(project_root: str) -> tuple:
+    with open(os.path.join(project_root, "data_analysis_agent", "files", "system_prompts.json"), "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    with open(os.path.join(project_root, "SQL_tables_summary.txt"), "r", encoding="utf-8") as f:
+        schema = f.read()
+    return prompts, schema
+
+
+def turn_texts(turn: int) -> tuple:
+    question = f"Turn {turn}: how many orders per day did we get by traffic source over the last {turn % 30 + 1} days?"
+    explore = f"Count daily orders per traffic source for the last {turn % 30 + 1} days (turn {turn})."
+    answer = " ".join(f"Day {day}: {100 + turn + day} orders, mostly from Search and Organic." for day in range(12))
+    return question, explore, answer
+
+
+def run_legacy_turn(messages: list, prompts: dict, schema: str, turn: int) -> float:
+    question, explore, answer = turn_texts(turn)
+    start = time.perf_counter()
+    memory = filter_messages(messages, include_ids=['0', '1'])[-10:]
+    memory = [truncate_message(m, max_words=50) for m in memory]
+    history_seconds = time.perf_counter() - start
+    messages.append(HumanMessage(content=f"user_question:\n{question}", id="0"))
+    messages.append(SystemMessage(content=prompts["supervisor"].format(chat_history=memory, format_instructions="", sql_description=schema), id="2"))
+    messages.append(AIMessage(content=explore, id="3"))
+    messages.append(SystemMessage(content=prompts["explorer"].format(current_time="", format_instructions="", sql_description=schema), id="2"))
+    messages.append(AIMessage(content=json.dumps({"questions_for_sql_agent": [explore], "plot_description": ""}), id="3"))
+    messages.append(SystemMessage(content=prompts["final_answer_generator"].format(
+        questions_and_answers_fetched_from_sql=answer, plot_analysis_fetched_from_plot_agent="None"), id="2"))
+    messages.append(AIMessage(content=answer, id="1"))
+    return history_seconds
+
+
+def run_memory_turn(memory: ConversationMemory, prompts: dict, schema: str, turn: int) -> float:
+    question, explore, answer = turn_texts(turn)
+    store = get_prompt_store()
+    start = time.perf_counter()
+    history = memory.history_messages()
+    history_seconds = time.perf_counter() - start
+    messages = [HumanMessage(content=f"user_question:\n{question}", id="0")]
+    messages.append(store.reference("supervisor", prompts["supervisor"].format(chat_history=history, format_instructions="", sql_description=schema)))
+    messages.append(AIMessage(content=explore, id="3"))
+    messages.append(store.reference("explorer", prompts["explorer"].format(current_time="", format_instructions="", sql_description=schema)))
+    messages.append(AIMessage(content=json.dumps({"questions_for_sql_agent": [explore], "plot_description": ""}), id="3"))
+    messages.append(store.reference("final answer generator", prompts["final_answer_generator"].format(
+        questions_and_answers_fetched_from_sql=answer, plot_analysis_fetched_from_plot_agent="None")))
+    messages.append(AIMessage(content=answer, id="1"))
+    memory.add_turn(question, answer)
+    return history_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    prompts, schema = load_prompts(project_root)
+    checkpoints = sorted({10, 50, 100, args.turns} & set(range(1, args.turns + 1)))
+
+    # carried KB: pickled size of what the front end keeps between turns.
+    # heap KB: live Python allocations of the run (for "memory" this includes the shared prompt store).
+    # history ms: time to build the supervisor's chat history on that turn.
+    print(f"{'strategy':>8} {'turns':>6} {'carried KB':>11} {'heap KB':>9} {'history ms':>11}")
+    for strategy in ("messages", "memory"):
+        gc.collect()
+        tracemalloc.start()
+        carried = [] if strategy == "messages" else ConversationMemory()
+        for turn in range(1, args.turns + 1):
+            if strategy == "messages":
+                history_seconds = run_legacy_turn(carried, prompts, schema, turn)
+            else:
+                history_seconds = run_memory_turn(carried, prompts, schema, turn)
+            if turn in checkpoints:
+                gc.collect()
+                heap_kb = tracemalloc.get_traced_memory()[0] / 1024
+                carried_kb = len(pickle.dumps(carried)) / 1024
+                print(f"{strategy:>8} {turn:>6} {carried_kb:>11.1f} {heap_kb:>9.1f} {history_seconds * 1000:>11.3f}")
+        del carried
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
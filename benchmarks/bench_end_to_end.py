@@ -0,0 +1,341 @@
+"""End-to-end benchmark of the data analysis graph on a fixed corpus of questions, fully offline.
+
+Gemini is replaced by ScriptedChatModel, which replays the responses recorded in files/e2e_corpus.json (including
+failing first SQL attempts, so the retry loop is exercised), and BigQuery by the DuckDB backend running the recorded
+SQL on a seeded synthetic snapshot behind a simulated job latency (see benchmarks/fakes.py). Every corpus question
+is asked --repeat times, --concurrency sessions at a time, with the query cache and plot store emptied between
+rounds. The JSON report holds end-to-end p50/p95, per-node wall times and LLM calls, retries, query counts,
+memory and the last round's answers (the SQL agents' answers and the final answer per question); pass an earlier
+report as --baseline to print the changes. --direct-evidence runs the SQL agents in direct evidence mode, so the two
+modes can be compared on latency, LLM calls and the evidence that reaches the final answer. --sql-candidates K
+turns on speculative SQL generation (K candidates per attempt) in the SQL and plot agents.
+
+Run from the project root:
+    python -m benchmarks.bench_end_to_end --repeat 5 --output e2e_report.json
+    python -m benchmarks.bench_end_to_end --repeat 5 --baseline e2e_report.json
+    python -m benchmarks.bench_end_to_end --repeat 5 --direct-evidence --baseline e2e_report.json
+    python -m benchmarks.bench_end_to_end --repeat 5 --sql-candidates 3 --baseline e2e_report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+import data_analysis_agent.agent
+import plot_agent.agent
+import plot_agent.artifact_store
+import sql_agent.agent
+from benchmarks.fakes import DelayedClient, ScriptedChatModel, write_synthetic_snapshot
+from bq_client import get_big_query_runner
+from data_analysis_agent import DataAnalysisAgent
+from plot_agent import PlotAgent
+from speculative_sql import SpeculativeSqlGenerator
+from sql_agent import SqlAgent
+from duckdb_backend import DuckDBClient
+from schema_catalog import get_schema_catalog
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Records the wall time of every graph node run and the LLM calls made inside each node.
+
+    Nodes are named by their graph path, e.g. "SQL agent/SQL query generator", so the nodes of the sub-agents are
+    told apart from the top-level ones.
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.llm_calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._started: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def node_path(metadata: Optional[dict]) -> Optional[str]:
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if node is None:
+            return None
+        namespace = metadata.get("langgraph_checkpoint_ns", "").split("|")[:-1]
+        return "/".join([part.split(":")[0] for part in namespace if ":" in part] + [node])
+
+    def on_chain_start(self, serialized: Any, inputs: Any, *, run_id: Any, metadata: Optional[dict] = None,
+                       **kwargs: Any) -> None:
+        node = self.node_path(metadata)
+        if node is not None and kwargs.get("name") == (metadata or {}).get("langgraph_node"):
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id: Any, failed: bool) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            node, start = started
+            self.durations[node].append(time.perf_counter() - start)
+            if failed:
+                self.errors[node] += 1
+
+    def on_chain_end(self, outputs: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id, failed=False)
+
+    def on_chain_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id, failed=True)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: Any, metadata: Optional[dict] = None,
+                            **kwargs: Any) -> None:
+        node = self.node_path(metadata)
+        if node is not None:
+            with self._lock:
+                self.llm_calls[node] += 1
+
+
+def percentiles(values: List[float]) -> dict:
+    return {
+        "p50_s": round(float(np.percentile(values, 50)), 4),
+        "p95_s": round(float(np.percentile(values, 95)), 4),
+        "mean_s": round(float(np.mean(values)), 4),
+        "max_s": round(float(np.max(values)), 4),
+    }
+
+
+def parse_node_latency(value: str) -> tuple:
+    node, _, seconds = value.rpartition("=")
+    if not node:
+        raise argparse.ArgumentTypeError("expected NODE=SECONDS")
+    return node, float(seconds)
+
+
+def build_graph(corpus: list, snapshot_dir: str, plot_directory: str, llm_latency_seconds: float,
+                node_latency_seconds: dict, job_latency_seconds: float, direct_evidence: bool = False,
+                sql_candidates: int = 1) -> tuple:
+    def scripted_llm(model: str, cache=None) -> ScriptedChatModel:
+        return ScriptedChatModel(model=model, latency_seconds=llm_latency_seconds,
+                                 node_latency_seconds=node_latency_seconds, script=corpus)
+
+    for module in (sql_agent.agent, plot_agent.agent, data_analysis_agent.agent):
+        module.ChatGoogleGenerativeAI = scripted_llm
+
+    client = DelayedClient(DuckDBClient(snapshot_dir), job_latency_seconds=job_latency_seconds)
+    runner = get_big_query_runner()
+    runner._client = client
+    runner.backend = "duckdb"
+    get_schema_catalog().refresh_interval_seconds = float("inf")
+    # Plots go to a throwaway artifact store instead of plot_agent/plots.
+    plot_agent.artifact_store._plot_artifact_store = plot_agent.artifact_store.PlotArtifactStore(directory=plot_directory)
+
+    agent = DataAnalysisAgent()
+    # Repeated questions should run the whole pipeline, not be answered from the question cache.
+    agent.question_cache_enabled = False
+    if direct_evidence or sql_candidates > 1:
+        sql, plot = SqlAgent(), PlotAgent()
+        sql.direct_evidence = direct_evidence
+        for sub_agent in (sql, plot):
+            if sql_candidates > 1:
+                sub_agent.speculative_sql = SpeculativeSqlGenerator(sub_agent.sota_llm, sub_agent.big_query_runner, sql_candidates)
+        agent.sql_agent = sql.get_sql_agent()
+        agent.plot_agent = plot.get_plot_agent()
+    return agent.get_data_analysis_agent(), client
+
+
+def reset_caches() -> None:
+    """Empty the query cache and the plot store, so every round measures cold runs."""
+    get_big_query_runner().query_cache.clear()
+    plot_agent.artifact_store.get_plot_artifact_store().clear()
+
+
+async def run_round(graph, corpus: list, concurrency: int, timer: Optional[NodeTimer]) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    config = {"callbacks": [timer]} if timer is not None else None
+
+    async def one_question(entry: dict) -> tuple:
+        async with semaphore:
+            start = time.perf_counter()
+            final_state = await graph.ainvoke({"user_question": entry["question"], "messages": []}, config=config)
+            return entry["question"], time.perf_counter() - start, final_state
+
+    return await asyncio.gather(*(one_question(entry) for entry in corpus))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def candidates_per_attempt(node: str, args: argparse.Namespace) -> int:
+    return args.sql_candidates if node.endswith("SQL query generator") else 1
+
+
+def build_report(args: argparse.Namespace, corpus: list, latencies: list, elapsed: float, timer: NodeTimer,
+                 client: DelayedClient, memory: dict) -> dict:
+    per_question = defaultdict(list)
+    answers = {}
+    for question, seconds, final_state in latencies:
+        per_question[question].append(seconds)
+        answers[question] = {
+            "sql_agent_response": final_state.get("sql_agent_response"),
+            "chat_response": final_state.get("chat_response"),
+        }
+
+    nodes = {}
+    for node in sorted(timer.durations):
+        calls = len(timer.durations[node])
+        llm_calls = timer.llm_calls.get(node, 0)
+        nodes[node] = {
+            "calls": calls,
+            "llm_calls": llm_calls,
+            # The SQL and plot script generators call the LLM once per attempt; speculative SQL generation
+            # calls it once per candidate.
+            "retries": max(0, llm_calls - calls * candidates_per_attempt(node, args)) if node.endswith("generator") else 0,
+            "errors": timer.errors.get(node, 0),
+            "total_s": round(sum(timer.durations[node]), 4),
+            **percentiles(timer.durations[node]),
+        }
+
+    return {
+        "benchmark": "end_to_end",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "corpus_questions": len(corpus),
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "llm_latency_s": args.llm_latency,
+            "node_latency_s": dict(args.node_latency),
+            "job_latency_s": args.job_latency,
+            "seed": args.seed,
+            "direct_evidence": args.direct_evidence,
+            "sql_candidates": args.sql_candidates,
+        },
+        "end_to_end": {
+            "runs": len(latencies),
+            "elapsed_s": round(elapsed, 4),
+            "questions_per_second": round(len(latencies) / elapsed, 4),
+            **percentiles([seconds for _, seconds, _ in latencies]),
+        },
+        "questions": {question: percentiles(values) for question, values in per_question.items()},
+        "nodes": nodes,
+        "retries": sum(node["retries"] for node in nodes.values()),
+        "llm_calls": sum(node["llm_calls"] for node in nodes.values()),
+        "queries": {"executed": client.queries, "failed": client.failed_queries, "dry_runs": client.dry_runs},
+        "memory": memory,
+        "answers": answers,
+    }
+
+
+def print_report(report: dict) -> None:
+    e2e = report["end_to_end"]
+    print(f"{e2e['runs']} runs in {e2e['elapsed_s']:.2f} s ({e2e['questions_per_second']:.2f} questions/s), "
+          f"p50 {e2e['p50_s']:.3f} s, p95 {e2e['p95_s']:.3f} s, {report['llm_calls']} LLM calls, {report['retries']} retries, "
+          f"max RSS {report['memory']['max_rss_mb']:.0f} MB")
+    print(f"{'node':<45} {'calls':>6} {'llm':>5} {'retries':>7} {'p50 s':>8} {'p95 s':>8} {'total s':>8}")
+    for node, stats in report["nodes"].items():
+        print(f"{node:<45} {stats['calls']:>6} {stats['llm_calls']:>5} {stats['retries']:>7} "
+              f"{stats['p50_s']:>8.3f} {stats['p95_s']:>8.3f} {stats['total_s']:>8.2f}")
+
+
+def print_comparison(report: dict, baseline: dict) -> None:
+    rows = [("end to end p50", baseline["end_to_end"]["p50_s"], report["end_to_end"]["p50_s"]),
+            ("end to end p95", baseline["end_to_end"]["p95_s"], report["end_to_end"]["p95_s"]),
+            ("LLM calls", baseline.get("llm_calls"), report["llm_calls"]),
+            ("retries", baseline["retries"], report["retries"]),
+            ("max RSS MB", baseline["memory"]["max_rss_mb"], report["memory"]["max_rss_mb"])]
+    for node in sorted(set(report["nodes"]) | set(baseline["nodes"])):
+        rows.append((f"{node} p50", baseline["nodes"].get(node, {}).get("p50_s"), report["nodes"].get(node, {}).get("p50_s")))
+
+    print(f"\ncompared with {baseline.get('git_commit')} ({baseline.get('created_at')})")
+    print(f"{'metric':<50} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else "-"
+        print(f"{metric:<50} {before if before is not None else '-':>10} {after if after is not None else '-':>10} {change:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "files", "e2e_corpus.json"))
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured rounds run first")
+    parser.add_argument("--concurrency", type=int, default=1, help="Questions in flight at a time")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--node-latency", type=parse_node_latency, action="append", default=[],
+                        metavar="NODE=SECONDS", help="Simulated LLM latency of one node, e.g. 'explorer=0.5'")
+    parser.add_argument("--job-latency", type=float, default=0.2, help="Simulated seconds per BigQuery job")
+    parser.add_argument("--direct-evidence", action="store_true",
+                        help="Let the SQL agents return their query results instead of an LLM-written answer")
+    parser.add_argument("--sql-candidates", type=int, default=1,
+                        help="SQL candidates generated and dry-run in parallel per attempt (1: serial retries)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic snapshot")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report the tracemalloc peak (slower)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare with")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    snapshot_dir = write_synthetic_snapshot(tempfile.mkdtemp(prefix="bench-snapshot-"), seed=args.seed)
+    plot_directory = tempfile.mkdtemp(prefix="bench-plots-")
+    try:
+        rss_before = max_rss_mb()
+        graph, client = build_graph(corpus, snapshot_dir, plot_directory, args.llm_latency, dict(args.node_latency), args.job_latency,
+                                    direct_evidence=args.direct_evidence, sql_candidates=args.sql_candidates)
+        for _ in range(args.warmup):
+            reset_caches()
+            asyncio.run(run_round(graph, corpus, args.concurrency, timer=None))
+        client.queries = client.failed_queries = client.dry_runs = 0
+
+        if args.trace_memory:
+            tracemalloc.start()
+        timer = NodeTimer()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            reset_caches()
+            latencies.extend(asyncio.run(run_round(graph, corpus, args.concurrency, timer)))
+        elapsed = time.perf_counter() - start
+
+        memory = {"max_rss_mb": round(max_rss_mb(), 1), "rss_growth_mb": round(max_rss_mb() - rss_before, 1)}
+        if args.trace_memory:
+            memory["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+            tracemalloc.stop()
+
+        report = build_report(args, corpus, latencies, elapsed, timer, client, memory)
+        print_report(report)
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                print_comparison(report, json.load(f))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            print(f"\nreport written to {args.output}")
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        shutil.rmtree(plot_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
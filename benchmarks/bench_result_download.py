@@ -0,0 +1,109 @@
+"""Benchmark BigQueryRunner result downloads: REST row paging vs Arrow record batches.
+
+Uses a local stand-in for `RowIterator` so no BigQuery job is needed. The REST path pages rows
+as JSON with string-encoded values (as `tabledata.list` does), the fast path serves Arrow record batches.
+
+Run from the project root:
+    python -m benchmarks.bench_result_download --rows 200000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from bq_client import BigQueryRunner
+
+
+class ArrowBatchRowIterator:
+    """Serves a pyarrow Table either as REST-style JSON pages or as Arrow record batches."""
+
+    def __init__(self, table: pa.Table, page_size: int = 10000, batch_size: int = 65536) -> None:
+        self.table = table
+        self.total_rows = table.num_rows
+        self.page_size = page_size
+        self.batch_size = batch_size
+
+    def _rest_pages(self):
+        for offset in range(0, self.table.num_rows, self.page_size):
+            page = self.table.slice(offset, self.page_size).to_pylist()
+            payload = json.dumps({"rows": [{"f": [{"v": None if v is None else str(v)} for v in row.values()]} for row in page]})
+            yield json.loads(payload)["rows"]
+
+    def _rest_dataframe(self) -> pd.DataFrame:
+        columns = self.table.column_names
+        types = [self.table.schema.field(name).type for name in columns]
+        records = []
+        for rows in self._rest_pages():
+            for row in rows:
+                values = [cell["v"] for cell in row["f"]]
+                records.append([
+                    int(v) if pa.types.is_integer(t) else float(v) if pa.types.is_floating(t) else v
+                    for v, t in zip(values, types)
+                ])
+        return pd.DataFrame.from_records(records, columns=columns)
+
+    def _arrow_table(self) -> pa.Table:
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, self.table.schema) as writer:
+            for batch in self.table.to_batches(max_chunksize=self.batch_size):
+                writer.write_batch(batch)
+        return pa.ipc.open_stream(sink.getvalue()).read_all()
+
+    def to_dataframe(self, bqstorage_client=None, create_bqstorage_client=True):
+        if bqstorage_client is None:
+            return self._rest_dataframe()
+        return self._arrow_table().to_pandas()
+
+    def to_arrow(self, bqstorage_client=None, create_bqstorage_client=True):
+        if bqstorage_client is None:
+            return pa.Table.from_pandas(self._rest_dataframe(), preserve_index=False)
+        return self._arrow_table()
+
+
+def make_table(num_rows: int) -> pa.Table:
+    rng = np.random.default_rng(0)
+    return pa.table({
+        "id": np.arange(num_rows),
+        "order_id": rng.integers(0, 100000, num_rows),
+        "status": rng.choice(["Complete", "Shipped", "Returned", "Cancelled"], num_rows),
+        "sale_price": rng.random(num_rows) * 100,
+        "category": rng.choice(["Jeans", "Tops", "Outerwear", "Socks", "Swim"], num_rows),
+    })
+
+
+def time_call(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    runner = BigQueryRunner(use_storage_api=True, storage_api_row_threshold=0)
+    runner._bqstorage_client = object()  # stand-in Storage Read API client
+    rows = ArrowBatchRowIterator(make_table(args.rows))
+
+    results = {
+        "rest_dataframe": time_call(lambda: runner._download_result(rows, as_arrow=False, use_storage_api=False), args.repeat),
+        "storage_dataframe": time_call(lambda: runner._download_result(rows, as_arrow=False, use_storage_api=True), args.repeat),
+        "storage_arrow": time_call(lambda: runner._download_result(rows, as_arrow=True, use_storage_api=True), args.repeat),
+    }
+
+    print(f"rows: {args.rows}")
+    for name, seconds in results.items():
+        speedup = results["rest_dataframe"] / seconds if seconds else float("inf")
+        print(f"{name:<20} {seconds * 1000:10.1f} ms   x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
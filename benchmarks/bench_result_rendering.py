@@ -0,0 +1,164 @@
+"""Compare the prompt size of query results rendered with DataFrame.to_string and with result_rendering.
+
+Results come from representative queries run by the DuckDB backend on a seeded synthetic snapshot (no BigQuery).
+For every result the SQL agent's final-answer prompt and the plot agent's script prompt are built the old way
+(`to_string`, the raw column Index, one sample row) and the new way (`render_result` with the SQL agent's token
+budget; `render_columns` and `prompt_sample_rows` CSV rows without a header for the plot agent). Token counts are estimates
+(about four characters per token); the build times are the median over --render-repeat builds of each prompt.
+
+With --live the SQL agent's final-answer model (llm_name of its config, GOOGLE_API_KEY required) is also called with
+both versions of every prompt, and the median latency and reported input tokens are printed.
+
+Run from the project root:
+    python -m benchmarks.bench_result_rendering
+    python -m benchmarks.bench_result_rendering --live --repeat 3
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from duckdb_backend import DuckDBClient
+from result_rendering import render_columns, render_result, render_rows
+from schema_pruning import estimate_tokens
+from benchmarks.fakes import write_synthetic_snapshot
+
+
+QUERIES = {
+    "monthly revenue (aggregate)": (
+        "SELECT DATE_TRUNC(DATE(created_at), MONTH) AS month, COUNT(DISTINCT order_id) AS orders, "
+        "ROUND(SUM(sale_price), 2) AS revenue FROM `bigquery-public-data.thelook_ecommerce.order_items` "
+        "GROUP BY month ORDER BY month"
+    ),
+    "revenue per category (aggregate)": (
+        "SELECT p.category, SUM(oi.sale_price) AS revenue, AVG(oi.sale_price) AS avg_price, COUNT(*) AS items "
+        "FROM `bigquery-public-data.thelook_ecommerce.order_items` AS oi "
+        "JOIN `bigquery-public-data.thelook_ecommerce.products` AS p ON oi.product_id = p.id "
+        "GROUP BY p.category ORDER BY revenue DESC"
+    ),
+    "order items (wide, 100 rows)": "SELECT * FROM `bigquery-public-data.thelook_ecommerce.order_items` LIMIT 100",
+    "users (wide, 100 rows)": "SELECT * FROM `bigquery-public-data.thelook_ecommerce.users` LIMIT 100",
+}
+
+
+def load_config(project_root: str, agent: str) -> tuple:
+    with open(os.path.join(project_root, agent, "files", "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    with open(os.path.join(project_root, agent, "files", "system_prompts.json"), "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    return config, prompts
+
+
+def sql_answer_prompts(template: str, sql_query: str, df, total_rows: int, max_tokens: int) -> tuple:
+    # The old and the new prompt builder.
+    def old() -> str:
+        result = f"Query: {sql_query}\n Query execution result ({len(df)} of {total_rows} rows):\n {df.to_string(index=False)}"
+        return template.format(query_execution_result=result)
+
+    def new() -> str:
+        result = f"Query: {sql_query}\n Query execution result:\n{render_result(df, total_rows=total_rows, max_tokens=max_tokens)}"
+        return template.format(query_execution_result=result)
+
+    return old, new
+
+
+def plot_script_prompts(template: str, sql_query: str, df, sample_rows: int) -> tuple:
+    # The old and the new prompt builder.
+    def old() -> str:
+        return template.format(dataframe_columns=df.columns, recent_attempts="None", df_shape=df.shape,
+                               df_sample_rows=df.head(1).to_string(), sql_query_used=sql_query)
+
+    def new() -> str:
+        return template.format(dataframe_columns=render_columns(df), recent_attempts="None", df_shape=df.shape,
+                               df_sample_rows=render_rows(df.head(sample_rows), header=False), sql_query_used=sql_query)
+
+    return old, new
+
+
+def median_ms(build, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def measure_llm(llm, prompt: str, question: str, repeat: int) -> tuple:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    latencies, input_tokens = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = llm.invoke([SystemMessage(prompt), HumanMessage(question)])
+        latencies.append(time.perf_counter() - start)
+        input_tokens = (response.usage_metadata or {}).get("input_tokens", input_tokens)
+    return statistics.median(latencies), input_tokens
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic snapshot")
+    parser.add_argument("--live", action="store_true", help="Also measure the LLM latency of both prompts (calls Gemini)")
+    parser.add_argument("--repeat", type=int, default=3, help="LLM calls per prompt with --live")
+    parser.add_argument("--render-repeat", type=int, default=20, help="Builds per prompt for the build time")
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sql_config, sql_prompts = load_config(project_root, "sql_agent")
+    plot_config, plot_prompts = load_config(project_root, "plot_agent")
+
+    llm = None
+    if args.live:
+        from dotenv import load_dotenv
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        load_dotenv()
+        llm = ChatGoogleGenerativeAI(model=sql_config["llm_name"])
+
+    snapshot_dir = write_synthetic_snapshot(tempfile.mkdtemp(prefix="bench-snapshot-"), seed=args.seed)
+    try:
+        client = DuckDBClient(snapshot_dir)
+        print(f"{'result':<34} {'rows x cols':>11} {'prompt':<12} {'old ~tok':>9} {'new ~tok':>9} {'saved':>6} "
+              f"{'old ms':>7} {'new ms':>7}")
+        totals = {"old": 0, "new": 0}
+        for name, sql_query in QUERIES.items():
+            rows = client.query(sql_query).result()
+            total_rows = rows.total_rows
+            # The SQL agent only downloads its first max_result_rows rows.
+            df = rows.to_dataframe().head(sql_config["max_result_rows"])
+
+            builders = {
+                "SQL answer": sql_answer_prompts(sql_prompts["final_answer_generator"], sql_query, df, total_rows,
+                                                 sql_config["result_max_tokens"]),
+                "plot script": plot_script_prompts(plot_prompts["plot_script_generator"], sql_query, df,
+                                                   plot_config["prompt_sample_rows"]),
+            }
+            for label, (build_old, build_new) in builders.items():
+                old, new = build_old(), build_new()
+                old_tokens, new_tokens = estimate_tokens(old), estimate_tokens(new)
+                totals["old"] += old_tokens
+                totals["new"] += new_tokens
+                old_ms, new_ms = median_ms(build_old, args.render_repeat), median_ms(build_new, args.render_repeat)
+                print(f"{name:<34} {f'{total_rows}x{df.shape[1]}':>11} {label:<12} {old_tokens:>9} {new_tokens:>9} "
+                      f"{1 - new_tokens / old_tokens:>6.0%} {old_ms:>7.2f} {new_ms:>7.2f}")
+
+                if llm is not None:
+                    question = "Summarize the result." if label == "SQL answer" else "Write the plot script."
+                    old_seconds, old_input = measure_llm(llm, old, question, args.repeat)
+                    new_seconds, new_input = measure_llm(llm, new, question, args.repeat)
+                    print(f"{'':<34} {'':>11} {'LLM latency':<12} {old_seconds:>8.2f}s {new_seconds:>8.2f}s "
+                          f"{1 - new_seconds / old_seconds:>6.0%}   input tokens {old_input} -> {new_input}")
+
+        print(f"\nall prompts: ~{totals['old']} tokens -> ~{totals['new']} ({1 - totals['new'] / totals['old']:.0%} smaller)")
+        if llm is None:
+            print("LLM latency not measured; pass --live to call the model.")
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
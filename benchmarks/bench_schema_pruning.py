@@ -0,0 +1,56 @@
+"""Compare the size of the SQL-generation prompt with the full and the pruned schema context.
+
+Uses the committed SQL_tables_summary.txt (no BigQuery access) and the SQL agent's prompt template.
+Token counts are estimates (about four characters per token).
+
+Run from the project root:
+    python -m benchmarks.bench_schema_pruning
+"""
+import json
+import os
+
+from schema_catalog import SchemaCatalog
+from schema_pruning import SchemaPruner, estimate_tokens
+
+
+QUESTIONS = [
+    "How many orders were placed per day over the last 14 days?",
+    "What was the total revenue by product category in the last 30 days?",
+    "Which brands have the highest return rate?",
+    "What is the age and gender distribution of our customers?",
+    "Which countries generate the most revenue?",
+    "What is the average delivery time for orders shipped last month?",
+    "What share of users came from each traffic source?",
+    "Which product categories do female customers in Brazil buy most?",
+]
+
+
+def main() -> None:
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    catalog = SchemaCatalog(
+        summary_path=os.path.join(project_root, "SQL_tables_summary.txt"),
+        metadata_path=os.path.join(project_root, "SQL_tables_metadata.json"),
+        refresh_interval_seconds=float("inf"),
+    )
+    with open(os.path.join(project_root, "sql_agent", "files", "system_prompts.json"), "r", encoding="utf-8") as f:
+        template = json.load(f)["sql_query_generator"]
+
+    full_schema = catalog.get_tables_information()
+    pruner = SchemaPruner(catalog.get_table_summaries())
+    full_prompt_tokens = estimate_tokens(template.format(tables_information=full_schema, recent_attempts="None", current_time=""))
+
+    total_pruned = 0
+    print(f"{'schema ~tok':>11} {'prompt ~tok':>11}  tables / question")
+    print(f"{estimate_tokens(full_schema):>11} {full_prompt_tokens:>11}  (full schema)")
+    for question in QUESTIONS:
+        pruned_schema = pruner.render(question)
+        prompt_tokens = estimate_tokens(template.format(tables_information=pruned_schema, recent_attempts="None", current_time=""))
+        total_pruned += prompt_tokens
+        print(f"{estimate_tokens(pruned_schema):>11} {prompt_tokens:>11}  {pruner.select_tables(question)} {question}")
+
+    average = total_pruned / len(QUESTIONS)
+    print(f"\naverage prompt: ~{average:.0f} tokens vs ~{full_prompt_tokens} ({1 - average / full_prompt_tokens:.0%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
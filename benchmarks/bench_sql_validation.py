@@ -0,0 +1,89 @@
+"""Measure the cost and the false-positive/negative rate of BigQueryRunner.validate_sql_query.
+
+The corpus in files/sql_validation_corpus.json lists queries that must be accepted or rejected; the
+example queries from the SQL agent's system prompt are added to the accepted set. The previous
+regex keyword scan is kept here as a baseline.
+
+Run from the project root:
+    python -m benchmarks.bench_sql_validation
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from bq_client import BigQueryRunner
+
+
+LEGACY_DISALLOWED = [
+    "CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME", "COMMENT", "INSERT", "UPDATE", "DELETE", "MERGE",
+    "REPLACE", "UPSERT", "EXEC", "EXECUTE", "CALL", "GRANT", "REVOKE", "DENY", "SHUTDOWN", "BACKUP",
+    "RESTORE", "DBCC", "RECONFIGURE", "XP_", "ALTER DATABASE", "USE", "SET", "FLUSH", "LOCK", "UNLOCK",
+]
+
+
+def legacy_validate(query: str) -> str:
+    for keyword in LEGACY_DISALLOWED:
+        if re.search(rf"\b{keyword}\b", query, re.IGNORECASE):
+            raise ValueError(f"The query contains a disallowed command: {keyword}")
+    return query
+
+
+def load_corpus():
+    benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(benchmarks_directory, "files", "sql_validation_corpus.json"), "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    with open(os.path.join(benchmarks_directory, "..", "sql_agent", "files", "system_prompts.json"), "r", encoding="utf-8") as f:
+        prompt = json.load(f)["sql_query_generator"]
+    for block in prompt.split("**example sql query:**")[1:]:
+        corpus["accepted"].append(block.split("---")[0].strip())
+    return corpus
+
+
+def evaluate(validate, corpus, repeat: int):
+    false_positives = []
+    false_negatives = []
+    for expected_valid, queries in ((True, corpus["accepted"]), (False, corpus["rejected"])):
+        for query in queries:
+            try:
+                validate(query)
+                is_valid = True
+            except Exception:
+                is_valid = False
+            if expected_valid and not is_valid:
+                false_positives.append(query)
+            elif not expected_valid and is_valid:
+                false_negatives.append(query)
+
+    queries = corpus["accepted"] + corpus["rejected"]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            try:
+                validate(query)
+            except Exception:
+                pass
+    per_query_us = (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+    return per_query_us, false_positives, false_negatives
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true", help="Print the misclassified queries")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"corpus: {len(corpus['accepted'])} accepted, {len(corpus['rejected'])} rejected")
+    for name, validate in (("regex (legacy)", legacy_validate), ("tokenizer", BigQueryRunner.validate_sql_query)):
+        per_query_us, false_positives, false_negatives = evaluate(validate, corpus, args.repeat)
+        print(f"{name:<16} {per_query_us:8.1f} us/query   false positives: {len(false_positives):2d}   false negatives: {len(false_negatives):2d}")
+        if args.verbose:
+            for query in false_positives + false_negatives:
+                print("    " + query.replace("\n", " ")[:100])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure cold-start time of the CLI: importing app_CLI.py and constructing DataAnalysisAgent().
+
+Each run happens in a fresh interpreter so imports are not cached. The run also counts how many
+`bigquery.Client` objects were created during startup, which should be zero now that clients are lazy.
+
+Run from the project root:
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+STARTUP_SCRIPT = r"""
+import json, time
+start = time.perf_counter()
+
+from google.cloud import bigquery
+created_clients = []
+original_init = bigquery.Client.__init__
+def counting_init(self, *args, **kwargs):
+    created_clients.append(1)
+    original_init(self, *args, **kwargs)
+bigquery.Client.__init__ = counting_init
+patched = time.perf_counter()
+
+import app_CLI
+imported = time.perf_counter()
+
+from data_analysis_agent import DataAnalysisAgent
+DataAnalysisAgent()
+constructed = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - patched,
+    "construct_seconds": constructed - imported,
+    "total_seconds": constructed - start,
+    "bigquery_clients_created": len(created_clients),
+}))
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    # The Gemini client validates that a key is set but does not use it until the first request.
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+    runs = []
+    for _ in range(args.runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT], cwd=project_root, env=env,
+            capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    report["runs"] = args.runs
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""Offline stand-ins for Gemini and BigQuery, used by the benchmarks to run the agent graphs without network access.
+
+`FakeChatModel` answers every graph node with a plausible scripted response (the node is read from the LangGraph
+run config) after a simulated latency. `FakeBigQueryClient` runs "queries" that finish after a simulated job
+latency and return a small result frame; its jobs support both blocking `result()` and non-blocking `done()` polling.
+`ScriptedChatModel` replays recorded responses for a corpus of questions, `write_synthetic_snapshot` writes seeded
+Parquet tables for running real SQL on the DuckDB backend, and `DelayedClient` adds a job latency to that backend.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import var_child_runnable_config
+
+
+PLOT_SCRIPT = (
+    "fig, ax = plt.subplots(figsize=(4, 3))\n"
+    "ax.bar(df['label'], df['value'])\n"
+    "ax.set_title('Fake plot')\n"
+)
+
+
+def _current_node() -> str:
+    config = var_child_runnable_config.get() or {}
+    return config.get("metadata", {}).get("langgraph_node", "")
+
+
+def _message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning scripted responses per graph node after `latency_seconds`.
+
+    `node_latency_seconds` overrides the latency of individual nodes. When streamed, the response is sent word by
+    word, `token_latency_seconds` apart, after the latency.
+
+    Accepts (and ignores) the keyword arguments of `ChatGoogleGenerativeAI`, so it can replace it in the agents.
+    """
+
+    model: str = "fake"
+    latency_seconds: float = 0.05
+    node_latency_seconds: Dict[str, float] = {}
+    token_latency_seconds: float = 0.0
+    with_plots: bool = True
+
+    def __init__(self, model: str = "fake", cache: Any = None, **kwargs: Any) -> None:
+        # The response cache is left out on purpose: every benchmark call should pay the simulated latency.
+        super().__init__(model=model, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _latency(self) -> float:
+        return self.node_latency_seconds.get(_current_node(), self.latency_seconds)
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        node = _current_node()
+        question = _message_text(messages[-1])
+
+        if node == "supervisor":
+            user_question = re.search(r"user_question:\n(.*)\n", question)
+            explore = user_question.group(1) if user_question else question
+            return json.dumps({"response": "", "explore": explore, "decision": "explore"})
+        if node == "explorer":
+            return json.dumps({
+                "questions_for_sql_agent": [f"{question} - total", f"{question} - trend"],
+                "plot_description": f"Bar chart of {question}" if self.with_plots else "",
+                "plot_data_question_index": 0 if self.with_plots else None,
+            })
+        if node == "SQL query generator":
+            digest = hashlib.sha256(question.encode("utf-8")).hexdigest()[:12]
+            return f"SELECT '{digest}' AS label, 1 AS value"
+        if node == "Plot script generator":
+            return PLOT_SCRIPT
+        return f"Fake answer for: {question[:80]}"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._latency())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._latency())
+        for token in re.findall(r"\S+\s*", self._respond(messages)):
+            time.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._latency())
+        for token in re.findall(r"\S+\s*", self._respond(messages)):
+            await asyncio.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class ScriptedChatModel(FakeChatModel):
+    """FakeChatModel answering from a recorded script of questions (see benchmarks/files/e2e_corpus.json).
+
+    Each script entry holds a user question and the responses recorded for it: the explorer's decision, the SQL
+    query for each sub-question (one per attempt, so a failing first attempt exercises the retry loop) and the plot
+    script. Nodes and questions the script does not cover get FakeChatModel's generic responses.
+    """
+
+    script: List[Dict[str, Any]] = []
+
+    def _entry(self, text: str, key: str) -> Optional[Dict[str, Any]]:
+        return next((entry for entry in self.script if entry.get(key) and entry[key] in text), None)
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        node = _current_node()
+        question = _message_text(messages[-1]).strip()
+
+        if node == "explorer":
+            entry = self._entry(question, "question")
+            if entry is not None:
+                return json.dumps(entry["explorer"])
+        if node == "SQL query generator":
+            # Speculative candidates carry their number after the question; candidate n replays attempt n.
+            candidate = re.search(r"\n\nCandidate (\d+) of \d+", question)
+            sub_question = question[:candidate.start()] if candidate else question
+            for entry in self.script:
+                attempts = entry.get("sql", {}).get(sub_question)
+                if attempts:
+                    # The system prompt lists the failed attempts so far.
+                    attempt = _message_text(messages[0]).count("Attempt ") + (int(candidate.group(1)) - 1 if candidate else 0)
+                    return attempts[min(attempt, len(attempts) - 1)]
+        if node == "Plot script generator":
+            entry = next((entry for entry in self.script
+                          if entry.get("plot_script") and entry["explorer"].get("plot_description")
+                          and entry["explorer"]["plot_description"] in question), None)
+            if entry is not None:
+                return entry["plot_script"]
+        return super()._respond(messages)
+
+
+class FakeRowIterator:
+    """Mimics the parts of `google.cloud.bigquery.table.RowIterator` the runner uses."""
+
+    def __init__(self, df: pd.DataFrame, max_results: Optional[int] = None) -> None:
+        self.total_rows = len(df)
+        self._df = df if max_results is None else df.head(max_results)
+
+    def to_dataframe(self, **kwargs: Any) -> pd.DataFrame:
+        return self._df.copy()
+
+    def to_arrow(self, **kwargs: Any) -> "pyarrow.Table":
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(self._df, preserve_index=False)
+
+
+class FakeQueryJob:
+    """A query job that finishes `latency_seconds` after it was submitted."""
+
+    def __init__(self, df: pd.DataFrame, latency_seconds: float, bytes_processed: int) -> None:
+        self._df = df
+        self._done_at = time.monotonic() + latency_seconds
+        self.total_bytes_processed = bytes_processed
+
+    def done(self) -> bool:
+        return time.monotonic() >= self._done_at
+
+    def result(self, page_size: Optional[int] = None, max_results: Optional[int] = None, **kwargs: Any) -> FakeRowIterator:
+        remaining = self._done_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return FakeRowIterator(self._df, max_results=max_results)
+
+
+class FakeBigQueryClient:
+    """Replaces `bigquery.Client` in a BigQueryRunner; dry runs return at once, queries after `job_latency_seconds`."""
+
+    def __init__(self, job_latency_seconds: float = 0.2, result_rows: int = 20, bytes_processed: int = 10_000_000) -> None:
+        self.job_latency_seconds = job_latency_seconds
+        self.result_rows = result_rows
+        self.bytes_processed = bytes_processed
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def query(self, sql_query: str, job_config: Any = None) -> FakeQueryJob:
+        if job_config is not None and getattr(job_config, "dry_run", False):
+            return FakeQueryJob(pd.DataFrame(), latency_seconds=0, bytes_processed=self.bytes_processed)
+
+        with self._lock:
+            self.queries += 1
+        rng = np.random.default_rng(abs(hash(sql_query)) % (2 ** 32))
+        df = pd.DataFrame({
+            "label": [f"group {i}" for i in range(self.result_rows)],
+            "value": rng.integers(0, 1000, size=self.result_rows),
+        })
+        return FakeQueryJob(df, latency_seconds=self.job_latency_seconds, bytes_processed=self.bytes_processed)
+
+
+class DelayedQueryJob:
+    """Wraps a query job so that it only reports done `latency_seconds` after it was submitted."""
+
+    def __init__(self, job: Any, latency_seconds: float) -> None:
+        self._job = job
+        self._done_at = time.monotonic() + latency_seconds
+        self.total_bytes_processed = job.total_bytes_processed
+
+    def done(self) -> bool:
+        return time.monotonic() >= self._done_at
+
+    def result(self, *args: Any, **kwargs: Any) -> Any:
+        remaining = self._done_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return self._job.result(*args, **kwargs)
+
+
+class DelayedClient:
+    """Wraps a BigQuery-compatible client (e.g. the DuckDB backend) to add a simulated job latency.
+
+    Counts queries, dry runs and failures of either, so benchmarks can report the retries a run needed.
+    """
+
+    def __init__(self, client: Any, job_latency_seconds: float = 0.2) -> None:
+        self.client = client
+        self.job_latency_seconds = job_latency_seconds
+        self.queries = 0
+        self.failed_queries = 0
+        self.dry_runs = 0
+        self._lock = threading.Lock()
+
+    def query(self, sql_query: str, job_config: Any = None) -> Any:
+        is_dry_run = job_config is not None and getattr(job_config, "dry_run", False)
+        with self._lock:
+            if is_dry_run:
+                self.dry_runs += 1
+            else:
+                self.queries += 1
+        try:
+            job = self.client.query(sql_query, job_config=job_config)
+        except Exception:
+            # Invalid queries already fail their dry run when a scan budget is set.
+            with self._lock:
+                self.failed_queries += 1
+            raise
+        return job if is_dry_run else DelayedQueryJob(job, self.job_latency_seconds)
+
+    def get_table(self, table_ref: str) -> Any:
+        return self.client.get_table(table_ref)
+
+    def list_rows(self, table_ref: str, max_results: Optional[int] = None) -> Any:
+        return self.client.list_rows(table_ref, max_results=max_results)
+
+
+def write_synthetic_snapshot(directory: str, users: int = 2000, orders: int = 10000, products: int = 500,
+                             seed: int = 0) -> str:
+    """Write a deterministic thelook-shaped Parquet snapshot of the four tables for the DuckDB backend.
+
+    The tables have the dataset's columns and types, random but seeded values and consistent foreign keys, with
+    order dates spread over the year before the snapshot was written.
+    """
+    import os
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    now = pd.Timestamp.now(tz="UTC").floor("D")
+    statuses = np.array(["Complete", "Shipped", "Processing", "Cancelled", "Returned"])
+    genders = np.array(["F", "M"])
+
+    users_df = pd.DataFrame({
+        "id": np.arange(1, users + 1),
+        "first_name": [f"First{i}" for i in range(users)],
+        "last_name": [f"Last{i}" for i in range(users)],
+        "email": [f"user{i}@example.com" for i in range(users)],
+        "age": rng.integers(12, 70, size=users),
+        "gender": rng.choice(genders, size=users),
+        "state": rng.choice(["California", "Texas", "New York", "Florida", "Illinois"], size=users),
+        "street_address": [f"{i} Main Street" for i in range(users)],
+        "postal_code": [f"{rng.integers(10000, 99999)}" for _ in range(users)],
+        "city": rng.choice(["Los Angeles", "Houston", "New York", "Miami", "Chicago"], size=users),
+        "country": rng.choice(["United States", "China", "Brasil", "France", "Germany"], size=users),
+        "latitude": rng.uniform(-60, 60, size=users),
+        "longitude": rng.uniform(-180, 180, size=users),
+        "traffic_source": rng.choice(["Search", "Organic", "Email", "Facebook", "Display"], size=users),
+        "created_at": now - pd.to_timedelta(rng.integers(365, 4 * 365, size=users), unit="D"),
+    })
+
+    cost = rng.uniform(1, 100, size=products).round(2)
+    products_df = pd.DataFrame({
+        "id": np.arange(1, products + 1),
+        "cost": cost,
+        "category": rng.choice(["Jeans", "Tops & Tees", "Accessories", "Sweaters", "Outerwear & Coats"], size=products),
+        "name": [f"Product {i}" for i in range(products)],
+        "brand": rng.choice(["Allegra K", "Calvin Klein", "Carhartt", "Levi's", "Nike"], size=products),
+        "retail_price": (cost * rng.uniform(1.5, 3, size=products)).round(2),
+        "department": rng.choice(["Women", "Men"], size=products),
+        "sku": [hashlib.md5(str(i).encode()).hexdigest().upper() for i in range(products)],
+        "distribution_center_id": rng.integers(1, 11, size=products),
+    })
+
+    order_created = now - pd.to_timedelta(rng.integers(0, 365 * 24 * 60, size=orders), unit="min")
+    order_status = rng.choice(statuses, size=orders)
+    shipped = order_created + pd.to_timedelta(rng.integers(60, 3 * 24 * 60, size=orders), unit="min")
+    delivered = shipped + pd.to_timedelta(rng.integers(60, 5 * 24 * 60, size=orders), unit="min")
+    returned = delivered + pd.to_timedelta(rng.integers(60, 7 * 24 * 60, size=orders), unit="min")
+    is_shipped = np.isin(order_status, ["Complete", "Shipped", "Returned"])
+    orders_df = pd.DataFrame({
+        "order_id": np.arange(1, orders + 1),
+        "user_id": rng.integers(1, users + 1, size=orders),
+        "status": order_status,
+        "gender": rng.choice(genders, size=orders),
+        "created_at": order_created,
+        "returned_at": returned.where(order_status == "Returned"),
+        "shipped_at": shipped.where(is_shipped),
+        "delivered_at": delivered.where(np.isin(order_status, ["Complete", "Returned"])),
+        "num_of_item": rng.integers(1, 4, size=orders),
+    })
+
+    item_orders = orders_df.loc[orders_df.index.repeat(orders_df["num_of_item"])].reset_index(drop=True)
+    product_ids = rng.integers(1, products + 1, size=len(item_orders))
+    order_items_df = pd.DataFrame({
+        "id": np.arange(1, len(item_orders) + 1),
+        "order_id": item_orders["order_id"],
+        "user_id": item_orders["user_id"],
+        "product_id": product_ids,
+        "inventory_item_id": np.arange(1, len(item_orders) + 1),
+        "status": item_orders["status"],
+        "created_at": item_orders["created_at"],
+        "shipped_at": item_orders["shipped_at"],
+        "delivered_at": item_orders["delivered_at"],
+        "returned_at": item_orders["returned_at"],
+        "sale_price": products_df["retail_price"].to_numpy()[product_ids - 1],
+    })
+
+    for name, df in (("users", users_df), ("products", products_df), ("orders", orders_df), ("order_items", order_items_df)):
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(directory, f"{name}.parquet"))
+    with open(os.path.join(directory, "snapshot.json"), "w", encoding="utf-8") as f:
+        json.dump({"dataset_id": "synthetic", "created_at": pd.Timestamp.now(tz="UTC").isoformat(), "tables": {}}, f, indent=2)
+    return directory
@@ -1,60 +1,454 @@
+import asyncio
 import logging
-import re
-from typing import Optional, List, Dict, Any
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Tuple, Union
 
 import pandas as pd
 from dotenv import load_dotenv
 from google.cloud import bigquery
 
+from query_cache import QueryResultCache, get_shared_query_cache
+from sql_tokenizer import tokenize, split_statements, SqlTokenizeError, WORD, PUNCTUATION
+from tracing import Span, SPAN_KIND_CLIENT, get_tracer
+
 load_dotenv()
 
+QUERY_BACKENDS = ("bigquery", "duckdb", "local_first")
+
+READ_ONLY_COMMANDS = frozenset({"SELECT", "WITH"})
+
+DISALLOWED_COMMANDS = frozenset({
+    # Data Definition Language (DDL) commands
+    "CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME", "COMMENT",
+    # Data Manipulation Language (DML) commands
+    "INSERT", "UPDATE", "DELETE", "MERGE", "REPLACE", "UPSERT",
+    # Stored procedure / dynamic SQL execution
+    "EXEC", "EXECUTE", "CALL",
+    # Data Control Language (DCL) commands
+    "GRANT", "REVOKE", "DENY",
+    # Administrative, session and scripting commands
+    "SHUTDOWN", "BACKUP", "RESTORE", "DBCC", "RECONFIGURE", "USE", "SET", "DECLARE", "BEGIN",
+    "FLUSH", "LOCK", "UNLOCK", "EXPORT", "LOAD",
+})
+
 class InvalidSQLQueryError(Exception):
     """Custom exception raised when a SQL query contains disallowed commands."""
     pass
 
 
+class QueryBudgetExceededError(Exception):
+    """Custom exception raised when a dry run shows a query would scan more bytes than its budget allows."""
+    pass
+
+
+class ScanBudget:
+    """Tracks the bytes scanned by the queries of one conversation against a per-query and a total budget."""
+
+    def __init__(self, max_bytes_per_query: int, max_bytes_per_conversation: int) -> None:
+        """Initialize the budget.
+
+        Args:
+            max_bytes_per_query: Maximum bytes a single query may scan.
+            max_bytes_per_conversation: Maximum bytes all queries of the conversation may scan together.
+        """
+        self.max_bytes_per_query = max_bytes_per_query
+        self.max_bytes_per_conversation = max_bytes_per_conversation
+        self.used_bytes = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, bytes_processed: int) -> None:
+        """Charge `bytes_processed` to the budget, or raise QueryBudgetExceededError if it does not fit."""
+        if bytes_processed > self.max_bytes_per_query:
+            raise QueryBudgetExceededError(
+                f"The query would scan {self._format_bytes(bytes_processed)}, more than the per-query budget of "
+                f"{self._format_bytes(self.max_bytes_per_query)}. Rewrite it to scan less data "
+                f"(select only the needed columns, filter early, avoid SELECT *)."
+            )
+        with self._lock:
+            remaining = self.max_bytes_per_conversation - self.used_bytes
+            if bytes_processed > remaining:
+                raise QueryBudgetExceededError(
+                    f"The query would scan {self._format_bytes(bytes_processed)}, but only {self._format_bytes(remaining)} "
+                    f"of the conversation budget of {self._format_bytes(self.max_bytes_per_conversation)} is left. "
+                    f"Rewrite it to scan less data."
+                )
+            self.used_bytes += bytes_processed
+
+    def release(self, bytes_processed: int) -> None:
+        """Give back bytes reserved for a query that did not run."""
+        with self._lock:
+            self.used_bytes = max(0, self.used_bytes - bytes_processed)
+
+    @staticmethod
+    def _format_bytes(num_bytes: int) -> str:
+        return f"{num_bytes / 1024 ** 3:.2f} GB" if num_bytes >= 1024 ** 3 else f"{num_bytes / 1024 ** 2:.1f} MB"
+
+
+@dataclass
+class QueryResult:
+    """Rows returned by a query, possibly capped, plus the true size of the full result."""
+    data: Union[pd.DataFrame, "pyarrow.Table"]
+    total_rows: int
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.data) < self.total_rows
+
+
 class BigQueryRunner:
     """A lean BigQuery client for executing SQL queries and returning DataFrame results."""
     
-    def __init__(self, project_id: Optional[str] = None, dataset_id: Optional[str] = "bigquery-public-data.thelook_ecommerce") -> None:
+    def __init__(self, project_id: Optional[str] = None, dataset_id: Optional[str] = "bigquery-public-data.thelook_ecommerce",
+                 query_cache: Optional[QueryResultCache] = None, use_storage_api: bool = False,
+                 storage_api_row_threshold: int = 20000, job_poll_initial_seconds: float = 0.05,
+                 job_poll_max_seconds: float = 1.0, backend: str = "bigquery", snapshot_dir: Optional[str] = None,
+                 snapshot_max_age_seconds: float = 24 * 3600) -> None:
         """Initialize BigQuery client.
+
+        The underlying `bigquery.Client` (credentials and HTTP session) is only created on first use.
+        With the "duckdb" backend queries run locally on the Parquet snapshot in `snapshot_dir` instead
+        (`duckdb_backend.py`); with "local_first" aggregate queries run on the snapshot while it is younger than
+        `snapshot_max_age_seconds` and all other queries on BigQuery.
         
         Args:
             project_id: Google Cloud project ID. If None, uses default credentials.
             dataset_id: BigQuery dataset ID. If None, uses default dataset.
+            query_cache: Cache for query results. If None, uses the process-wide shared cache.
+            use_storage_api: Default for downloading large results through the BigQuery Storage Read API.
+            storage_api_row_threshold: Minimum number of result rows for which the Storage Read API is used.
+            job_poll_initial_seconds: First interval between two status checks of a query job in the async methods.
+            job_poll_max_seconds: Longest interval between two status checks; the interval doubles up to it.
+            backend: Where queries run: "bigquery", "duckdb" or "local_first".
+            snapshot_dir: Directory of the Parquet table snapshots used by the "duckdb" and "local_first" backends.
+            snapshot_max_age_seconds: Age after which the "local_first" backend stops serving queries from the snapshot.
         """
-        logging.info("Initializing BigQuery client")
-        try:
-            self.client = bigquery.Client(project=project_id)
-            self.dataset_id = dataset_id
-            logging.info(f"BigQuery client initialized for dataset: {self.dataset_id}")
-        except Exception as e:
-            logging.error(f"Failed to initialize BigQuery client: {str(e)}")
-            raise
+        if backend not in QUERY_BACKENDS:
+            raise ValueError(f"Unknown query backend {backend!r}, expected one of {QUERY_BACKENDS}")
+        if backend != "bigquery" and not snapshot_dir:
+            raise ValueError(f"The {backend} query backend needs a snapshot directory")
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.query_cache = query_cache if query_cache is not None else get_shared_query_cache()
+        self.use_storage_api = use_storage_api
+        self.storage_api_row_threshold = storage_api_row_threshold
+        self.job_poll_initial_seconds = job_poll_initial_seconds
+        self.job_poll_max_seconds = job_poll_max_seconds
+        self.backend = backend
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_max_age_seconds = snapshot_max_age_seconds
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._bqstorage_client = None
+        self._bqstorage_unavailable = False
+
+    @property
+    def client(self) -> bigquery.Client:
+        """The BigQuery client (or its DuckDB stand-in), created (and its credentials loaded) on first access."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    logging.info(f"Initializing {self.backend} query client")
+                    try:
+                        self._client = self._create_client()
+                        logging.info(f"{self.backend} query client initialized for dataset: {self.dataset_id}")
+                    except Exception as e:
+                        logging.error(f"Failed to initialize {self.backend} query client: {str(e)}")
+                        raise
+        return self._client
+
+    def _create_client(self) -> bigquery.Client:
+        if self.backend == "bigquery":
+            return bigquery.Client(project=self.project_id)
+
+        # duckdb is an optional dependency, only needed for the local backends.
+        from duckdb_backend import DuckDBClient, LocalFirstClient
+
+        duckdb_client = DuckDBClient(self.snapshot_dir)
+        if self.backend == "duckdb":
+            return duckdb_client
+        return LocalFirstClient(bigquery.Client(project=self.project_id), duckdb_client,
+                                max_snapshot_age_seconds=self.snapshot_max_age_seconds)
     
-    def execute_query(self, sql_query: str) -> pd.DataFrame:
+    def execute_query(self, sql_query: str, as_arrow: bool = False, use_storage_api: Optional[bool] = None,
+                      scan_budget: Optional[ScanBudget] = None) -> Union[pd.DataFrame, "pyarrow.Table"]:
         """Execute a SQL query and return results as a DataFrame.
+
+        Results are served from the query cache when an equivalent query (same SQL up to
+        whitespace, comments and keyword case, on the same backend, project and dataset) was executed
+        recently. Queries calling non-deterministic functions (CURRENT_DATE, RAND, ...) are never cached.
         
         Args:
             sql_query: The SQL query to execute.
+            as_arrow: If True, return a pyarrow Table instead of a DataFrame, skipping the pandas conversion.
+            use_storage_api: If True, download results with at least `storage_api_row_threshold` rows
+                through the BigQuery Storage Read API. If None, uses the runner's default.
+            scan_budget: If given, the query is dry-run first and only executed if its scanned bytes fit the budget.
             
         Returns:
-            DataFrame containing the query results.
+            DataFrame (or pyarrow Table) containing the query results.
             
         Raises:
+            QueryBudgetExceededError: If the query would scan more bytes than `scan_budget` allows.
             Exception: If query execution fails.
         """
+        return self._run_query(sql_query=sql_query, as_arrow=as_arrow, use_storage_api=use_storage_api,
+                               scan_budget=scan_budget).data
+
+    def fetch_rows(self, sql_query: str, max_rows: int, page_size: Optional[int] = None,
+                   as_arrow: bool = False, scan_budget: Optional[ScanBudget] = None) -> QueryResult:
+        """Execute a SQL query but download at most `max_rows` rows of its result.
+
+        The row iterator stops after `max_rows`, so an accidental "SELECT *" costs only the rows
+        that are actually used. The returned `total_rows` comes from the job metadata and reflects
+        the full result.
+
+        Args:
+            sql_query: The SQL query to execute.
+            max_rows: Maximum number of rows to download.
+            page_size: Number of rows requested per REST page. If None, uses `max_rows`.
+            as_arrow: If True, return a pyarrow Table instead of a DataFrame.
+            scan_budget: If given, the query is dry-run first and only executed if its scanned bytes fit the budget.
+
+        Returns:
+            QueryResult with the first `max_rows` rows and the total row count.
+
+        Raises:
+            QueryBudgetExceededError: If the query would scan more bytes than `scan_budget` allows.
+            Exception: If query execution fails.
+        """
+        return self._run_query(sql_query=sql_query, as_arrow=as_arrow, max_rows=max_rows,
+                               page_size=page_size or max_rows, scan_budget=scan_budget)
+
+    async def aexecute_query(self, sql_query: str, as_arrow: bool = False, use_storage_api: Optional[bool] = None,
+                             scan_budget: Optional[ScanBudget] = None) -> Union[pd.DataFrame, "pyarrow.Table"]:
+        """Async variant of `execute_query`: the query job is polled without blocking the event loop."""
+        result = await self._arun_query(sql_query=sql_query, as_arrow=as_arrow, use_storage_api=use_storage_api,
+                                        scan_budget=scan_budget)
+        return result.data
+
+    async def afetch_rows(self, sql_query: str, max_rows: int, page_size: Optional[int] = None,
+                          as_arrow: bool = False, scan_budget: Optional[ScanBudget] = None) -> QueryResult:
+        """Async variant of `fetch_rows`: the query job is polled without blocking the event loop."""
+        return await self._arun_query(sql_query=sql_query, as_arrow=as_arrow, max_rows=max_rows,
+                                      page_size=page_size or max_rows, scan_budget=scan_budget)
+
+    def dry_run(self, sql_query: str) -> int:
+        """Validate a SQL query with a BigQuery dry run and return the bytes it would scan.
+
+        A dry run is free and fails fast on syntax or schema errors without executing the query.
+
+        Args:
+            sql_query: The SQL query to check.
+
+        Returns:
+            The number of bytes the query would process.
+
+        Raises:
+            Exception: If the query is invalid.
+        """
+        sql_query = self.validate_sql_query(query=sql_query)
+        sql_query = self.strip_sql_fence(text=sql_query)
+        return self._dry_run(sql_query)
+
+    def _dry_run(self, sql_query: str) -> int:
+        try:
+            job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+            query_job = self.client.query(sql_query, job_config=job_config)
+            bytes_processed = query_job.total_bytes_processed or 0
+            logging.info(f"Dry run completed, query would process {bytes_processed} bytes")
+            return bytes_processed
+        except Exception as e:
+            logging.error(f"BigQuery dry run failed: {str(e)}")
+            raise
+
+    def _run_query(self, sql_query: str, as_arrow: bool = False, use_storage_api: Optional[bool] = None,
+                   max_rows: Optional[int] = None, page_size: Optional[int] = None,
+                   scan_budget: Optional[ScanBudget] = None) -> QueryResult:
         try:
             logging.info(f"Executing BigQuery query")
-            sql_query = self.validate_sql_query(query=sql_query)
-            sql_query = self.strip_sql_fence(text=sql_query)
-            query_job = self.client.query(sql_query)
-            df = query_job.result().to_dataframe()
-            logging.info(f"Query completed successfully, returned {len(df)} rows")
-            return df
+            with get_tracer().span("bigquery.query", kind=SPAN_KIND_CLIENT) as span:
+                span.set_attribute("db.system", self.backend)
+                sql_query, cache_keys, cached_result = self._prepare_query(sql_query, as_arrow=as_arrow, max_rows=max_rows)
+                span.set_attribute("bigquery.cache_hit", cached_result is not None)
+                if cached_result is not None:
+                    return self._trace_result(span, cached_result)
+
+                # Cache hits cost nothing, so only queries that will really run are dry-run against the budget.
+                reserved_bytes = 0
+                if scan_budget is not None:
+                    reserved_bytes = self._dry_run(sql_query)
+                    scan_budget.reserve(reserved_bytes)
+
+                start_time = time.perf_counter()
+                try:
+                    query_job = self.client.query(sql_query)
+                    rows = query_job.result(page_size=page_size, max_results=max_rows)
+                except Exception:
+                    if scan_budget is not None:
+                        scan_budget.release(reserved_bytes)
+                    raise
+                download_start_time = time.perf_counter()
+                result = self._download_result(
+                    rows=rows,
+                    as_arrow=as_arrow,
+                    use_storage_api=(self.use_storage_api if use_storage_api is None else use_storage_api) and max_rows is None
+                )
+                self._trace_job(span, query_job, download_seconds=time.perf_counter() - download_start_time)
+                cache_key = cache_keys[-1] if cache_keys else None
+                return self._trace_result(span, self._store_result(cache_key, query_job, rows, result,
+                                                                   elapsed_seconds=time.perf_counter() - start_time))
         except Exception as e:
             logging.error(f"BigQuery execution failed: {str(e)}")
-            raise 
+            raise
+
+    async def _arun_query(self, sql_query: str, as_arrow: bool = False, use_storage_api: Optional[bool] = None,
+                          max_rows: Optional[int] = None, page_size: Optional[int] = None,
+                          scan_budget: Optional[ScanBudget] = None) -> QueryResult:
+        # Same steps as _run_query. The blocking HTTP calls (job submission, polling, download) run in
+        # worker threads and the wait for the job is an asyncio.sleep loop, so the event loop stays free.
+        try:
+            logging.info(f"Executing BigQuery query")
+            with get_tracer().span("bigquery.query", kind=SPAN_KIND_CLIENT) as span:
+                span.set_attribute("db.system", self.backend)
+                sql_query, cache_keys, cached_result = self._prepare_query(sql_query, as_arrow=as_arrow, max_rows=max_rows)
+                span.set_attribute("bigquery.cache_hit", cached_result is not None)
+                if cached_result is not None:
+                    return self._trace_result(span, cached_result)
+
+                reserved_bytes = 0
+                if scan_budget is not None:
+                    reserved_bytes = await asyncio.to_thread(self._dry_run, sql_query)
+                    scan_budget.reserve(reserved_bytes)
+
+                start_time = time.perf_counter()
+                try:
+                    query_job = await asyncio.to_thread(self._submit_query, sql_query)
+                    await self._wait_for_job(query_job)
+                    rows = await asyncio.to_thread(query_job.result, page_size=page_size, max_results=max_rows)
+                except Exception:
+                    if scan_budget is not None:
+                        scan_budget.release(reserved_bytes)
+                    raise
+                download_start_time = time.perf_counter()
+                result = await asyncio.to_thread(
+                    self._download_result,
+                    rows=rows,
+                    as_arrow=as_arrow,
+                    use_storage_api=(self.use_storage_api if use_storage_api is None else use_storage_api) and max_rows is None
+                )
+                self._trace_job(span, query_job, download_seconds=time.perf_counter() - download_start_time)
+                cache_key = cache_keys[-1] if cache_keys else None
+                return self._trace_result(span, self._store_result(cache_key, query_job, rows, result,
+                                                                   elapsed_seconds=time.perf_counter() - start_time))
+        except Exception as e:
+            logging.error(f"BigQuery execution failed: {str(e)}")
+            raise
+
+    @staticmethod
+    def _trace_job(span: Span, query_job: "bigquery.QueryJob", download_seconds: float) -> None:
+        span.set_attribute("bigquery.job_id", getattr(query_job, "job_id", None))
+        span.set_attribute("bigquery.bytes_processed", query_job.total_bytes_processed or 0)
+        span.set_attribute("bigquery.slot_ms", getattr(query_job, "slot_millis", None))
+        span.set_attribute("bigquery.download_ms", round(download_seconds * 1000, 1))
+
+    @staticmethod
+    def _trace_result(span: Span, result: QueryResult) -> QueryResult:
+        span.set_attribute("bigquery.rows", len(result.data))
+        span.set_attribute("bigquery.total_rows", result.total_rows)
+        return result
+
+    def _prepare_query(self, sql_query: str, as_arrow: bool,
+                       max_rows: Optional[int]) -> Tuple[str, List[str], Optional[QueryResult]]:
+        """Validate a query and look it up in the query cache.
+
+        Returns:
+            The SQL to run, its cache keys (the last one is where a new result is stored; empty if the query
+            must not be cached) and the cached result, or None on a miss.
+        """
+        sql_query = self.validate_sql_query(query=sql_query)
+        sql_query = self.strip_sql_fence(text=sql_query)
+
+        if not self.query_cache.is_cacheable(sql_query):
+            logging.info("Query uses a non-deterministic function, not using the query cache")
+            return sql_query, [], None
+
+        # A cached full result can also serve a row-limited request.
+        cache_key = self.query_cache.fingerprint(sql_query, scope=(self.backend, self.project_id, self.dataset_id))
+        cache_keys = [cache_key] if max_rows is None else [cache_key, f"{cache_key}-max-rows-{max_rows}"]
+        for key in cache_keys:
+            cached = self.query_cache.get_with_total_rows(key, record_miss=key == cache_keys[-1])
+            if cached is not None:
+                cached_result, total_rows = cached
+                if max_rows is not None:
+                    cached_result = cached_result.iloc[:max_rows] if isinstance(cached_result, pd.DataFrame) else cached_result.slice(0, max_rows)
+                logging.info(f"Query served from cache, returned {len(cached_result)} of {total_rows} rows")
+                return sql_query, cache_keys, QueryResult(data=self._convert_result(cached_result, as_arrow=as_arrow), total_rows=total_rows)
+        return sql_query, cache_keys, None
+
+    def _submit_query(self, sql_query: str) -> "bigquery.QueryJob":
+        return self.client.query(sql_query)
+
+    async def _wait_for_job(self, query_job: "bigquery.QueryJob") -> None:
+        """Wait for a query job without blocking the event loop, polling with a growing interval."""
+        poll_interval = self.job_poll_initial_seconds
+        while not await asyncio.to_thread(query_job.done):
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, self.job_poll_max_seconds)
+
+    def _store_result(self, cache_key: Optional[str], query_job: "bigquery.QueryJob", rows: "bigquery.table.RowIterator",
+                      result: Union[pd.DataFrame, "pyarrow.Table"], elapsed_seconds: float) -> QueryResult:
+        total_rows = rows.total_rows if rows.total_rows is not None else len(result)
+        if cache_key is not None:
+            self.query_cache.put(
+                cache_key,
+                result,
+                elapsed_seconds=elapsed_seconds,
+                bytes_processed=query_job.total_bytes_processed or 0,
+                total_rows=total_rows
+            )
+        logging.info(f"Query completed successfully, returned {len(result)} of {total_rows} rows")
+        return QueryResult(data=result, total_rows=total_rows)
+
+    def _download_result(self, rows: "bigquery.table.RowIterator", as_arrow: bool,
+                         use_storage_api: bool) -> Union[pd.DataFrame, "pyarrow.Table"]:
+        """Download a finished query's rows, through the Storage Read API when the result is large enough.
+
+        Small results stay on the REST API, where the Storage Read API's session setup would cost more than it saves.
+        """
+        bqstorage_client = None
+        if use_storage_api and self.backend != "duckdb" and (rows.total_rows or 0) >= self.storage_api_row_threshold:
+            bqstorage_client = self._get_bqstorage_client()
+
+        if as_arrow:
+            return rows.to_arrow(bqstorage_client=bqstorage_client, create_bqstorage_client=False)
+        return rows.to_dataframe(bqstorage_client=bqstorage_client, create_bqstorage_client=False)
+
+    def _get_bqstorage_client(self) -> Optional["bigquery_storage.BigQueryReadClient"]:
+        """Return a cached Storage Read API client, or None if google-cloud-bigquery-storage is not installed."""
+        if self._bqstorage_client is None and not self._bqstorage_unavailable:
+            try:
+                from google.cloud import bigquery_storage
+
+                self._bqstorage_client = bigquery_storage.BigQueryReadClient()
+            except ImportError:
+                logging.warning("google-cloud-bigquery-storage is not installed, downloading results through the REST API")
+                self._bqstorage_unavailable = True
+        return self._bqstorage_client
+
+    @staticmethod
+    def _convert_result(result: Union[pd.DataFrame, "pyarrow.Table"], as_arrow: bool) -> Union[pd.DataFrame, "pyarrow.Table"]:
+        """Return `result` as a pyarrow Table if `as_arrow`, otherwise as a DataFrame."""
+        is_dataframe = isinstance(result, pd.DataFrame)
+        if as_arrow and is_dataframe:
+            import pyarrow as pa
+
+            return pa.Table.from_pandas(result, preserve_index=False)
+        if not as_arrow and not is_dataframe:
+            return result.to_pandas()
+        return result
 
     def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
         """Get schema information for a specific table.
@@ -82,69 +476,80 @@ class BigQueryRunner:
             logging.error(f"Failed to get schema for table {table_name}: {str(e)}")
             raise
 
+    def get_table_modified(self, table_name: str) -> Optional[str]:
+        """Get the time a table was last modified, as an ISO 8601 string.
+
+        Args:
+            table_name: Name of the table (orders, order_items, products, users).
+
+        Returns:
+            The table's last modification time, or None if BigQuery does not report one.
+        """
+        try:
+            table = self.client.get_table(f"{self.dataset_id}.{table_name}")
+            return table.modified.isoformat() if table.modified else None
+        except Exception as e:
+            logging.error(f"Failed to get modification time for table {table_name}: {str(e)}")
+            raise
+
+    def sample_rows(self, table_name: str, max_rows: int) -> pd.DataFrame:
+        """Read the first rows of a table through the table data API, without running (or paying for) a query.
+
+        Args:
+            table_name: Name of the table (orders, order_items, products, users).
+            max_rows: Maximum number of rows to read.
+
+        Returns:
+            DataFrame with at most `max_rows` rows of the table.
+        """
+        try:
+            rows = self.client.list_rows(f"{self.dataset_id}.{table_name}", max_results=max_rows)
+            df = rows.to_dataframe(create_bqstorage_client=False)
+            logging.info(f"Read {len(df)} sample rows from table {table_name}")
+            return df
+        except Exception as e:
+            logging.error(f"Failed to read sample rows from table {table_name}: {str(e)}")
+            raise
+
     @staticmethod
     def validate_sql_query(query: str) -> str:
         """
         Validate an incoming SQL query string to ensure it's safe/allowed.
         Raise an InvalidSQLQueryError if the query includes disallowed syntax.
 
+        The query is tokenized in a single pass (string literals, comments and quoted identifiers are
+        skipped) and must consist of exactly one read-only SELECT/WITH statement. Disallowed commands
+        are also rejected at the start of a parenthesized sub-statement.
+
         Returns the original query if it's safe, or raises an exception otherwise.
         """
-        disallowed = [
-            # Data Definition Language (DDL) commands:
-            "CREATE",  # Creates new objects (tables, views, indexes, procedures, etc.)
-            "ALTER",  # Modifies existing objects (tables, columns, constraints, etc.)
-            "DROP",  # Deletes objects from the database.
-            "TRUNCATE",  # Removes all rows from a table, often non-transactionally.
-            "RENAME",  # Renames database objects.
-            "COMMENT",  # Adds or modifies object comments (can alter metadata).
-
-            # Data Manipulation Language (DML) commands:
-            "INSERT",  # Inserts new rows into a table.
-            "UPDATE",  # Modifies existing rows in a table.
-            "DELETE",  # Deletes rows from a table.
-            "MERGE",  # Conditionally inserts, updates, or deletes rows (UPSERT functionality).
-            "REPLACE",  # MySQL-specific upsert-like command.
-            "UPSERT",  # Available in some dialects to insert or update rows.
-
-            # Stored Procedure / Function Execution:
-            "EXEC",  # Executes a stored procedure (SQL Server, etc.)
-            "EXECUTE",  # Executes a stored procedure.
-            "CALL",  # Calls a stored procedure (MySQL, Oracle, PostgreSQL, etc.)
-
-            # Data Control Language (DCL) commands:
-            "GRANT",  # Grants privileges on database objects.
-            "REVOKE",  # Revokes privileges on database objects.
-            "DENY",  # SQL Server-specific command to deny privileges.
-
-            # Administrative and System Commands:
-            "SHUTDOWN",  # Shuts down the database server.
-            "BACKUP",  # Initiates a database backup.
-            "RESTORE",  # Restores database objects from a backup.
-            "DBCC",  # SQL Server Database Console Commands that can alter state.
-            "RECONFIGURE",  # SQL Server command to change server settings.
-
-            # Extended/System Procedures (typically in SQL Server):
-            "XP_",  # Prefix for extended stored procedures (e.g., XP_CMDSHELL) that can modify system state.
-
-            # Commands that alter the entire database context or settings:
-            "ALTER DATABASE",  # Alters database-level settings.
-            "USE",  # Changes the database context.
-            "SET",
-            # May change session settings that affect data (e.g., SET IDENTITY_INSERT, SET TRANSACTION ISOLATION LEVEL).
-
-            # Miscellaneous and dialect-specific commands:
-            "FLUSH",  # MySQL command to clear caches or logs.
-            "LOCK",  # Commands like LOCK TABLES can affect transactional state.
-            "UNLOCK",  # Releases locks; included as part of lock management.
-        ]
-
-        # Case-insensitive check for disallowed commands
-        for keyword in disallowed:
-            if re.search(rf"\b{keyword}\b", query, re.IGNORECASE):
-                raise InvalidSQLQueryError(
-                    f"The query contains a disallowed command: {keyword}"
-                )
+        try:
+            tokens = tokenize(BigQueryRunner.strip_sql_fence(text=query))
+        except SqlTokenizeError as e:
+            raise InvalidSQLQueryError(f"The query could not be parsed: {e}")
+
+        statements = split_statements(tokens)
+        if not statements:
+            raise InvalidSQLQueryError("The query is empty")
+        if len(statements) > 1:
+            raise InvalidSQLQueryError("The query contains more than one statement")
+        statement = statements[0]
+
+        head = next((t for t in statement if not (t.type == PUNCTUATION and t.value == "(")), None)
+        head_word = head.value.upper() if head is not None and head.type == WORD else None
+        if head_word in DISALLOWED_COMMANDS:
+            raise InvalidSQLQueryError(f"The query contains a disallowed command: {head_word}")
+        if head_word not in READ_ONLY_COMMANDS:
+            raise InvalidSQLQueryError("Only read-only SELECT/WITH queries are allowed")
+
+        for previous, token, following in zip(statement, statement[1:], statement[2:] + [None]):
+            if previous.type != PUNCTUATION or previous.value != "(" or token.type != WORD:
+                continue
+            word = token.value.upper()
+            # A word followed by "(" is a function call (e.g. REPLACE(...)), not a command.
+            is_function_call = following is not None and following.type == PUNCTUATION and following.value == "("
+            if word in DISALLOWED_COMMANDS and not is_function_call:
+                raise InvalidSQLQueryError(f"The query contains a disallowed command: {word}")
 
         return query
 
@@ -172,3 +577,29 @@ class BigQueryRunner:
             # Optionally trim a trailing newline introduced before the fence
             return inner.rstrip("\r\n")
         return text
+
+
+_big_query_runners: Dict[tuple, BigQueryRunner] = {}
+_big_query_runners_lock = threading.Lock()
+
+
+def get_big_query_runner(project_id: Optional[str] = None,
+                         dataset_id: Optional[str] = "bigquery-public-data.thelook_ecommerce") -> BigQueryRunner:
+    """Return the process-wide BigQueryRunner for a project and dataset, creating it on first call.
+
+    All agents share one runner, so a single client and its pooled HTTP session are reused. Creating
+    the runner does no network or credential work; that happens on the first query. The query backend is
+    read from the `QUERY_BACKEND` ("bigquery", "duckdb" or "local_first"), `DUCKDB_SNAPSHOT_DIR` and
+    `DUCKDB_SNAPSHOT_MAX_AGE_SECONDS` environment variables.
+    """
+    key = (project_id, dataset_id)
+    with _big_query_runners_lock:
+        if key not in _big_query_runners:
+            _big_query_runners[key] = BigQueryRunner(
+                project_id=project_id,
+                dataset_id=dataset_id,
+                backend=os.getenv("QUERY_BACKEND", "bigquery"),
+                snapshot_dir=os.getenv("DUCKDB_SNAPSHOT_DIR") or None,
+                snapshot_max_age_seconds=float(os.getenv("DUCKDB_SNAPSHOT_MAX_AGE_SECONDS", 24 * 3600)),
+            )
+        return _big_query_runners[key]
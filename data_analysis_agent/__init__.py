@@ -1,4 +1,6 @@
 from .agent import DataAnalysisAgent
+from .memory import ConversationMemory
 from .state import DataAnalysisAgentState
+from .streaming import StreamEvent, stream_answer, astream_answer, get_streaming_metrics
 
-__all__ = ['DataAnalysisAgent','DataAnalysisAgentState']
\ No newline at end of file
+__all__ = ['DataAnalysisAgent','DataAnalysisAgentState','ConversationMemory','StreamEvent','stream_answer','astream_answer','get_streaming_metrics']
\ No newline at end of file
@@ -1,18 +1,27 @@
+import asyncio
+import contextvars
 import logging
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from dotenv import load_dotenv
 from datetime import datetime
-from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, filter_messages
+from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import START, END, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 
 from helper_functions import *
 from plot_agent import PlotAgent, PlotAgentState
+from result_registry import ResultRegistry
 from sql_agent import SqlAgent, SqlAgentState
+from .memory import ConversationMemory, get_prompt_store
+from .question_cache import get_shared_question_cache
+from .streaming import ANSWER_STREAM_KEY, SUPERVISOR_STREAM, FINAL_ANSWER_STREAM
 from .state import DataAnalysisAgentState, SupervisorOutput, ExplorerOutput
 
 
@@ -20,8 +29,12 @@ class DataAnalysisAgent:
     def __init__(self):
         self.script_directory = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/")
         self.system_prompt_dict = self._get_system_prompt_dict()
-        self.llm_name = self._get_config()
-        self.llm = self._get_llm(model_name = self.llm_name)
+        (self.llm_name, self.max_concurrent_sql_agents, self.llm_cache_bypass_nodes,
+         self.question_cache_enabled, question_cache_config, self.memory_config,
+         self.scan_budget_config) = self._get_config()
+        self.question_cache = get_shared_question_cache(**question_cache_config)
+        self.llm_cache = get_shared_llm_cache().for_agent('Data analysis agent', bypass_nodes=self.llm_cache_bypass_nodes)
+        self.llm = self._get_llm(model_name = self.llm_name, cache=self.llm_cache)
         self.sql_agent = SqlAgent().get_sql_agent()
         self.plot_agent = PlotAgent().get_plot_agent()
 
@@ -35,23 +48,41 @@ class DataAnalysisAgent:
         config_path = os.path.join(self.script_directory, 'files','config.json')
         with open(config_path, 'rb') as f:
             config = json.load(f)
-        return config['llm_name']
+        question_cache_config = {
+            'similarity_threshold': config['question_cache_similarity_threshold'],
+            'max_age_seconds': config['question_cache_max_age_seconds'],
+            'max_entries': config['question_cache_max_entries']
+        }
+        memory_config = {
+            'max_recent_turns': config['memory_max_recent_turns'],
+            'max_summary_turns': config['memory_max_summary_turns']
+        }
+        scan_budget_config = {
+            'max_bytes_per_query': config['max_bytes_per_query'],
+            'max_bytes_per_conversation': config['max_bytes_per_conversation']
+        }
+        return (config['llm_name'], config['max_concurrent_sql_agents'], config['llm_cache_bypass_nodes'],
+                config['question_cache_enabled'], question_cache_config, memory_config, scan_budget_config)
 
     @staticmethod
-    def _get_llm(model_name:str):
+    def _get_llm(model_name:str, cache:AgentLLMCache):
         load_dotenv()
-        return ChatGoogleGenerativeAI(model=model_name)
+        return ChatGoogleGenerativeAI(model=model_name, cache=cache)
 
-    def _llm_node_supervisor(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+    def _supervisor_messages(self, state: DataAnalysisAgentState) -> list:
 
         supervisor_system_prompt_template = PromptTemplate(
             input_variables=['chat_history','format_instructions','sql_description'],
             template=self.system_prompt_dict['supervisor']
         )
 
-        memory = filter_messages(state['messages'], include_ids=['0', '1'])
-        memory = memory[-10:]
-        memory = [truncate_message(m, max_words=50) for m in memory]
+        # Only the bounded conversation memory is carried between turns; `messages` is this turn's log.
+        if state.get('memory') is None:
+            state['memory'] = ConversationMemory(**self.memory_config)
+        # Likewise the scan budget: the SQL and plot agents of every turn charge the same one.
+        if state.get('scan_budget') is None:
+            state['scan_budget'] = ScanBudget(**self.scan_budget_config)
+        memory = state['memory'].history_messages()
 
         pydantic_parser = PydanticOutputParser(pydantic_object=SupervisorOutput)
         format_instructions = pydantic_parser.get_format_instructions()
@@ -72,11 +103,14 @@ class DataAnalysisAgent:
         human_msg = HumanMessage(content=f"user_question:\n{user_question}\n current date and time: {current_time}", id="0")
 
         state['messages'].append(human_msg)
-        state['messages'].append(system_msg)
+        state['messages'].append(get_prompt_store().reference('supervisor', supervisor_system_prompt))
+
+        return [system_msg, human_msg]
 
-        response = self.llm.invoke([system_msg, human_msg])
+    @staticmethod
+    def _record_supervisor_decision(state: DataAnalysisAgentState, response) -> DataAnalysisAgentState:
 
-        supervisor_output = pydantic_parser.parse(response.content)
+        supervisor_output = PydanticOutputParser(pydantic_object=SupervisorOutput).parse(response.content)
         state['supervisor_decision'] = supervisor_output
 
         if state['supervisor_decision'].decision == 'response':
@@ -84,19 +118,92 @@ class DataAnalysisAgent:
             chat_response = state['supervisor_decision'].response
             state['messages'].append(AIMessage(content= chat_response, id = '1'))
             state['chat_response'] = chat_response
+            state['memory'].add_turn(state['user_question'], chat_response)
 
         else:
 
             explore = state['supervisor_decision'].explore
             state['messages'].append(AIMessage(content=explore, id='3'))
+            report_progress(f"Supervisor decided to explore: {explore}")
 
         return state
 
+    def _llm_node_supervisor(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+        response = self.llm.invoke(self._supervisor_messages(state), config={'metadata': {ANSWER_STREAM_KEY: SUPERVISOR_STREAM}})
+        return self._record_supervisor_decision(state, response)
+
+    async def _allm_node_supervisor(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+        # The schema catalog may refresh itself from BigQuery, so the prompt is built in a worker thread.
+        messages = await asyncio.to_thread(self._supervisor_messages, state)
+        response = await self.llm.ainvoke(messages, config={'metadata': {ANSWER_STREAM_KEY: SUPERVISOR_STREAM}})
+        return self._record_supervisor_decision(state, response)
+
     @staticmethod
     def _router_node_supervisor_decision(state: DataAnalysisAgentState)->str:
         return state['supervisor_decision'].decision
 
-    def _llm_node_explorer(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+    def _question_cache_lookup(self, state: DataAnalysisAgentState):
+        try:
+            return self.question_cache.lookup(
+                question=state['supervisor_decision'].explore,
+                data_version=get_data_version()
+            )
+        except Exception as e:
+            logging.error(f" Data analysis agent | Question cache lookup failed: {str(e)}")
+            return None
+
+    @staticmethod
+    def _record_question_cache_result(state: DataAnalysisAgentState, entry) -> DataAnalysisAgentState:
+
+        if entry is None:
+            return {'question_cache_hit': False}
+
+        state['messages'].append(AIMessage(content=entry.chat_response, id='1'))
+        state['memory'].add_turn(state['user_question'], entry.chat_response)
+        report_progress("Answered from the question cache")
+        return {
+            'question_cache_hit': True,
+            'messages': state['messages'],
+            'memory': state['memory'],
+            'chat_response': entry.chat_response,
+            'plot_agent_response': entry.plot_agent_response,
+            'plot_file_path': entry.plot_file_path
+        }
+
+    def _question_cache_node(self, state: DataAnalysisAgentState) -> DataAnalysisAgentState:
+        if not self.question_cache_enabled:
+            return {'question_cache_hit': False}
+        return self._record_question_cache_result(state, self._question_cache_lookup(state))
+
+    async def _aquestion_cache_node(self, state: DataAnalysisAgentState) -> DataAnalysisAgentState:
+        if not self.question_cache_enabled:
+            return {'question_cache_hit': False}
+        entry = await asyncio.to_thread(self._question_cache_lookup, state)
+        return self._record_question_cache_result(state, entry)
+
+    @staticmethod
+    def _router_node_question_cache(state: DataAnalysisAgentState) -> str:
+        return 'hit' if state['question_cache_hit'] else 'miss'
+
+    def _store_in_question_cache(self, state: DataAnalysisAgentState) -> None:
+        # Answers built on failed SQL/plot agent runs are not worth serving again.
+        sql_failed = state.get('sql_agent_failed', False)
+        plot_failed = bool(state['explorer_decision'].plot_description) and not state.get('plot_file_path')
+        if sql_failed or plot_failed:
+            return
+
+        try:
+            self.question_cache.store(
+                question=state['supervisor_decision'].explore,
+                chat_response=state['chat_response'],
+                plot_file_path=state.get('plot_file_path'),
+                plot_agent_response=state.get('plot_agent_response'),
+                data_version=get_data_version()
+            )
+        except Exception as e:
+            logging.error(f" Data analysis agent | Failed to store the answer in the question cache: {str(e)}")
+
+    def _explorer_messages(self, state: DataAnalysisAgentState) -> list:
 
         explorer_system_prompt_template = PromptTemplate(
             input_variables=['current_time','format_instructions','sql_description'],
@@ -114,65 +221,182 @@ class DataAnalysisAgent:
         )
 
         system_msg = SystemMessage(content=explorer_system_prompt, id="2")
-        state['messages'].append(system_msg)
+        state['messages'].append(get_prompt_store().reference('explorer', explorer_system_prompt))
 
         exploration_instruction = state['supervisor_decision'].explore
         human_msg = HumanMessage(content=exploration_instruction)
 
-        response = self.llm.invoke([system_msg, human_msg])
-        explorer_output = pydantic_parser.parse(response.content)
+        return [system_msg, human_msg]
+
+    @staticmethod
+    def _record_explorer_decision(state: DataAnalysisAgentState, response) -> DataAnalysisAgentState:
+        explorer_output = PydanticOutputParser(pydantic_object=ExplorerOutput).parse(response.content)
 
         state['explorer_decision'] = explorer_output
+        # The SQL agents publish their result frames here so the plot agent can reuse one of them.
+        state['result_registry'] = ResultRegistry(explorer_output.questions_for_sql_agent)
         state['messages'].append(AIMessage(content=explorer_output.model_dump_json(indent=2),id='3'))
 
+        plan = f"Explorer planned {len(explorer_output.questions_for_sql_agent)} SQL question(s)"
+        report_progress(plan + (" and a plot" if explorer_output.plot_description else ""))
+
         return state
 
-    def _sql_agent_node(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+    def _llm_node_explorer(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+        response = self.llm.invoke(self._explorer_messages(state))
+        return self._record_explorer_decision(state, response)
 
-        sql_agent_result = []
-        for question in state['explorer_decision'].questions_for_sql_agent:
-            sql_agent_state: SqlAgentState = {
-                "question": question,
-                "messages": []
-                }
+    async def _allm_node_explorer(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+        messages = await asyncio.to_thread(self._explorer_messages, state)
+        response = await self.llm.ainvoke(messages)
+        return self._record_explorer_decision(state, response)
+
+    @staticmethod
+    def _sql_agent_error(question: str, e: Exception) -> tuple:
+        full_trace = "".join(traceback.format_exception(e))
+        logging.error(f'An error occurred during SQL agent while try to answer the question:\n {question} \n error :\n {full_trace}')
+        return {question: f'An error occurred in SQL agent:\n {e}'}, False
+
+    @staticmethod
+    def _sql_agent_answer(question: str, response: SqlAgentState) -> tuple:
+        # The answer is prose unless in direct evidence mode, so whether the agent got a query result (rather than
+        # running out of attempts) is read from its state, not from the answer text.
+        return {question: response['response']}, response.get('query_result') is not None
+
+    def _invoke_sql_agent(self, question_index: int, question: str, result_registry: ResultRegistry,
+                          scan_budget: Optional[ScanBudget]) -> tuple:
+        sql_agent_state: SqlAgentState = {
+            "question": question,
+            "messages": [],
+            "result_registry": result_registry,
+            "question_index": question_index,
+            "scan_budget": scan_budget
+            }
+        try:
+            response = self.sql_agent.invoke(sql_agent_state)
+            return self._sql_agent_answer(question, response)
+
+        except Exception as e:
+            result_registry.fail(question_index)
+            return self._sql_agent_error(question, e)
+
+    async def _ainvoke_sql_agent(self, question_index: int, question: str, result_registry: ResultRegistry,
+                                 scan_budget: Optional[ScanBudget], semaphore: asyncio.Semaphore) -> tuple:
+        sql_agent_state: SqlAgentState = {
+            "question": question,
+            "messages": [],
+            "result_registry": result_registry,
+            "question_index": question_index,
+            "scan_budget": scan_budget
+            }
+        async with semaphore:
             try:
-                response = self.sql_agent.invoke(sql_agent_state)
-                sql_agent_result.append({question: response['response']})
+                response = await self.sql_agent.ainvoke(sql_agent_state)
+                return self._sql_agent_answer(question, response)
 
             except Exception as e:
+                result_registry.fail(question_index)
+                return self._sql_agent_error(question, e)
 
-                full_trace = "".join(traceback.format_exception(e))
-                sql_agent_result.append({question: f'An error occurred in SQL agent:\n {e}'})
-                logging.error(f'An error occurred during SQL agent while try to answer the question:\n {question} \n error :\n {full_trace}')
+    def _sql_agent_node(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
 
-        return {'sql_agent_response':sql_agent_result}
+        questions = state['explorer_decision'].questions_for_sql_agent
+        if not questions:
+            return {'sql_agent_response': [], 'sql_agent_failed': False}
+        report_progress(f"Running {len(questions)} SQL question(s)")
+
+        # Each sub-question is independent (see the explorer prompt), so they are fanned out to a bounded
+        # pool of threads. executor.map keeps the results in the original question order, and every worker
+        # runs in a copy of this thread's context so LangChain callbacks/config (and tracing) still propagate.
+        # A context can only be entered by one thread at a time, so each question gets its own copy.
+        max_workers = max(1, min(self.max_concurrent_sql_agents, len(questions)))
+        contexts = [contextvars.copy_context() for _ in questions]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sql-agent') as executor:
+            sql_agent_result = list(executor.map(
+                lambda context, item: context.run(self._invoke_sql_agent, *item, state['result_registry'], state.get('scan_budget')),
+                contexts,
+                enumerate(questions)
+            ))
+
+        report_progress(f"Answered {len(sql_agent_result)} SQL question(s)")
+        return {'sql_agent_response': [qa for qa, _ in sql_agent_result],
+                'sql_agent_failed': not all(succeeded for _, succeeded in sql_agent_result)}
+
+    async def _asql_agent_node(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+
+        questions = state['explorer_decision'].questions_for_sql_agent
+        if not questions:
+            return {'sql_agent_response': [], 'sql_agent_failed': False}
+        report_progress(f"Running {len(questions)} SQL question(s)")
+
+        # Same fan-out as the sync node, as tasks on the event loop; gather keeps the question order.
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_sql_agents))
+        sql_agent_result = await asyncio.gather(
+            *(self._ainvoke_sql_agent(index, question, state['result_registry'], state.get('scan_budget'), semaphore)
+              for index, question in enumerate(questions))
+        )
 
-    def _plot_agent_node(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+        report_progress(f"Answered {len(sql_agent_result)} SQL question(s)")
+        return {'sql_agent_response': [qa for qa, _ in sql_agent_result],
+                'sql_agent_failed': not all(succeeded for _, succeeded in sql_agent_result)}
 
+    @staticmethod
+    def _plot_agent_state(state: DataAnalysisAgentState) -> Optional[PlotAgentState]:
         if (state['explorer_decision'].plot_description == '') or (state['explorer_decision'].plot_description is None):
+            return None
+
+        question = state['supervisor_decision'].explore
+        plot_description = state['explorer_decision'].plot_description
+        plot_agent_state: PlotAgentState = {
+            "question": question,
+            "messages": [],
+            "plot_description": plot_description,
+            "result_registry": state.get('result_registry'),
+            "data_question_index": state['explorer_decision'].plot_data_question_index,
+            "scan_budget": state.get('scan_budget')
+        }
+        return plot_agent_state
+
+    @staticmethod
+    def _plot_agent_error(e: Exception) -> dict:
+        full_trace = "".join(traceback.format_exception(e))
+        logging.error(f'An error occurred during Plot agent:\n {full_trace}')
+
+        return {'plot_agent_response': None, 'plot_file_path': None}
+
+    def _plot_agent_node(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
+
+        plot_agent_state = self._plot_agent_state(state)
+        if plot_agent_state is None:
             return {'plot_agent_response': None, 'plot_file_path': None}
+        report_progress("Rendering the plot")
 
-        else:
-            question = state['supervisor_decision'].explore
-            plot_description = state['explorer_decision'].plot_description
-            plot_agent_state: PlotAgentState = {
-                "question": question,
-                "messages": [],
-                "plot_description": plot_description
-            }
-            try:
-                res = self.plot_agent.invoke(plot_agent_state)
+        try:
+            res = self.plot_agent.invoke(plot_agent_state)
+            report_progress("Plot ready" if res['saved_plot_path'] else "Plot could not be generated")
 
-                return {'plot_agent_response': res['plot_analysis'], 'plot_file_path': res['saved_plot_path']}
+            return {'plot_agent_response': res['plot_analysis'], 'plot_file_path': res['saved_plot_path']}
 
-            except Exception as e:
+        except Exception as e:
+            return self._plot_agent_error(e)
+
+    async def _aplot_agent_node(self,state: DataAnalysisAgentState)->DataAnalysisAgentState:
 
-                full_trace = "".join(traceback.format_exception(e))
-                logging.error(f'An error occurred during Plot agent:\n {full_trace}')
+        plot_agent_state = self._plot_agent_state(state)
+        if plot_agent_state is None:
+            return {'plot_agent_response': None, 'plot_file_path': None}
+        report_progress("Rendering the plot")
 
-                return {'plot_agent_response': None, 'plot_file_path': None}
+        try:
+            res = await self.plot_agent.ainvoke(plot_agent_state)
+            report_progress("Plot ready" if res['saved_plot_path'] else "Plot could not be generated")
 
-    def _llm_node_final_answer_generator(self, state: DataAnalysisAgentState) -> DataAnalysisAgentState:
+            return {'plot_agent_response': res['plot_analysis'], 'plot_file_path': res['saved_plot_path']}
+
+        except Exception as e:
+            return self._plot_agent_error(e)
+
+    def _final_answer_generator_messages(self, state: DataAnalysisAgentState) -> list:
         supervisor_system_prompt_template = PromptTemplate(
             input_variables=['questions_and_answers_fetched_from_sql', 'plot_analysis_fetched_from_plot_agent'],
             template=self.system_prompt_dict['final_answer_generator']
@@ -192,36 +416,72 @@ class DataAnalysisAgent:
         )
 
         system_msg = SystemMessage(content=final_answer_system_prompt, id="2")
-        state['messages'].append(system_msg)
+        state['messages'].append(get_prompt_store().reference('final answer generator', final_answer_system_prompt))
 
         human_msg = HumanMessage(content=state['supervisor_decision'].explore)
 
-        response = self.llm.invoke([system_msg, human_msg])
+        return [system_msg, human_msg]
+
+    @staticmethod
+    def _record_final_answer(state: DataAnalysisAgentState, response) -> DataAnalysisAgentState:
         final_answer = response.content
 
         state['messages'].append(AIMessage(content=final_answer, id='1'))
         state['chat_response'] = final_answer
+        state['memory'].add_turn(state['user_question'], final_answer)
+        # The shared result frames are only needed within the turn.
+        state['result_registry'] = None
+
+        return state
+
+    def _llm_node_final_answer_generator(self, state: DataAnalysisAgentState) -> DataAnalysisAgentState:
+        report_progress("Writing the final answer")
+        response = self.llm.invoke(self._final_answer_generator_messages(state), config={'metadata': {ANSWER_STREAM_KEY: FINAL_ANSWER_STREAM}})
+        state = self._record_final_answer(state, response)
+
+        if self.question_cache_enabled:
+            self._store_in_question_cache(state)
+
+        return state
+
+    async def _allm_node_final_answer_generator(self, state: DataAnalysisAgentState) -> DataAnalysisAgentState:
+        report_progress("Writing the final answer")
+        response = await self.llm.ainvoke(self._final_answer_generator_messages(state), config={'metadata': {ANSWER_STREAM_KEY: FINAL_ANSWER_STREAM}})
+        state = self._record_final_answer(state, response)
+
+        if self.question_cache_enabled:
+            await asyncio.to_thread(self._store_in_question_cache, state)
 
         return state
 
     def get_data_analysis_agent(self)->CompiledStateGraph:
 
         builder = StateGraph(DataAnalysisAgentState)
-        builder.add_node('supervisor',self._llm_node_supervisor)
-        builder.add_node('explorer',self._llm_node_explorer)
-        builder.add_node('SQL agent',self._sql_agent_node)
-        builder.add_node('Plot agent', self._plot_agent_node)
-        builder.add_node('Final answer generator',self._llm_node_final_answer_generator)
+        # Every node has a sync and an async variant, so the graph runs with invoke and with ainvoke/astream.
+        builder.add_node('supervisor',RunnableLambda(self._llm_node_supervisor, afunc=self._allm_node_supervisor))
+        builder.add_node('Question cache',RunnableLambda(self._question_cache_node, afunc=self._aquestion_cache_node))
+        builder.add_node('explorer',RunnableLambda(self._llm_node_explorer, afunc=self._allm_node_explorer))
+        builder.add_node('SQL agent',RunnableLambda(self._sql_agent_node, afunc=self._asql_agent_node))
+        builder.add_node('Plot agent', RunnableLambda(self._plot_agent_node, afunc=self._aplot_agent_node))
+        builder.add_node('Final answer generator',RunnableLambda(self._llm_node_final_answer_generator, afunc=self._allm_node_final_answer_generator))
 
         builder.add_edge(START,'supervisor')
         builder.add_conditional_edges(
             source="supervisor",
             path=self._router_node_supervisor_decision,
             path_map={
-                    'explore':'explorer',
+                    'explore':'Question cache',
                     'response':END
             }
         )
+        builder.add_conditional_edges(
+            source="Question cache",
+            path=self._router_node_question_cache,
+            path_map={
+                    'miss':'explorer',
+                    'hit':END
+            }
+        )
         builder.add_edge( 'explorer','SQL agent')
         builder.add_edge('explorer', 'Plot agent')
 
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+
+def _truncate_words(text: str, max_words: int) -> str:
+    words = str(text).split()
+    if len(words) <= max_words:
+        return " ".join(words)
+    return " ".join(words[:max_words]) + "…"
+
+
+class ConversationMemory:
+    """Bounded memory of one conversation, holding only what the supervisor reads.
+
+    The last `max_recent_turns` turns are kept as (question, answer) pairs truncated to `max_words`.
+    Older turns are compacted into one summary line each, and only the last `max_summary_turns` lines
+    are kept, so the memory (and the chat history rendered from it) has a constant size however long
+    the conversation runs.
+    """
+
+    def __init__(self, max_recent_turns: int = 5, max_summary_turns: int = 20, max_words: int = 50,
+                 summary_words: int = 15) -> None:
+        """Initialize an empty memory.
+
+        Args:
+            max_recent_turns: Number of latest turns kept (truncated) verbatim.
+            max_summary_turns: Number of older turns kept as compact summary lines.
+            max_words: Maximum number of words kept of each recent question and answer.
+            summary_words: Maximum number of words kept of each question and answer in a summary line.
+        """
+        self.max_recent_turns = max_recent_turns
+        self.max_summary_turns = max_summary_turns
+        self.max_words = max_words
+        self.summary_words = summary_words
+
+        self.recent_turns = deque()
+        self.summary_lines = deque(maxlen=max_summary_turns)
+        self.total_turns = 0
+
+    def add_turn(self, question: str, answer: str) -> None:
+        """Record a finished turn, compacting the oldest recent turn if the memory is full."""
+        self.recent_turns.append((_truncate_words(question, self.max_words), _truncate_words(answer, self.max_words)))
+        self.total_turns += 1
+        while len(self.recent_turns) > self.max_recent_turns:
+            old_question, old_answer = self.recent_turns.popleft()
+            self.summary_lines.append(
+                f"Q: {_truncate_words(old_question, self.summary_words)} | A: {_truncate_words(old_answer, self.summary_words)}"
+            )
+
+    def history_messages(self) -> List[BaseMessage]:
+        """Return the chat history for the supervisor: a summary of older turns, then the recent turns."""
+        messages = []
+        summarized_turns = self.total_turns - len(self.recent_turns)
+        if summarized_turns:
+            dropped_turns = summarized_turns - len(self.summary_lines)
+            lines = ([f"({dropped_turns} earlier turns omitted)"] if dropped_turns else []) + list(self.summary_lines)
+            messages.append(SystemMessage(content="Summary of earlier turns:\n" + "\n".join(lines), id="4"))
+        for question, answer in self.recent_turns:
+            messages.append(HumanMessage(content=question, id="0"))
+            messages.append(AIMessage(content=answer, id="1"))
+        return messages
+
+    def __len__(self) -> int:
+        return self.total_turns
+
+
+class PromptStore:
+    """Keeps each distinct rendered system prompt once and hands out small reference messages to it.
+
+    The per-turn message log stores these references instead of a copy of every prompt (each of which
+    embeds the schema text). Only the last `max_prompts` distinct prompts are kept for `resolve`.
+    """
+
+    def __init__(self, max_prompts: int = 64) -> None:
+        self.max_prompts = max_prompts
+        self._prompts: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reference(self, name: str, prompt: str) -> SystemMessage:
+        """Store `prompt` and return a SystemMessage referring to it."""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._prompts[digest] = prompt
+            self._prompts.move_to_end(digest)
+            while len(self._prompts) > self.max_prompts:
+                self._prompts.popitem(last=False)
+        return SystemMessage(
+            content=f"[{name} system prompt {digest[:12]}, {len(prompt)} characters]",
+            id="2",
+            additional_kwargs={"prompt_ref": digest},
+        )
+
+    def resolve(self, message: BaseMessage) -> Optional[str]:
+        """Return the full prompt a reference message points to, or None if it is no longer stored."""
+        digest = message.additional_kwargs.get("prompt_ref")
+        with self._lock:
+            return self._prompts.get(digest)
+
+
+_prompt_store = PromptStore()
+
+
+def get_prompt_store() -> PromptStore:
+    """Return the process-wide store of rendered system prompts."""
+    return _prompt_store
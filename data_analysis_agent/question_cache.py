@@ -0,0 +1,350 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+# Words that carry no meaning for telling two analytics questions apart: function words, request phrasing and
+# verbs that only connect the entities ("orders placed by users", "users located in Brazil").
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "per", "by", "to", "from", "with", "and", "or", "as",
+    "me", "show", "give", "list", "get", "find", "tell", "display", "provide", "what", "which", "how", "is",
+    "are", "was", "were", "be", "do", "does", "did", "each", "every", "please", "can", "could", "you", "i",
+    "we", "our", "my", "about", "over", "during", "within", "across", "there", "their", "that", "this",
+    "these", "those", "it", "its", "all", "have", "has", "had", "want", "would", "like", "see", "user_question",
+    "they", "them", "who", "whose", "also", "along", "together", "plus", "both", "so", "far", "into", "up",
+    "total", "overall", "breakdown", "broken", "down", "split", "trend", "develop", "development", "evolve",
+    "place", "placed", "make", "made", "located", "living", "based", "generated", "compare", "compared", "versus",
+    "vs", "same", "period", "time", "respective", "corresponding", "including", "include", "calculate", "compute",
+}
+
+# Different words for the same thing, mapped to one canonical word.
+SYNONYMS = {
+    "daily": "day", "weekly": "week", "monthly": "month", "yearly": "year", "annual": "year", "annually": "year",
+    "customer": "user", "client": "user", "buyer": "user", "shopper": "user", "purchase": "order",
+    "number": "count", "many": "count", "amount": "count", "highest": "top", "best": "top", "most": "top",
+    "lowest": "bottom", "worst": "bottom", "least": "bottom", "woman": "female", "women": "female", "man": "male",
+    "men": "male", "complete": "completed",
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30, "ninety": 90,
+}
+
+_RELATIVE_WINDOW = re.compile(
+    r"\b(?:last|past|previous|prior|recent)\s+(\d+|" + "|".join(NUMBER_WORDS) + r")?\s*(day|week|month|quarter|year)s?\b"
+)
+_CURRENT_PERIOD = re.compile(r"\b(?:this|current)\s+(week|month|quarter|year)\b|\b(?:year|month|quarter|week)\s+to\s+date\b")
+_SINGLE_DAY = re.compile(r"\b(today|yesterday)\b")
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def _months_before(today: date, months: int) -> date:
+    # Calendar months back, clamped to the end of shorter months (March 31 minus one month is February 28/29).
+    return (pd.Timestamp(today) - pd.DateOffset(months=months)).date()
+
+
+def _period_start(today: date, unit: str) -> date:
+    if unit == "week":
+        return today - timedelta(days=today.weekday())
+    if unit == "month":
+        return today.replace(day=1)
+    if unit == "quarter":
+        return today.replace(month=3 * ((today.month - 1) // 3) + 1, day=1)
+    return today.replace(month=1, day=1)
+
+
+def resolve_date_window(text: str, today: date) -> Tuple[Optional[Tuple[str, str]], str]:
+    """Resolve the date window a question refers to and remove the date phrases from it.
+
+    Relative phrases ("last 14 days", "past two weeks", "this month", "yesterday") are resolved against
+    `today`, so "last 14 days" and "past two weeks" give the same window. Explicit ISO dates are kept as is.
+
+    Args:
+        text: Lower-cased question text.
+        today: Date the relative phrases are resolved against.
+
+    Returns:
+        The (start, end) window as ISO dates, or None if the question has no date phrase, and the text
+        with the date phrases removed.
+    """
+    starts, ends = [], []
+
+    def relative_window(match):
+        count = match.group(1)
+        count = 1 if count is None else int(NUMBER_WORDS.get(count, count))
+        unit = match.group(2)
+        if unit == "day":
+            start = today - timedelta(days=count)
+        elif unit == "week":
+            start = today - timedelta(days=7 * count)
+        elif unit == "month":
+            start = _months_before(today, count)
+        elif unit == "quarter":
+            start = _months_before(today, 3 * count)
+        else:
+            start = _months_before(today, 12 * count)
+        starts.append(start)
+        ends.append(today)
+        return " "
+
+    def current_period(match):
+        unit = match.group(1) or match.group(0).split()[0]
+        starts.append(_period_start(today, unit))
+        ends.append(today)
+        return " "
+
+    def single_day(match):
+        day = today if match.group(1) == "today" else today - timedelta(days=1)
+        starts.append(day)
+        ends.append(day)
+        return " "
+
+    def iso_date(match):
+        try:
+            day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return match.group(0)
+        starts.append(day)
+        ends.append(day)
+        return " "
+
+    text = _RELATIVE_WINDOW.sub(relative_window, text)
+    text = _CURRENT_PERIOD.sub(current_period, text)
+    text = _SINGLE_DAY.sub(single_day, text)
+    text = _ISO_DATE.sub(iso_date, text)
+
+    if not starts:
+        return None, text
+    return (min(starts).isoformat(), max(ends).isoformat()), text
+
+
+def _normalize_word(word: str) -> str:
+    for suffix in ("ies", "es", "s"):
+        if word.endswith(suffix) and len(word) > len(suffix) + 2 and not word.endswith("ss"):
+            word = word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+            break
+    return SYNONYMS.get(word, word)
+
+
+def normalize_question(question: str, today: date) -> Tuple[List[str], Tuple]:
+    """Split a question into normalized content words and an exact-match key.
+
+    Args:
+        question: Question text.
+        today: Date relative date phrases are resolved against.
+
+    Returns:
+        The content words in question order (stop words removed, plurals and synonyms folded) and a key made
+        of the resolved date window, the numbers and the set of content words. Questions only match when
+        their keys are equal, so "top 5 products" never matches "top 10 products" and "female users in
+        Brazil" never matches "male users in Japan", however long the rest of the question is.
+    """
+    window, text = resolve_date_window(question.lower(), today)
+    words, numbers = [], []
+    for token in re.findall(r"[a-z_]+|\d+(?:\.\d+)?", text):
+        if token[0].isdigit():
+            numbers.append(token)
+        elif token in NUMBER_WORDS:
+            numbers.append(str(NUMBER_WORDS[token]))
+        elif token not in STOPWORDS:
+            words.append(_normalize_word(token))
+    return words, (window, tuple(sorted(numbers)), tuple(sorted(set(words))))
+
+
+def _shingles(words: List[str]) -> set:
+    # Single words plus unordered pairs of neighbouring words, so "daily orders" and "orders per day"
+    # share their shingles while "orders by user" still differs from "users by order count".
+    shingles = set(words)
+    shingles.update(" ".join(sorted(pair)) for pair in zip(words, words[1:]))
+    return shingles
+
+
+@dataclass
+class _QuestionCacheEntry:
+    question: str
+    signature: Tuple[int, ...]
+    chat_response: str
+    plot_file_path: Optional[str]
+    plot_agent_response: Optional[str]
+    data_version: str
+    created_at: float
+
+
+class QuestionCache:
+    """Returns the previous answer to a near-duplicate question instead of running the agents again.
+
+    Questions are indexed by an exact key (resolved date window, numbers and content words, so entities such
+    as countries, genders, statuses, metrics and columns must all be the same) and compared inside a key with a
+    MinHash estimate of the Jaccard similarity of their word shingles, which only differ in how the words are
+    ordered and paired. Wording differences are absorbed before that, by dropping stop words and folding
+    plurals and synonyms. An entry is only served while it is younger than `max_age_seconds`, the data
+    version it was built on is still current and its plot file still exists.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.8, max_age_seconds: float = 3600,
+                 max_entries: int = 256, num_permutations: int = 64) -> None:
+        """Initialize the cache.
+
+        Args:
+            similarity_threshold: Minimum estimated Jaccard similarity for two questions to be near-duplicates.
+            max_age_seconds: Age after which an answer is considered stale.
+            max_entries: Maximum number of answers kept; the least recently used ones are dropped first.
+            num_permutations: Number of hash functions in each MinHash signature.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+
+        rng = random.Random(0)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_permutations)
+        ]
+        self._entries: "OrderedDict[int, _QuestionCacheEntry]" = OrderedDict()
+        self._index: Dict[Tuple, List[int]] = {}
+        self._entry_keys: Dict[int, Tuple] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._stores = 0
+
+    def _signature(self, words: List[str]) -> Tuple[int, ...]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in _shingles(words)
+        ] or [0]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._permutations)
+
+    @staticmethod
+    def _similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+    def lookup(self, question: str, data_version: str, today: Optional[date] = None) -> Optional[_QuestionCacheEntry]:
+        """Return the answer to the most similar cached question, or None if there is no fresh near-duplicate.
+
+        Args:
+            question: Self-contained description of what the user asks.
+            data_version: Current version of the underlying data; answers built on another version are stale.
+            today: Date relative date phrases are resolved against. Defaults to the current date.
+        """
+        words, key = normalize_question(question, today or date.today())
+        signature = self._signature(words)
+        now = time.time()
+
+        with self._lock:
+            best_entry_id, best_similarity = None, 0.0
+            for entry_id in list(self._index.get(key, [])):
+                entry = self._entries[entry_id]
+                if (now - entry.created_at > self.max_age_seconds or entry.data_version != data_version
+                        or (entry.plot_file_path and not os.path.exists(entry.plot_file_path))):
+                    self._remove(entry_id)
+                    self._stale += 1
+                    continue
+                similarity = self._similarity(signature, entry.signature)
+                if similarity > best_similarity:
+                    best_entry_id, best_similarity = entry_id, similarity
+
+            if best_entry_id is None or best_similarity < self.similarity_threshold:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._entries.move_to_end(best_entry_id)
+            entry = self._entries[best_entry_id]
+
+        logging.info(f"Question cache hit (similarity {best_similarity:.2f}): '{question}' matched '{entry.question}'")
+        return entry
+
+    def store(self, question: str, chat_response: str, plot_file_path: Optional[str],
+              plot_agent_response: Optional[str], data_version: str, today: Optional[date] = None) -> None:
+        """Cache the answer to `question`, replacing the answer to an identical question."""
+        words, key = normalize_question(question, today or date.today())
+        signature = self._signature(words)
+
+        with self._lock:
+            for entry_id in list(self._index.get(key, [])):
+                if self._entries[entry_id].signature == signature:
+                    self._remove(entry_id)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _QuestionCacheEntry(
+                question=question,
+                signature=signature,
+                chat_response=chat_response,
+                plot_file_path=plot_file_path,
+                plot_agent_response=plot_agent_response,
+                data_version=data_version,
+                created_at=time.time(),
+            )
+            self._index.setdefault(key, []).append(entry_id)
+            self._entry_keys[entry_id] = key
+            self._stores += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        """Return hit/miss/stale counters, the hit rate and the number of cached answers."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "stale": self._stale,
+                "stores": self._stores,
+                "entries": len(self._entries),
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+                "max_age_seconds": self.max_age_seconds,
+            }
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._entry_keys.clear()
+
+    def _remove(self, entry_id: int) -> None:
+        key = self._entry_keys.pop(entry_id)
+        self._index[key].remove(entry_id)
+        if not self._index[key]:
+            del self._index[key]
+        del self._entries[entry_id]
+
+
+_shared_question_cache: Optional[QuestionCache] = None
+_shared_question_cache_lock = threading.Lock()
+
+
+def get_shared_question_cache(similarity_threshold: float = 0.8, max_age_seconds: float = 3600,
+                              max_entries: int = 256) -> QuestionCache:
+    """Return the process-wide question cache, so sessions share answers.
+
+    The arguments only apply when the cache is created by the first call.
+    """
+    global _shared_question_cache
+    with _shared_question_cache_lock:
+        if _shared_question_cache is None:
+            _shared_question_cache = QuestionCache(
+                similarity_threshold=similarity_threshold,
+                max_age_seconds=max_age_seconds,
+                max_entries=max_entries,
+            )
+        return _shared_question_cache
@@ -2,6 +2,10 @@ from typing import List, TypedDict, Literal, Optional
 
 from pydantic import BaseModel, Field
 
+from bq_client import ScanBudget
+from result_registry import ResultRegistry
+from .memory import ConversationMemory
+
 
 class SupervisorOutput(BaseModel):
     response: str = Field(
@@ -44,13 +48,25 @@ class ExplorerOutput(BaseModel):
             "sorting, filters/aggregation). Leave empty if no plot is needed."
         )
     )
+    plot_data_question_index: Optional[int] = Field(
+        default=None,
+        description=(
+            "The 0-based index of the question in questions_for_sql_agent whose result already contains all the data "
+            "the plot needs (the plot may still group, filter or sort it). Null if no single question covers it."
+        )
+    )
 
 class DataAnalysisAgentState(TypedDict):
     user_question:str
     messages :list
+    memory: Optional[ConversationMemory]
+    scan_budget: Optional[ScanBudget]
     supervisor_decision : SupervisorOutput
+    question_cache_hit: bool
     explorer_decision: ExplorerOutput
+    result_registry: Optional[ResultRegistry]
     sql_agent_response: List[dict]
+    sql_agent_failed: bool
     plot_agent_response: Optional[str]
     plot_file_path: Optional[str]
     chat_response:str
\ No newline at end of file
@@ -0,0 +1,172 @@
+import logging
+import statistics
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, NamedTuple, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.utils.json import parse_json_markdown
+from langgraph.graph.state import CompiledStateGraph
+
+from tracing import get_tracer
+
+
+# Run metadata key marking the LLM calls whose tokens are shown to the user, and its values.
+ANSWER_STREAM_KEY = "answer_stream"
+SUPERVISOR_STREAM = "supervisor"
+FINAL_ANSWER_STREAM = "final_answer"
+
+STREAM_MODES = ["custom", "messages", "values"]
+
+
+class StreamEvent(NamedTuple):
+    """One event of a streamed answer.
+
+    `kind` is "progress" (content: a status line from a node), "token" (content: the next piece of
+    the answer text) or "final" (content: the final graph state).
+    """
+    kind: str
+    content: Any
+
+
+class StreamingMetrics:
+    """Time to first answer token and total time of streamed answers, kept for the last `max_samples` answers."""
+
+    def __init__(self, max_samples: int = 1000) -> None:
+        self.max_samples = max_samples
+        self._first_token_seconds: List[float] = []
+        self._total_seconds: List[float] = []
+        self._lock = threading.Lock()
+
+    def record(self, first_token_seconds: Optional[float], total_seconds: float) -> None:
+        with self._lock:
+            if first_token_seconds is not None:
+                self._first_token_seconds = (self._first_token_seconds + [first_token_seconds])[-self.max_samples:]
+            self._total_seconds = (self._total_seconds + [total_seconds])[-self.max_samples:]
+
+    def stats(self) -> dict:
+        """Return the number of answers and the p50/p95 time to first token and total time, in seconds."""
+        with self._lock:
+            first_token_seconds = list(self._first_token_seconds)
+            total_seconds = list(self._total_seconds)
+        return {
+            "answers": len(total_seconds),
+            "streamed_answers": len(first_token_seconds),
+            "first_token_p50_seconds": _percentile(first_token_seconds, 50),
+            "first_token_p95_seconds": _percentile(first_token_seconds, 95),
+            "total_p50_seconds": _percentile(total_seconds, 50),
+            "total_p95_seconds": _percentile(total_seconds, 95),
+        }
+
+
+def _percentile(values: List[float], percentile: int) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percentile - 1]
+
+
+_streaming_metrics = StreamingMetrics()
+
+
+def get_streaming_metrics() -> StreamingMetrics:
+    """Return the process-wide metrics of streamed answers."""
+    return _streaming_metrics
+
+
+def _message_text(message: AIMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+class _AnswerStreamParser:
+    """Turns the (mode, chunk) pairs of a graph stream into StreamEvents and measures the answer timings."""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.final_state: Optional[dict] = None
+        self._supervisor_output = ""
+        self._supervisor_response_length = 0
+
+    def events(self, mode: str, chunk: Any) -> Iterator[StreamEvent]:
+        if mode == "custom":
+            if isinstance(chunk, dict) and "progress" in chunk:
+                yield StreamEvent("progress", chunk["progress"])
+
+        elif mode == "values":
+            self.final_state = chunk
+
+        elif mode == "messages":
+            message, metadata = chunk
+            stream = metadata.get(ANSWER_STREAM_KEY)
+            # Nested agent graphs run inside nodes and have a nested namespace; only top-level calls are shown.
+            if stream is None or "|" in metadata.get("langgraph_checkpoint_ns", ""):
+                return
+
+            if stream == FINAL_ANSWER_STREAM:
+                text = _message_text(message)
+            else:
+                text = self._supervisor_response_delta(_message_text(message))
+
+            if text:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                yield StreamEvent("token", text)
+
+    def _supervisor_response_delta(self, text: str) -> str:
+        # The supervisor answers with JSON; its `response` field is only non-empty for a direct reply,
+        # so the growing value of that field is what gets streamed.
+        self._supervisor_output += text
+        try:
+            parsed = parse_json_markdown(self._supervisor_output)
+        except Exception:
+            return ""
+        response = parsed.get("response") if isinstance(parsed, dict) else None
+        if not isinstance(response, str) or len(response) <= self._supervisor_response_length:
+            return ""
+        delta = response[self._supervisor_response_length:]
+        self._supervisor_response_length = len(response)
+        return delta
+
+    def finish(self) -> StreamEvent:
+        total_seconds = time.perf_counter() - self.started_at
+        first_token_seconds = None if self.first_token_at is None else self.first_token_at - self.started_at
+        get_streaming_metrics().record(first_token_seconds, total_seconds)
+        if first_token_seconds is not None:
+            logging.info(f"Answer streamed | time to first token: {first_token_seconds:.2f}s | total: {total_seconds:.2f}s")
+        else:
+            logging.info(f"Answer returned without streamed tokens | total: {total_seconds:.2f}s")
+        return StreamEvent("final", self.final_state)
+
+
+def _traced_config() -> dict:
+    # Every answered question is recorded as one trace (see tracing.py).
+    return {"run_name": "Data analysis agent", "callbacks": [get_tracer().callback_handler()]}
+
+
+def stream_answer(graph: CompiledStateGraph, state: dict) -> Iterator[StreamEvent]:
+    """Run the data analysis graph and yield its progress events, the answer tokens and finally the final state.
+
+    Args:
+        graph: The compiled data analysis graph.
+        state: The input DataAnalysisAgentState.
+
+    Yields:
+        StreamEvents; the last one has kind "final" and the final graph state as content.
+    """
+    parser = _AnswerStreamParser()
+    for mode, chunk in graph.stream(state, config=_traced_config(), stream_mode=STREAM_MODES):
+        yield from parser.events(mode, chunk)
+    yield parser.finish()
+
+
+async def astream_answer(graph: CompiledStateGraph, state: dict) -> AsyncIterator[StreamEvent]:
+    """Async variant of `stream_answer`, driving the graph with `astream`."""
+    parser = _AnswerStreamParser()
+    async for mode, chunk in graph.astream(state, config=_traced_config(), stream_mode=STREAM_MODES):
+        for event in parser.events(mode, chunk):
+            yield event
+    yield parser.finish()
@@ -0,0 +1,274 @@
+"""Local DuckDB execution of the agents' BigQuery queries over Parquet snapshots of the dataset tables.
+
+`DuckDBClient` implements the parts of `google.cloud.bigquery.Client` that `BigQueryRunner` uses (`query`, including
+dry runs, `get_table` and `list_rows`), so a runner can execute against a snapshot directory instead of BigQuery.
+Queries are translated from BigQuery to DuckDB SQL by `sql_dialect.translate_to_duckdb`. `LocalFirstClient` wraps a
+BigQuery client and serves aggregate queries from the snapshot while it is fresh, falling back to BigQuery for
+everything else.
+
+A snapshot directory holds one `<table>.parquet` file per table and a `snapshot.json` manifest written by
+`export_snapshot`:
+
+    python -m duckdb_backend /path/to/snapshot
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+from sql_dialect import DuckDBTranslation, translate_to_duckdb, is_aggregate_query
+
+MANIFEST_FILE_NAME = "snapshot.json"
+
+# DuckDB column types and the BigQuery types reported for them in table schemas.
+_BIGQUERY_TYPES = {
+    "BIGINT": "INTEGER", "INTEGER": "INTEGER", "SMALLINT": "INTEGER", "TINYINT": "INTEGER", "HUGEINT": "INTEGER",
+    "DOUBLE": "FLOAT", "FLOAT": "FLOAT", "VARCHAR": "STRING", "BOOLEAN": "BOOLEAN", "DATE": "DATE",
+    "TIMESTAMP WITH TIME ZONE": "TIMESTAMP", "TIMESTAMP": "DATETIME", "BLOB": "BYTES",
+}
+
+
+class DuckDBRowIterator:
+    """Mimics the parts of `google.cloud.bigquery.table.RowIterator` the runner uses."""
+
+    def __init__(self, table: pa.Table, max_results: Optional[int] = None) -> None:
+        self.total_rows = table.num_rows
+        self._table = table if max_results is None else table.slice(0, max_results)
+
+    def to_arrow(self, **kwargs: Any) -> pa.Table:
+        return self._table
+
+    def to_dataframe(self, **kwargs: Any) -> pd.DataFrame:
+        return self._table.to_pandas()
+
+
+class DuckDBQueryJob:
+    """A finished query. DuckDB runs queries synchronously, so the job is done when it is created."""
+
+    def __init__(self, table: Optional[pa.Table], bytes_processed: int) -> None:
+        self._table = table
+        self.total_bytes_processed = bytes_processed
+
+    def done(self) -> bool:
+        return True
+
+    def result(self, page_size: Optional[int] = None, max_results: Optional[int] = None, **kwargs: Any) -> DuckDBRowIterator:
+        return DuckDBRowIterator(self._table, max_results=max_results)
+
+
+class DuckDBTable:
+    """Schema and modification time of a snapshot table, shaped like `bigquery.Table`."""
+
+    def __init__(self, schema: List[bigquery.SchemaField], modified: Optional[datetime]) -> None:
+        self.schema = schema
+        self.modified = modified
+
+
+class DuckDBClient:
+    """Executes BigQuery queries with DuckDB against the Parquet snapshot of the dataset tables."""
+
+    def __init__(self, snapshot_dir: str) -> None:
+        """Open the snapshot directory. Its tables are registered as views; no data is loaded up front.
+
+        Args:
+            snapshot_dir: Directory with one `<table>.parquet` file per table and an optional `snapshot.json`.
+
+        Raises:
+            FileNotFoundError: If the directory has no Parquet files.
+        """
+        self.snapshot_dir = snapshot_dir
+        self.table_files = {
+            os.path.splitext(name)[0]: os.path.join(snapshot_dir, name)
+            for name in sorted(os.listdir(snapshot_dir)) if name.endswith(".parquet")
+        }
+        if not self.table_files:
+            raise FileNotFoundError(f"No Parquet table snapshots found in {snapshot_dir}")
+        self.manifest = self._load_manifest()
+
+        self._connection = duckdb.connect(":memory:")
+        self._connection.execute("SET TimeZone = 'UTC'")
+        for table, path in self.table_files.items():
+            self._connection.execute(f"CREATE VIEW \"{table}\" AS SELECT * FROM read_parquet('{path.replace(chr(39), chr(39) * 2)}')")
+        self._local = threading.local()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.snapshot_dir, MANIFEST_FILE_NAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @property
+    def created_at(self) -> float:
+        """Time the snapshot was taken, from the manifest or else the oldest Parquet file."""
+        if "created_at" in self.manifest:
+            return datetime.fromisoformat(self.manifest["created_at"]).timestamp()
+        return min(os.path.getmtime(path) for path in self.table_files.values())
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        # A DuckDB connection must not be shared between threads; each thread gets its own cursor on the database.
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._connection.cursor()
+            cursor.execute("SET TimeZone = 'UTC'")
+            self._local.cursor = cursor
+        return cursor
+
+    def translate(self, sql_query: str) -> DuckDBTranslation:
+        """Return `sql_query` rewritten for DuckDB.
+
+        Raises:
+            ValueError: If the query reads a table of another dataset, which the snapshot does not have.
+        """
+        translation = translate_to_duckdb(sql_query, self.table_files)
+        if translation.external_references:
+            raise ValueError("The query references tables outside the snapshot dataset")
+        return translation
+
+    def query(self, sql_query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> DuckDBQueryJob:
+        """Run `sql_query` (BigQuery dialect), or only plan it if `job_config` is a dry run.
+
+        DuckDB has no scanned-bytes estimate; the size of the Parquet files the query reads stands in for it.
+        """
+        translation = self.translate(sql_query)
+        bytes_processed = sum(os.path.getsize(self.table_files[table]) for table in translation.tables)
+        cursor = self._cursor()
+        if job_config is not None and job_config.dry_run:
+            cursor.execute(f"EXPLAIN {translation.sql}")
+            return DuckDBQueryJob(None, bytes_processed)
+        return DuckDBQueryJob(cursor.execute(translation.sql).to_arrow_table(), bytes_processed)
+
+    def _table_name(self, table_ref: str) -> str:
+        table = str(table_ref).split(".")[-1]
+        if table not in self.table_files:
+            raise ValueError(f"Table {table} is not in the snapshot {self.snapshot_dir}")
+        return table
+
+    def get_table(self, table_ref: str) -> DuckDBTable:
+        table = self._table_name(table_ref)
+        columns = self._cursor().execute(f"DESCRIBE \"{table}\"").fetchall()
+        descriptions = self.manifest.get("tables", {}).get(table, {}).get("descriptions", {})
+        schema = [
+            bigquery.SchemaField(name, _BIGQUERY_TYPES.get(column_type, column_type), mode="NULLABLE",
+                                 description=descriptions.get(name))
+            for name, column_type, *_ in columns
+        ]
+        modified = self.manifest.get("tables", {}).get(table, {}).get("modified")
+        if modified is not None:
+            modified = datetime.fromisoformat(modified)
+        else:
+            modified = datetime.fromtimestamp(os.path.getmtime(self.table_files[table]), tz=timezone.utc)
+        return DuckDBTable(schema, modified)
+
+    def list_rows(self, table_ref: str, max_results: Optional[int] = None) -> DuckDBRowIterator:
+        table = self._table_name(table_ref)
+        limit = f" LIMIT {int(max_results)}" if max_results is not None else ""
+        return DuckDBRowIterator(self._cursor().execute(f"SELECT * FROM \"{table}\"{limit}").to_arrow_table())
+
+
+class LocalFirstClient:
+    """Serves hot aggregate queries from a DuckDB snapshot and everything else from BigQuery.
+
+    A query runs locally when it aggregates (GROUP BY or an aggregate function, so its result is small), only reads
+    snapshot tables and the snapshot is younger than `max_snapshot_age_seconds`. Dry runs take the same route as the
+    query they check. A local query that fails (e.g. a BigQuery function without a DuckDB translation) is retried
+    on BigQuery. Schemas and sample rows always come from BigQuery.
+    """
+
+    def __init__(self, bigquery_client: bigquery.Client, duckdb_client: DuckDBClient,
+                 max_snapshot_age_seconds: float = 24 * 3600) -> None:
+        self.bigquery_client = bigquery_client
+        self.duckdb_client = duckdb_client
+        self.max_snapshot_age_seconds = max_snapshot_age_seconds
+        self.local_queries = 0
+        self.remote_queries = 0
+        self._lock = threading.Lock()
+
+    def _serve_locally(self, sql_query: str) -> bool:
+        if time.time() - self.duckdb_client.created_at > self.max_snapshot_age_seconds:
+            return False
+        try:
+            translation = translate_to_duckdb(sql_query, self.duckdb_client.table_files)
+            return bool(translation.tables) and not translation.external_references and is_aggregate_query(sql_query)
+        except Exception:
+            return False
+
+    def query(self, sql_query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> Any:
+        is_dry_run = job_config is not None and job_config.dry_run
+        if self._serve_locally(sql_query):
+            try:
+                job = self.duckdb_client.query(sql_query, job_config=job_config)
+                if not is_dry_run:
+                    with self._lock:
+                        self.local_queries += 1
+                return job
+            except Exception as e:
+                logging.warning(f"Local DuckDB execution failed, running the query on BigQuery: {str(e)}")
+        job = self.bigquery_client.query(sql_query, job_config=job_config)
+        if not is_dry_run:
+            with self._lock:
+                self.remote_queries += 1
+        return job
+
+    def get_table(self, table_ref: str) -> Any:
+        return self.bigquery_client.get_table(table_ref)
+
+    def list_rows(self, table_ref: str, max_results: Optional[int] = None) -> Any:
+        return self.bigquery_client.list_rows(table_ref, max_results=max_results)
+
+
+def export_snapshot(snapshot_dir: str, tables: Iterable[str], project_id: Optional[str] = None,
+                    dataset_id: str = "bigquery-public-data.thelook_ecommerce") -> None:
+    """Download full BigQuery tables to `<snapshot_dir>/<table>.parquet` and write the snapshot manifest.
+
+    Args:
+        snapshot_dir: Directory of the snapshot; created if missing.
+        tables: Names of the tables to export.
+        project_id: Google Cloud project ID. If None, uses default credentials.
+        dataset_id: BigQuery dataset of the tables.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    client = bigquery.Client(project=project_id)
+    manifest = {"dataset_id": dataset_id, "created_at": datetime.now(timezone.utc).isoformat(), "tables": {}}
+    for table_name in tables:
+        table = client.get_table(f"{dataset_id}.{table_name}")
+        rows = client.list_rows(table).to_arrow(create_bqstorage_client=True)
+        path = os.path.join(snapshot_dir, f"{table_name}.parquet")
+        pq.write_table(rows, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        manifest["tables"][table_name] = {
+            "modified": table.modified.isoformat() if table.modified else None,
+            "rows": rows.num_rows,
+            "descriptions": {field.name: field.description for field in table.schema if field.description},
+        }
+        logging.info(f"Exported {rows.num_rows} rows of table {table_name} to {path}")
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def main() -> None:
+    from schema_catalog import TABLES
+
+    parser = argparse.ArgumentParser(description="Export the dataset tables to a local Parquet snapshot for DuckDB.")
+    parser.add_argument("snapshot_dir", help="directory to write <table>.parquet files and snapshot.json to")
+    parser.add_argument("--project-id", default=None)
+    parser.add_argument("--dataset-id", default="bigquery-public-data.thelook_ecommerce")
+    parser.add_argument("--tables", nargs="+", default=list(TABLES))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_snapshot(args.snapshot_dir, args.tables, project_id=args.project_id, dataset_id=args.dataset_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,32 @@
 import json
 import os
 import logging
-from bq_client import BigQueryRunner
-
-big_query_runner_instance = BigQueryRunner()
+from langgraph.config import get_stream_writer
+from bq_client import BigQueryRunner, QueryResult, ScanBudget, get_big_query_runner
+from llm_cache import AgentLLMCache, get_shared_llm_cache
+from schema_catalog import get_schema_catalog
+from schema_pruning import SchemaPruner
 
 def get_tables_information() -> str:
-    script_directory = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/")
-    combined_summary_path = os.path.join(script_directory, "SQL_tables_summary.txt")
-
-    if os.path.exists(combined_summary_path):
-        with open(combined_summary_path, "r", encoding="utf-8") as f:
-            return f.read()
-
-    tables = {
-        "orders": "Customer order information",
-        "order_items": "Individual items within orders",
-        "products": "Product catalog and details",
-        "users": "Customer demographics and information",
-    }
-
-    table_summaries = {}
-
-    for table, description in tables.items():
-        schema_info = big_query_runner_instance.get_table_schema(table_name=table)  # expected: list[dict]
-        query_nonulls = f"""
-        SELECT *
-        FROM `bigquery-public-data.thelook_ecommerce.{table}` AS t
-        WHERE TO_JSON_STRING(t) NOT LIKE '%:null%'
-        LIMIT 1
-        """
-        df = big_query_runner_instance.execute_query(sql_query=query_nonulls)
-        if df is None or df.empty:
-            df = big_query_runner_instance.execute_query(
-                sql_query=f"SELECT * FROM `bigquery-public-data.thelook_ecommerce.{table}` LIMIT 1"
-            )
-        lines = []
-        lines.append(f"Table name: {table}")
-        lines.append(f"Table description: {description}")
-        lines.append("Table columns information:")
-        for col in schema_info or []:
-            name = col.get("name")
-            typ = col.get("type")
-            mode = col.get("mode")
-            lines.append(f"name: {name}, type: {typ}, mode: {mode}")
-
-        lines.append("Row example :")
-        if df is not None and not df.empty:
-            row_dict = df.head(1).to_dict(orient="records")[0]
-            lines.append(json.dumps(row_dict, indent=2, default=str))
-        else:
-            lines.append("(no rows returned)")
+    return get_schema_catalog().get_tables_information()
 
-        table_summaries[table] = "\n".join(lines)
+def get_data_version() -> str:
+    """Return a version string that changes whenever one of the dataset's tables is modified."""
+    return get_schema_catalog().get_data_version()
 
-    combined_summary = "\n\n".join(table_summaries.values())
+def get_relevant_tables_information(question: str) -> str:
+    """Return the schema context limited to the tables `question` needs, plus their join hints."""
+    return SchemaPruner(get_schema_catalog().get_table_summaries()).render(question)
 
-    with open(combined_summary_path, "w", encoding="utf-8") as f:
-        f.write(combined_summary)
+def report_progress(message: str) -> None:
+    """Emit a progress line on the graph's "custom" stream; does nothing unless the graph is streamed in that mode."""
+    get_stream_writer()({"progress": message})
 
-    return combined_summary
+def log_token_usage(node_name: str, response) -> None:
+    """Log the prompt/output token counts the LLM reported for `response`, if any."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        logging.info(f"{node_name} | prompt tokens: {usage.get('input_tokens')} | output tokens: {usage.get('output_tokens')}")
 
 def _truncate_text_words(text: str, max_words: int = 50) -> str:
     words = text.split()
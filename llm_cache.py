@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.runnables.config import var_child_runnable_config
+
+
+class LLMResponseCache:
+    """Storage for LLM responses shared by all agents: an in-memory LRU plus an optional SQLite tier.
+
+    Responses are keyed by a hash of the model configuration (model name and invocation parameters)
+    and the serialized message list. Agents attach through `for_agent`, which returns a LangChain
+    cache that records per-node hit/miss counters and skips the nodes whose output must be fresh.
+    """
+
+    def __init__(self, max_entries: int = 512, sqlite_path: Optional[str] = None, ttl_seconds: float = 24 * 3600) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses kept in memory.
+            sqlite_path: SQLite database file for the persistent tier. If None, the persistent tier is disabled.
+            ttl_seconds: Age after which a cached response is ignored.
+        """
+        self.max_entries = max_entries
+        self.sqlite_path = sqlite_path
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._node_stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._connection = None
+
+        if self.sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.sqlite_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        """Return the cached response for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+            if self._connection is None:
+                return None
+            row = self._connection.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                response = loads(row[0], allowed_objects="core")
+        except Exception as e:
+            logging.error(f"Failed to load cached LLM response: {str(e)}")
+            return None
+        with self._lock:
+            self._add_to_memory(key, response, created_at=row[1])
+        return response
+
+    def put(self, key: str, response: RETURN_VAL_TYPE) -> None:
+        """Store `response` under `key` in both tiers."""
+        created_at = time.time()
+        with self._lock:
+            self._add_to_memory(key, response, created_at=created_at)
+            if self._connection is not None:
+                try:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO llm_responses (key, response, created_at) VALUES (?, ?, ?)",
+                        (key, dumps(response), created_at)
+                    )
+                    self._connection.commit()
+                except Exception as e:
+                    logging.error(f"Failed to persist LLM response: {str(e)}")
+
+    def record(self, node: str, hit: bool) -> None:
+        with self._lock:
+            node_stats = self._node_stats.setdefault(node, {"hits": 0, "misses": 0})
+            node_stats["hits" if hit else "misses"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return hit/miss counters and the hit rate of every node that used the cache."""
+        with self._lock:
+            stats = {node: dict(node_stats) for node, node_stats in self._node_stats.items()}
+        for node_stats in stats.values():
+            lookups = node_stats["hits"] + node_stats["misses"]
+            node_stats["hit_rate"] = node_stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop every cached response from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM llm_responses")
+                self._connection.commit()
+
+    def for_agent(self, agent_name: str, bypass_nodes: Iterable[str] = ()) -> "AgentLLMCache":
+        """Return a LangChain cache for one agent's LLM handles, backed by this storage."""
+        return AgentLLMCache(storage=self, agent_name=agent_name, bypass_nodes=bypass_nodes)
+
+    def _add_to_memory(self, key: str, response: RETURN_VAL_TYPE, created_at: float) -> None:
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class AgentLLMCache(BaseCache):
+    """LangChain cache for one agent, passed to the chat model as `cache=`.
+
+    The graph node making the call is read from the LangGraph run config, so the counters are kept
+    per "<agent>/<node>" and nodes listed in `bypass_nodes` always call the model.
+    """
+
+    def __init__(self, storage: LLMResponseCache, agent_name: str, bypass_nodes: Iterable[str] = ()) -> None:
+        self.storage = storage
+        self.agent_name = agent_name
+        self.bypass_nodes = set(bypass_nodes)
+
+    @staticmethod
+    def _current_node() -> str:
+        config = var_child_runnable_config.get() or {}
+        return config.get("metadata", {}).get("langgraph_node", "unknown")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        node = self._current_node()
+        if node in self.bypass_nodes:
+            return None
+        response = self.storage.get(self.storage.make_key(prompt, llm_string))
+        self.storage.record(f"{self.agent_name}/{node}", hit=response is not None)
+        return response
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self._current_node() in self.bypass_nodes:
+            return
+        self.storage.put(self.storage.make_key(prompt, llm_string), return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.storage.clear()
+
+
+_shared_llm_cache: Optional[LLMResponseCache] = None
+_shared_llm_cache_lock = threading.Lock()
+
+
+def get_shared_llm_cache() -> LLMResponseCache:
+    """Return the process-wide LLM response cache shared by every agent.
+
+    The SQLite tier is enabled by setting LLM_CACHE_SQLITE_PATH; LLM_CACHE_TTL_SECONDS
+    overrides the default time to live.
+    """
+    global _shared_llm_cache
+    with _shared_llm_cache_lock:
+        if _shared_llm_cache is None:
+            _shared_llm_cache = LLMResponseCache(
+                sqlite_path=os.getenv("LLM_CACHE_SQLITE_PATH") or None,
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 3600)),
+            )
+        return _shared_llm_cache
@@ -1,4 +1,6 @@
 from .agent import PlotAgent
+from .artifact_store import PlotArtifactStore, get_plot_artifact_store
+from .plot_files import wait_for_plot_file
 from .state import PlotAgentState
 
-__all__ = ['PlotAgent','PlotAgentState']
\ No newline at end of file
+__all__ = ['PlotAgent','PlotAgentState','wait_for_plot_file','PlotArtifactStore','get_plot_artifact_store']
\ No newline at end of file
@@ -1,20 +1,26 @@
+import asyncio
 import base64
-import contextlib
-import io
 import logging
+import threading
 from datetime import datetime
+from typing import Optional
 
-import matplotlib
-import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import START, END, StateGraph
 from langgraph.graph.state import CompiledStateGraph
-from matplotlib.figure import Figure
 
 from helper_functions import *
+from result_registry import SharedResult
+from result_rendering import render_columns, render_rows
+from speculative_sql import SpeculativeOutcome, SpeculativeSqlGenerator
+from plot_script_runner import PlotScriptRunner, execute_plot_script, get_plot_script_runner
+from tracing import get_tracer
+from .artifact_store import artifact_key, get_plot_artifact_store
+from .plot_files import encode_for_vision
 from .state import PlotAgentState
 
 
@@ -22,12 +28,24 @@ class PlotAgent:
     def __init__(self):
         self.script_directory = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/")
         self.system_prompt_dict = self._get_system_prompt_dict()
-        self.max_execution_attempts,self.sota_llm_name,self.llm_name = self._get_config()
-        self.llm = self._get_llm(model_name = self.llm_name)
-        self.sota_llm = self._get_llm(model_name=self.sota_llm_name)
-        self.big_query_runner = BigQueryRunner()
-        self.df_for_plot = None
-        self.plot_fig  = None
+        (self.max_execution_attempts,self.sota_llm_name,self.llm_name,self.use_storage_api,
+         self.max_bytes_per_query,self.max_bytes_per_conversation,self.prune_schema,
+         self.llm_cache_bypass_nodes,self.plot_worker_pool_enabled,self.plot_worker_config,self.plot_dpi,
+         self.vision_image_max_side,self.vision_image_format,self.vision_image_quality,
+         self.artifact_store_max_bytes,self.shared_result_timeout_seconds,self.speculative_sql_candidates,
+         self.prompt_sample_rows) = self._get_config()
+        self.llm_cache = get_shared_llm_cache().for_agent('Plot agent', bypass_nodes=self.llm_cache_bypass_nodes)
+        self.llm = self._get_llm(model_name = self.llm_name, cache=self.llm_cache)
+        self.sota_llm = self._get_llm(model_name=self.sota_llm_name, cache=self.llm_cache)
+        self.big_query_runner = get_big_query_runner()
+        self.artifact_store = get_plot_artifact_store(max_bytes=self.artifact_store_max_bytes)
+        # With more than one candidate, each attempt generates and dry-runs that many queries in parallel.
+        self.speculative_sql = None
+        if self.speculative_sql_candidates > 1:
+            self.speculative_sql = SpeculativeSqlGenerator(self.sota_llm, self.big_query_runner, self.speculative_sql_candidates)
+        if self.plot_worker_pool_enabled:
+            # Start the worker processes in the background so they are warm by the first plot without delaying startup.
+            threading.Thread(target=self._get_plot_script_runner, name='plot-worker-warmup', daemon=True).start()
 
     def _get_system_prompt_dict(self):
         system_prompt_dict_path = os.path.join(self.script_directory, 'files','system_prompts.json')
@@ -39,132 +57,370 @@ class PlotAgent:
         config_path = os.path.join(self.script_directory, 'files','config.json')
         with open(config_path, 'rb') as f:
             config = json.load(f)
-        return config['max_execution_attempts'],config['sota_llm_name'],config['llm_name']
+        return (config['max_execution_attempts'],config['sota_llm_name'],config['llm_name'],config['use_storage_api'],
+                config['max_bytes_per_query'],config['max_bytes_per_conversation'],config['prune_schema'],
+                config['llm_cache_bypass_nodes'],config['plot_worker_pool_enabled'],
+                {
+                    'workers': config['plot_workers'],
+                    'timeout_seconds': config['plot_script_timeout_seconds'],
+                    'cpu_seconds': config['plot_worker_cpu_seconds'],
+                    'memory_bytes': config['plot_worker_memory_bytes'],
+                },
+                config['plot_dpi'],config['vision_image_max_side'],config['vision_image_format'],config['vision_image_quality'],
+                config['artifact_store_max_bytes'],config['shared_result_timeout_seconds'],config['speculative_sql_candidates'],
+                config['prompt_sample_rows'])
+
+    def _get_plot_script_runner(self) -> PlotScriptRunner:
+        return get_plot_script_runner(dpi=self.plot_dpi, **self.plot_worker_config)
 
     @staticmethod
-    def _get_llm(model_name:str):
+    def _get_llm(model_name:str, cache:AgentLLMCache):
         load_dotenv()
-        return ChatGoogleGenerativeAI(model=model_name)
+        return ChatGoogleGenerativeAI(model=model_name, cache=cache)
+
+    def _scan_budget(self, state) -> ScanBudget:
+        # The data analysis agent passes the budget of its conversation; a direct invocation gets one of its own.
+        if state.get('scan_budget') is None:
+            state['scan_budget'] = ScanBudget(
+                max_bytes_per_query=self.max_bytes_per_query,
+                max_bytes_per_conversation=self.max_bytes_per_conversation
+            )
+        return state['scan_budget']
 
-    def _llm_node_sql_query_generator(self,state:PlotAgentState)-> PlotAgentState:
+    def _fetch_full_shared_result(self, shared_result: SharedResult, scan_budget: ScanBudget) -> SharedResult:
+        data = self.big_query_runner.execute_query(
+            sql_query=shared_result.sql_query,
+            use_storage_api=self.use_storage_api,
+            scan_budget=scan_budget
+        )
+        return SharedResult(shared_result.question, shared_result.sql_query, data, len(data))
+
+    async def _afetch_full_shared_result(self, shared_result: SharedResult, scan_budget: ScanBudget) -> SharedResult:
+        data = await self.big_query_runner.aexecute_query(
+            sql_query=shared_result.sql_query,
+            use_storage_api=self.use_storage_api,
+            scan_budget=scan_budget
+        )
+        return SharedResult(shared_result.question, shared_result.sql_query, data, len(data))
+
+    @staticmethod
+    def _record_shared_result(state: PlotAgentState, shared_result: Optional[SharedResult]) -> PlotAgentState:
+        if shared_result is None:
+            return state
+
+        logging.info(f" Plot agent | Reusing the result of SQL question {state['data_question_index']} ({len(shared_result.data)} rows)")
+        state['df_for_plot'] = shared_result.data
+        state['sql_query'] = shared_result.sql_query
+        state['messages'].append(HumanMessage('question' + '\n' + state['question'] + '\n' + 'plot description' + state['plot_description'],id="1"))
+        state["messages"].append(AIMessage(content=f"Query: {shared_result.sql_query}\n execution succeed" ,id="3"))
+        return state
+
+    @staticmethod
+    def _shared_result_request(state: PlotAgentState) -> tuple:
+        return state.get('result_registry'), state.get('data_question_index')
+
+    def _tool_node_reuse_sql_agent_result(self, state: PlotAgentState) -> PlotAgentState:
+        # The SQL agent running in parallel may already fetch the plot's data; waiting for its frame saves
+        # the SQL generation call and a query job. Without one the plot agent queries the data itself.
+        result_registry, index = self._shared_result_request(state)
+        if result_registry is None or index is None:
+            return state
+
+        shared_result = result_registry.wait(index, timeout=self.shared_result_timeout_seconds)
+        if shared_result is not None and shared_result.truncated:
+            # The SQL agent only downloads the first rows; the same query is run again for all of them.
+            try:
+                shared_result = self._fetch_full_shared_result(shared_result, self._scan_budget(state))
+            except Exception as e:
+                logging.error(f" Plot agent | Failed to fetch the full shared result | Error:\n{type(e).__name__}: {e}")
+                shared_result = None
+        return self._record_shared_result(state, shared_result)
 
+    async def _atool_node_reuse_sql_agent_result(self, state: PlotAgentState) -> PlotAgentState:
+        result_registry, index = self._shared_result_request(state)
+        if result_registry is None or index is None:
+            return state
+
+        shared_result = await result_registry.await_result(index, timeout=self.shared_result_timeout_seconds)
+        if shared_result is not None and shared_result.truncated:
+            try:
+                shared_result = await self._afetch_full_shared_result(shared_result, self._scan_budget(state))
+            except Exception as e:
+                logging.error(f" Plot agent | Failed to fetch the full shared result | Error:\n{type(e).__name__}: {e}")
+                shared_result = None
+        return self._record_shared_result(state, shared_result)
+
+    def _sql_query_generator_context(self, state: PlotAgentState) -> tuple:
         sql_query_generator_prompt_template = PromptTemplate(
             input_variables=['tables_information',"recent_attempts","current_time"],
             template=self.system_prompt_dict['sql_query_generator']
         )
-        tables_information = get_tables_information()
+        if self.prune_schema:
+            tables_information = get_relevant_tables_information(state['question'] + '\n' + state['plot_description'])
+        else:
+            tables_information = get_tables_information()
         current_time = datetime.now().strftime("%Y-%d-%m %H:%M")
         human_msg = HumanMessage('question' + '\n' + state['question'] + '\n' + 'plot description' + state['plot_description'],id="1")
         state['messages'].append(human_msg)
 
-        attempt = 1
+        return sql_query_generator_prompt_template, tables_information, current_time, human_msg
+
+    @staticmethod
+    def _sql_query_generator_messages(state: PlotAgentState, context: tuple, previous_attempts: list) -> list:
+        sql_query_generator_prompt_template, tables_information, current_time, human_msg = context
+        attempt_context = "\n\n".join(previous_attempts) if previous_attempts else "None"
+
+        sql_query_generator_prompt = sql_query_generator_prompt_template.format(
+            tables_information=tables_information,
+            recent_attempts=attempt_context,
+            current_time= current_time
+        )
+
+        system_msg = SystemMessage(content=sql_query_generator_prompt,id="2")
+        state['messages'].append(system_msg)
+        return [system_msg,human_msg]
+
+    @staticmethod
+    def _record_generated_sql_query(state: PlotAgentState, response) -> str:
+        log_token_usage(" Plot agent | SQL node", response)
+        generated_sql_query = response.content
+        state["messages"].append(AIMessage(content=generated_sql_query,id="3"))
+        return generated_sql_query
+
+    @staticmethod
+    def _record_failed_attempt(node_name: str, attempt: int, generated_code: str, error: Exception,
+                               previous_attempts: list, code_label: str) -> tuple:
+        err_msg = f"{type(error).__name__}: {error}"
+        previous_attempts.append(f"Attempt {attempt} {code_label}:\n{generated_code}\nError:\n{err_msg}")
+        logging.error(f" Plot agent | {node_name} | Execution failed for attempt {attempt}. | Error:\n{err_msg} ")
+        return generated_code, err_msg
+
+    @staticmethod
+    def _record_fetched_data(state: PlotAgentState, generated_sql_query: str, result_df) -> None:
+        state['df_for_plot'] = result_df
+        state['sql_query'] = generated_sql_query
+        state["messages"].append(AIMessage(content=f"Query: {generated_sql_query}\n execution succeed" ,id="3"))
+
+    @staticmethod
+    def _record_failed_query(state: PlotAgentState, last_sql: str, last_error: str) -> None:
+        state["messages"].append(AIMessage(
+            content=f"Failed to query the SQL database and reached the maximum attempts.\nLast SQL:\n{last_sql}\n\nLast error:\n{last_error}"
+            , id="3"
+        )
+        )
+
+    def _record_speculative_outcome(self, state: PlotAgentState, attempt: int, outcome: SpeculativeOutcome,
+                                    previous_attempts: list) -> Optional[tuple]:
+        last_failure = None
+        for candidate in outcome.failures:
+            generated_sql_query = self._record_generated_sql_query(state, candidate.response)
+            last_failure = self._record_failed_attempt("SQL node", f"{attempt}.{candidate.index + 1}", generated_sql_query,
+                                                       candidate.error, previous_attempts, "SQL")
+        if outcome.winner is not None:
+            generated_sql_query = self._record_generated_sql_query(state, outcome.winner.response)
+            self._record_fetched_data(state, generated_sql_query, outcome.result)
+        return last_failure
+
+    def _speculative_sql_query_generator(self, state: PlotAgentState) -> PlotAgentState:
+        context = self._sql_query_generator_context(state)
         previous_attempts = []
         last_sql = None
         last_error = None
 
-        while attempt <= self.max_execution_attempts:
+        for attempt in range(1, self.max_execution_attempts + 1):
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            outcome = self.speculative_sql.run(
+                messages,
+                execute=lambda sql_query: self.big_query_runner.execute_query(sql_query=sql_query, use_storage_api=self.use_storage_api),
+                scan_budget=self._scan_budget(state)
+            )
+            last_sql, last_error = self._record_speculative_outcome(state, attempt, outcome, previous_attempts) or (last_sql, last_error)
+            if outcome.winner is not None:
+                return state
 
-            attempt_context = "\n\n".join(previous_attempts) if previous_attempts else "None"
+        self._record_failed_query(state, last_sql, last_error)
+        return state
 
-            sql_query_generator_prompt = sql_query_generator_prompt_template.format(
-                tables_information=tables_information,
-                recent_attempts=attempt_context,
-                current_time= current_time
+    async def _aspeculative_sql_query_generator(self, state: PlotAgentState) -> PlotAgentState:
+        context = await asyncio.to_thread(self._sql_query_generator_context, state)
+        previous_attempts = []
+        last_sql = None
+        last_error = None
+
+        for attempt in range(1, self.max_execution_attempts + 1):
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            outcome = await self.speculative_sql.arun(
+                messages,
+                execute=lambda sql_query: self.big_query_runner.aexecute_query(sql_query=sql_query, use_storage_api=self.use_storage_api),
+                scan_budget=self._scan_budget(state)
             )
+            last_sql, last_error = self._record_speculative_outcome(state, attempt, outcome, previous_attempts) or (last_sql, last_error)
+            if outcome.winner is not None:
+                return state
+
+        self._record_failed_query(state, last_sql, last_error)
+        return state
 
-            system_msg = SystemMessage(content=sql_query_generator_prompt,id="2")
-            state['messages'].append(system_msg)
+    def _llm_node_sql_query_generator(self,state:PlotAgentState)-> PlotAgentState:
+        if self.speculative_sql is not None:
+            return self._speculative_sql_query_generator(state)
+
+        context = self._sql_query_generator_context(state)
+
+        attempt = 1
+        previous_attempts = []
+        last_sql = None
+        last_error = None
+
+        while attempt <= self.max_execution_attempts:
 
-            response = self.sota_llm.invoke([system_msg,human_msg])
-            generated_sql_query = response.content
-            state["messages"].append(AIMessage(content=generated_sql_query,id="3"))
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            response = self.sota_llm.invoke(messages)
+            generated_sql_query = self._record_generated_sql_query(state, response)
 
             try:
-                result_df = self.big_query_runner.execute_query(sql_query=generated_sql_query)
-                self.df_for_plot = result_df
-                state["messages"].append(AIMessage(content=f"Query: {generated_sql_query}\n execution succeed" ,id="3"))
+                result_df = self.big_query_runner.execute_query(
+                    sql_query=generated_sql_query,
+                    use_storage_api=self.use_storage_api,
+                    scan_budget=self._scan_budget(state)
+                )
+                self._record_fetched_data(state, generated_sql_query, result_df)
                 break
 
             except Exception as e:
+                last_sql, last_error = self._record_failed_attempt("SQL node", attempt, generated_sql_query, e, previous_attempts, "SQL")
+                attempt += 1
 
-                err_msg = f"{type(e).__name__}: {e}"
+        if state.get('df_for_plot') is None:
+            self._record_failed_query(state, last_sql, last_error)
 
-                last_error = err_msg
-                last_sql = generated_sql_query
-                previous_attempts.append(f"Attempt {attempt} SQL:\n{generated_sql_query}\nError:\n{err_msg}")
+        return state
 
-                logging.error(f" Plot agent | SQL node | Execution failed for attempt {attempt}. | Error:\n{err_msg} ")
+    async def _allm_node_sql_query_generator(self,state:PlotAgentState)-> PlotAgentState:
+        if self.speculative_sql is not None:
+            return await self._aspeculative_sql_query_generator(state)
 
-                attempt += 1
+        # The schema catalog may refresh itself from BigQuery, so it is read in a worker thread.
+        context = await asyncio.to_thread(self._sql_query_generator_context, state)
 
+        attempt = 1
+        previous_attempts = []
+        last_sql = None
+        last_error = None
 
+        while attempt <= self.max_execution_attempts:
 
-        if self.df_for_plot is None:
-            state["messages"].append(AIMessage(
-                content=f"Failed to query the SQL database and reached the maximum attempts.\nLast SQL:\n{last_sql}\n\nLast error:\n{last_error}"
-                , id="3"
-            )
-            )
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            response = await self.sota_llm.ainvoke(messages)
+            generated_sql_query = self._record_generated_sql_query(state, response)
+
+            try:
+                result_df = await self.big_query_runner.aexecute_query(
+                    sql_query=generated_sql_query,
+                    use_storage_api=self.use_storage_api,
+                    scan_budget=self._scan_budget(state)
+                )
+                self._record_fetched_data(state, generated_sql_query, result_df)
+                break
+
+            except Exception as e:
+                last_sql, last_error = self._record_failed_attempt("SQL node", attempt, generated_sql_query, e, previous_attempts, "SQL")
+                attempt += 1
+
+        if state.get('df_for_plot') is None:
+            self._record_failed_query(state, last_sql, last_error)
 
         return state
 
     def _router_node_check_if_data_fetched(self,state:PlotAgentState)->bool:
-        if self.df_for_plot is None:
+        if state.get('df_for_plot') is None:
             return False
         else:
             return True
 
-    def _tool_node_execute_script(self,generated_script):
-
-        try:
-            matplotlib.use("Agg")
-        except Exception:
-            pass
-
-
-        allowed_builtins = {
-            "len": len, "range": range, "min": min, "max": max,
-            "sum": sum, "abs": abs, "round": round, "enumerate": enumerate,
-            "zip": zip, "print": print
-        }
+    def _tool_node_execute_script(self, generated_script, df_for_plot) -> bytes:
+        """Run the generated script and return the rendered figure as PNG bytes.
+
+        With the worker pool enabled the script runs in a separate process under CPU-time, memory and wall-clock
+        limits; otherwise it runs in this process with the same restricted builtins.
+        """
+        with get_tracer().span("plot.render") as span:
+            span.set_attribute("plot.worker_pool", self.plot_worker_pool_enabled)
+            span.set_attribute("plot.rows", len(df_for_plot))
+            if self.plot_worker_pool_enabled:
+                png_bytes = self._get_plot_script_runner().run(generated_script, df_for_plot)
+            else:
+                png_bytes = execute_plot_script(generated_script, df_for_plot, dpi=self.plot_dpi)
+            span.set_attribute("plot.png_bytes", len(png_bytes))
+            return png_bytes
+
+    def _plot_script_generator_context(self, state: PlotAgentState) -> tuple:
+        plot_script_generator_prompt_template = PromptTemplate(
+            input_variables=['dataframe_columns',"recent_attempts","df_shape","df_sample_rows","sql_query_used"],
+            template=self.system_prompt_dict['plot_script_generator']
+        )
 
+        df_for_plot = state['df_for_plot']
+        dataframe_columns = render_columns(df_for_plot)
+        df_shape = df_for_plot.shape
+        # dataframe_columns already lists the columns in order with their types, so the sample rows need no header.
+        df_sample_rows = render_rows(df_for_plot.head(self.prompt_sample_rows), header=False)
+        sql_query_used = state['messages'][-1]
+        human_msg = HumanMessage('question' + '\n' + state['question'] + '\n' + 'plot description' + state['plot_description'], id="1")
 
-        ns = {
-            "__builtins__": allowed_builtins,
-            "df": self.df_for_plot,
-            "plt": plt,
-            "matplotlib": matplotlib,
-        }
+        return plot_script_generator_prompt_template, dataframe_columns, df_shape, df_sample_rows, sql_query_used, human_msg
 
-        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
-            exec(generated_script, ns, ns)
+    @staticmethod
+    def _plot_script_generator_messages(state: PlotAgentState, context: tuple, previous_attempts: list) -> list:
+        plot_script_generator_prompt_template, dataframe_columns, df_shape, df_sample_rows, sql_query_used, human_msg = context
+        attempt_context = "\n\n".join(previous_attempts) if previous_attempts else "None"
+
+        plot_script_generator_prompt = plot_script_generator_prompt_template.format(
+            dataframe_columns=dataframe_columns,
+            recent_attempts=attempt_context,
+            df_shape=df_shape,
+            df_sample_rows = df_sample_rows,
+            sql_query_used = sql_query_used
+        )
+        system_msg = SystemMessage(content=plot_script_generator_prompt,id="2")
+        state['messages'].append(system_msg)
+        return [system_msg,human_msg]
+
+    def _run_generated_script(self, state: PlotAgentState, generated_script: str) -> None:
+        state["messages"].append(AIMessage(content=generated_script,id="3"))
+        key = artifact_key(state.get('sql_query'), generated_script, state['df_for_plot'])
+        state['plot_artifact_key'] = key
+
+        # The same script on the same data draws the same plot, so a stored artifact is reused instead of rendering.
+        stored_png = self.artifact_store.load(key) if self.artifact_store.get(key) is not None else None
+        if stored_png is not None:
+            state['plot_png'] = stored_png
+            state["messages"].append(AIMessage(content=f"Script: {generated_script}\n reused stored plot {key[:12]}" ,id="3"))
+            return
+
+        state['plot_png'] = self._tool_node_execute_script(generated_script=generated_script, df_for_plot=state['df_for_plot'])
+        state["messages"].append(AIMessage(content=f"Script: {generated_script}\n execution succeed" ,id="3"))
+
+    async def _arun_generated_script(self, state: PlotAgentState, generated_script: str) -> None:
+        if self.plot_worker_pool_enabled:
+            # The script runs in a worker process; this thread only waits for its PNG bytes.
+            await asyncio.to_thread(self._run_generated_script, state, generated_script)
+        else:
+            # pyplot is not thread-safe, so an in-process script runs on the event loop thread.
+            self._run_generated_script(state, generated_script)
 
-        fig = ns.get("fig", None)
-        if fig is None:
-            raise ValueError(
-                "Generated code did not produce a Figure object named `fig`. "
-                "Ensure the script ends with something like: `fig, ax = plt.subplots(...)` and assigns to `fig`."
+    @staticmethod
+    def _record_failed_plot_script(state: PlotAgentState, last_script: str, last_error: str) -> None:
+        if state.get('plot_png') is None:
+            state["messages"].append(AIMessage(
+                content=f"Failed to generate script for plot and reached the maximum attempts.\nLast SQL:\n{last_script}\n\nLast error:\n{last_error}"
+                , id="3"
             )
-        if not isinstance(fig, Figure):
-            raise TypeError(
-                f"Expected a matplotlib.figure.Figure in `fig`, got {type(fig)}. "
-                "Ensure you assign the Matplotlib Figure object to `fig`."
             )
 
-        return fig
-
     def _llm_node_plot_script_generator(self,state:PlotAgentState)-> PlotAgentState:
 
-        plot_script_generator_prompt_template = PromptTemplate(
-            input_variables=['dataframe_columns',"recent_attempts","df_shape","df_sample_rows","sql_query_used"],
-            template=self.system_prompt_dict['plot_script_generator']
-        )
-
-        dataframe_columns = self.df_for_plot.columns
-        df_shape = self.df_for_plot.shape
-        df_sample_rows = self.df_for_plot.head(1).to_string()
-        sql_query_used = state['messages'][-1]
-        human_msg = HumanMessage('question' + '\n' + state['question'] + '\n' + 'plot description' + state['plot_description'], id="1")
+        context = self._plot_script_generator_context(state)
 
         attempt = 1
         previous_attempts = []
@@ -172,88 +428,118 @@ class PlotAgent:
         last_error = None
 
         while attempt <= self.max_execution_attempts:
-            attempt_context = "\n\n".join(previous_attempts) if previous_attempts else "None"
-
-            plot_script_generator_prompt = plot_script_generator_prompt_template.format(
-                dataframe_columns=dataframe_columns,
-                recent_attempts=attempt_context,
-                df_shape=df_shape,
-                df_sample_rows = df_sample_rows,
-                sql_query_used = sql_query_used
-            )
-            system_msg = SystemMessage(content=plot_script_generator_prompt,id="2")
-            state['messages'].append(system_msg)
-            response = self.sota_llm.invoke([system_msg,human_msg])
-            generated_script = response.content
-            state["messages"].append(AIMessage(content=generated_script,id="3"))
+            messages = self._plot_script_generator_messages(state, context, previous_attempts)
+            response = self.sota_llm.invoke(messages)
 
             try:
-
-                self.plot_fig = self._tool_node_execute_script(generated_script=generated_script)
-                state["messages"].append(AIMessage(content=f"Script: {generated_script}\n execution succeed" ,id="3"))
+                self._run_generated_script(state, response.content)
                 break
 
             except Exception as e:
+                last_script, last_error = self._record_failed_attempt("plot script node", attempt, response.content, e, previous_attempts, "Script")
+                attempt += 1
 
-                err_msg = f"{type(e).__name__}: {e}"
+        self._record_failed_plot_script(state, last_script, last_error)
+        return state
 
-                last_error = err_msg
-                last_script = generated_script
+    async def _allm_node_plot_script_generator(self,state:PlotAgentState)-> PlotAgentState:
 
-                previous_attempts.append(f"Attempt {attempt} Script:\n{generated_script}\nError:\n{err_msg}")
-                logging.error(f" Plot agent | plot script node | Execution failed for attempt {attempt}. | Error:\n{err_msg} ")
+        context = self._plot_script_generator_context(state)
 
+        attempt = 1
+        previous_attempts = []
+        last_script = None
+        last_error = None
+
+        while attempt <= self.max_execution_attempts:
+            messages = self._plot_script_generator_messages(state, context, previous_attempts)
+            response = await self.sota_llm.ainvoke(messages)
+
+            try:
+                await self._arun_generated_script(state, response.content)
+                break
+
+            except Exception as e:
+                last_script, last_error = self._record_failed_attempt("plot script node", attempt, response.content, e, previous_attempts, "Script")
                 attempt += 1
 
-        if self.plot_fig is None:
-            state["messages"].append(AIMessage(
-                content=f"Failed to generate script for plot and reached the maximum attempts.\nLast SQL:\n{last_script}\n\nLast error:\n{last_error}"
-                , id="3"
-            )
-            )
+        self._record_failed_plot_script(state, last_script, last_error)
         return state
 
-    def _router_node_check_if_plot_generated(self, state: PlotAgentState) -> bool:
-        if self.plot_fig is None:
+    @staticmethod
+    def _router_node_check_if_plot_generated(state: PlotAgentState) -> bool:
+        if state.get('plot_png') is None:
             return False
         else:
             return True
 
-    def _llm_node_plot_analysis_generator(self,state:PlotAgentState)-> PlotAgentState:
+    def _plot_analysis_generator_messages(self, state: PlotAgentState) -> list:
 
         plot_analysis_generator_prompt = self.system_prompt_dict['plot_analysis_generator']
         system_msg = SystemMessage(content=plot_analysis_generator_prompt, id="2")
         state['messages'].append(system_msg)
 
-        plots_dir = os.path.join(self.script_directory, "plots")
-        os.makedirs(plots_dir, exist_ok=True)
-        file_name = state['question']+'.png'
-        saved_plot_path = os.path.join(plots_dir, file_name)
-        self.plot_fig.savefig(saved_plot_path, format="png", bbox_inches="tight", dpi=144)
-
+        artifact = self.artifact_store.get(state['plot_artifact_key'])
+        if artifact is None:
+            # The PNG rendered by the script node is written in the background and reused for the vision model.
+            artifact = self.artifact_store.put(
+                state['plot_artifact_key'], state['plot_png'], state['question'], state['plot_description']
+            )
+        state['saved_plot_path'] = artifact.path
 
-        buf = io.BytesIO()
-        self.plot_fig.savefig(buf, format="png", bbox_inches="tight", dpi=144)
-        buf.seek(0)
-        b64_png = base64.b64encode(buf.read()).decode("utf-8")
-        data_url = f"data:image/png;base64,{b64_png}"
+        mime_type, image_bytes = encode_for_vision(
+            state['plot_png'],
+            max_side=self.vision_image_max_side,
+            image_format=self.vision_image_format,
+            quality=self.vision_image_quality
+        )
+        b64_image = base64.b64encode(image_bytes).decode("utf-8")
+        data_url = f"data:{mime_type};base64,{b64_image}"
         text_input = 'question' + '\n' + state['question'] + '\n\n' + 'plot description' + state['plot_description']
 
         human_msg = HumanMessage(content=[
             {"type": "text", "text": text_input},
             {"type": "image_url", "image_url": {"url": data_url}},
         ])
+        return [system_msg, human_msg]
 
-        response = self.llm.invoke([system_msg, human_msg])
+    def _reuse_plot_analysis(self, state: PlotAgentState) -> Optional[PlotAgentState]:
+        # A stored artifact drawn for the same plot description already has its analysis.
+        artifact = self.artifact_store.get(state['plot_artifact_key'])
+        if artifact is None or artifact.plot_analysis is None or artifact.plot_description != state['plot_description']:
+            return None
+
+        state["messages"].append(AIMessage(content=artifact.plot_analysis, id="3"))
+        state["plot_analysis"] = artifact.plot_analysis
+        state['saved_plot_path'] = artifact.path
+        return state
+
+    def _record_plot_analysis(self, state: PlotAgentState, response) -> PlotAgentState:
         plot_analysis = response.content
 
         state["messages"].append(AIMessage(content=plot_analysis, id="3"))
         state["plot_analysis"] = plot_analysis
-        state['saved_plot_path'] = saved_plot_path
+        self.artifact_store.set_analysis(state['plot_artifact_key'], plot_analysis)
 
         return state
 
-    def _llm_node_error_explainer(self,state:PlotAgentState)-> PlotAgentState:
+    def _llm_node_plot_analysis_generator(self,state:PlotAgentState)-> PlotAgentState:
+        reused_state = self._reuse_plot_analysis(state)
+        if reused_state is not None:
+            return reused_state
+        response = self.llm.invoke(self._plot_analysis_generator_messages(state))
+        return self._record_plot_analysis(state, response)
+
+    async def _allm_node_plot_analysis_generator(self,state:PlotAgentState)-> PlotAgentState:
+        reused_state = self._reuse_plot_analysis(state)
+        if reused_state is not None:
+            return reused_state
+        # Downsizing the image for the vision model is CPU work, so it runs in a worker thread.
+        messages = await asyncio.to_thread(self._plot_analysis_generator_messages, state)
+        response = await self.llm.ainvoke(messages)
+        return self._record_plot_analysis(state, response)
+
+    def _error_explainer_messages(self, state: PlotAgentState) -> list:
 
         error_explainer_prompt = self.system_prompt_dict['error_explainer']
         system_msg = SystemMessage(content=error_explainer_prompt, id="2")
@@ -262,9 +548,10 @@ class PlotAgent:
         human_msg = HumanMessage(content=last_ai.content)
 
         state['messages'].append(system_msg)
+        return [system_msg,human_msg]
 
-
-        response = self.llm.invoke([system_msg,human_msg])
+    @staticmethod
+    def _record_error_explanation(state: PlotAgentState, response) -> PlotAgentState:
         answer = response.content
 
         state["messages"].append(AIMessage(content=answer, id="3"))
@@ -273,16 +560,35 @@ class PlotAgent:
 
         return state
 
+    def _llm_node_error_explainer(self,state:PlotAgentState)-> PlotAgentState:
+        response = self.llm.invoke(self._error_explainer_messages(state))
+        return self._record_error_explanation(state, response)
+
+    async def _allm_node_error_explainer(self,state:PlotAgentState)-> PlotAgentState:
+        response = await self.llm.ainvoke(self._error_explainer_messages(state))
+        return self._record_error_explanation(state, response)
+
     def get_plot_agent(self)->CompiledStateGraph:
 
         builder = StateGraph(PlotAgentState)
 
-        builder.add_node('SQL query generator',self._llm_node_sql_query_generator)
-        builder.add_node('Plot script generator',self._llm_node_plot_script_generator)
-        builder.add_node('Plot analysis generator',self._llm_node_plot_analysis_generator)
-        builder.add_node('Error explainer',self._llm_node_error_explainer)
+        # Every node has a sync and an async variant, so the graph runs with invoke and with ainvoke/astream.
+        builder.add_node('SQL agent result lookup',RunnableLambda(self._tool_node_reuse_sql_agent_result, afunc=self._atool_node_reuse_sql_agent_result))
+        builder.add_node('SQL query generator',RunnableLambda(self._llm_node_sql_query_generator, afunc=self._allm_node_sql_query_generator))
+        builder.add_node('Plot script generator',RunnableLambda(self._llm_node_plot_script_generator, afunc=self._allm_node_plot_script_generator))
+        builder.add_node('Plot analysis generator',RunnableLambda(self._llm_node_plot_analysis_generator, afunc=self._allm_node_plot_analysis_generator))
+        builder.add_node('Error explainer',RunnableLambda(self._llm_node_error_explainer, afunc=self._allm_node_error_explainer))
+
+        builder.add_edge(START, 'SQL agent result lookup')
 
-        builder.add_edge(START, 'SQL query generator')
+        builder.add_conditional_edges(
+            source="SQL agent result lookup",
+            path=self._router_node_check_if_data_fetched,
+            path_map={
+                    True:'Plot script generator',
+                    False:'SQL query generator'
+            }
+        )
 
         builder.add_conditional_edges(
             source="SQL query generator",
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+import pandas as pd
+
+from .plot_files import get_plot_file_writer
+
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plots")
+INDEX_FILE_NAME = "index.json"
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """Return a hash of the columns, dtypes and values of `df`."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode("utf-8"))
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    except TypeError:
+        # Unhashable cells (e.g. REPEATED columns come back as arrays) are hashed through their JSON text.
+        digest.update(df.to_json(orient="split", index=False, date_format="iso").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def artifact_key(sql_query: str, script: str, df: pd.DataFrame) -> str:
+    """Return the content address of the plot drawn by `script` from the result of `sql_query`."""
+    digest = hashlib.sha256()
+    for part in (sql_query or "", script, dataframe_fingerprint(df)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class PlotArtifact:
+    key: str
+    path: str
+    size: int
+    question: str
+    plot_description: str
+    plot_analysis: Optional[str]
+    created_at: float
+    last_access: float
+
+
+class PlotArtifactStore:
+    """Content-addressed store of rendered plots.
+
+    Each plot is saved once as `<key>.png`, where the key hashes the SQL query, the plot script and the data
+    it ran on, so identical plots are rendered (and analysed) once and different questions never overwrite each
+    other's files. An index file records each artifact's size, last access and plot analysis; when the total size
+    exceeds `max_bytes` the least recently used artifacts are deleted.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = 512 * 1024 ** 2) -> None:
+        """Open the store, loading its index if there is one.
+
+        Args:
+            directory: Directory of the PNG files and the index.
+            max_bytes: Total size of the stored PNGs above which the least recently used ones are evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        self._artifacts: Dict[str, PlotArtifact] = self._load_index()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _load_index(self) -> Dict[str, PlotArtifact]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            artifacts = {key: PlotArtifact(**entry) for key, entry in entries.items()}
+        except Exception as e:
+            logging.error(f" Plot agent | Ignoring unreadable plot artifact index {self.index_path}: {str(e)}")
+            return {}
+        # Files deleted by hand are dropped from the index.
+        return {key: artifact for key, artifact in artifacts.items() if os.path.exists(artifact.path)}
+
+    def _save_index(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({key: asdict(artifact) for key, artifact in self._artifacts.items()}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    @staticmethod
+    def key_from_path(path: str) -> str:
+        """Return the key of the artifact stored at `path`."""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def get(self, key: str) -> Optional[PlotArtifact]:
+        """Return the artifact stored under `key`, or None."""
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            artifact.last_access = time.time()
+            return artifact
+
+    def load(self, key: str) -> Optional[bytes]:
+        """Return the PNG bytes stored under `key`, or None if there is no such artifact."""
+        with self._lock:
+            artifact = self._artifacts.get(key)
+        if artifact is None or not get_plot_file_writer().wait(artifact.path):
+            return None
+        with open(artifact.path, "rb") as f:
+            return f.read()
+
+    def put(self, key: str, png_bytes: bytes, question: str, plot_description: str) -> PlotArtifact:
+        """Store a rendered plot (the file is written in the background) and evict old artifacts if needed."""
+        now = time.time()
+        artifact = PlotArtifact(
+            key=key,
+            path=self.path_for(key),
+            size=len(png_bytes),
+            question=question,
+            plot_description=plot_description,
+            plot_analysis=None,
+            created_at=now,
+            last_access=now,
+        )
+        get_plot_file_writer().write(artifact.path, png_bytes)
+        with self._lock:
+            self._artifacts[key] = artifact
+            self._evict(keep=key)
+            self._save_index()
+        return artifact
+
+    def set_analysis(self, key: str, plot_analysis: str) -> None:
+        """Record the vision model's analysis of an artifact so it can be reused."""
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is None:
+                return
+            artifact.plot_analysis = plot_analysis
+            self._save_index()
+
+    def clear(self) -> None:
+        """Delete every stored artifact."""
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+            self._artifacts.clear()
+            self._save_index()
+        for artifact in artifacts:
+            if get_plot_file_writer().wait(artifact.path):
+                try:
+                    os.remove(artifact.path)
+                except OSError as e:
+                    logging.error(f" Plot agent | Failed to delete plot artifact {artifact.path}: {str(e)}")
+
+    def _evict(self, keep: str) -> None:
+        total_bytes = sum(artifact.size for artifact in self._artifacts.values())
+        for artifact in sorted(self._artifacts.values(), key=lambda a: a.last_access):
+            if total_bytes <= self.max_bytes:
+                return
+            if artifact.key == keep:
+                continue
+            del self._artifacts[artifact.key]
+            total_bytes -= artifact.size
+            self._evictions += 1
+            # The file may still be queued for writing; it is removed once written.
+            if get_plot_file_writer().wait(artifact.path):
+                try:
+                    os.remove(artifact.path)
+                except OSError as e:
+                    logging.error(f" Plot agent | Failed to evict plot artifact {artifact.path}: {str(e)}")
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the number and total size of stored artifacts."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "artifacts": len(self._artifacts),
+                "total_bytes": sum(artifact.size for artifact in self._artifacts.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_plot_artifact_store: Optional[PlotArtifactStore] = None
+_plot_artifact_store_lock = threading.Lock()
+
+
+def get_plot_artifact_store(max_bytes: int = 512 * 1024 ** 2) -> PlotArtifactStore:
+    """Return the process-wide plot artifact store in `plot_agent/plots`, creating it on the first call.
+
+    `max_bytes` only applies when the store is created by the first call.
+    """
+    global _plot_artifact_store
+    with _plot_artifact_store_lock:
+        if _plot_artifact_store is None:
+            _plot_artifact_store = PlotArtifactStore(max_bytes=max_bytes)
+        return _plot_artifact_store
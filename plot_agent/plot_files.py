@@ -0,0 +1,100 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+def encode_for_vision(png_bytes: bytes, max_side: Optional[int] = None, image_format: str = "png",
+                      quality: int = 85) -> Tuple[str, bytes]:
+    """Return (mime type, bytes) of the plot image sent to the vision model.
+
+    The rendered PNG is returned unchanged unless it is larger than `max_side` pixels on its longest side
+    (then it is downsized) or another `image_format` is asked for (then it is re-encoded).
+
+    Args:
+        png_bytes: The rendered plot.
+        max_side: Maximum width and height in pixels. None or 0 keeps the original size.
+        image_format: "png" or "jpeg".
+        quality: JPEG quality.
+    """
+    image_format = image_format.lower()
+    with Image.open(io.BytesIO(png_bytes)) as image:
+        resize = bool(max_side) and max(image.size) > max_side
+        if not resize and image_format == "png":
+            return "image/png", png_bytes
+
+        image.load()
+        if resize:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        buf = io.BytesIO()
+        if image_format == "jpeg":
+            image.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+        else:
+            image.save(buf, format="PNG", optimize=True)
+    return f"image/{image_format}", buf.getvalue()
+
+
+class PlotFileWriter:
+    """Writes plot files in a background thread so the agent does not wait on the disk.
+
+    Readers of a plot file call `wait` first; it returns as soon as the pending write of that path is done.
+    """
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plot-writer")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary file first so a reader never sees a partial PNG.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def write(self, path: str, data: bytes) -> None:
+        """Schedule writing `data` to `path`."""
+        with self._lock:
+            future = self._executor.submit(self._write_file, path, data)
+            self._pending[path] = future
+        future.add_done_callback(lambda done: self._forget(path, done))
+
+    def _forget(self, path: str, future: Future) -> None:
+        if future.exception() is not None:
+            logging.error(f" Plot agent | Failed to write plot file {path} | Error:\n{future.exception()}")
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    def wait(self, path: str, timeout: Optional[float] = 10) -> bool:
+        """Wait for a pending write of `path` and return whether the file exists."""
+        with self._lock:
+            future = self._pending.get(path)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                return False
+        return os.path.exists(path)
+
+
+_plot_file_writer = PlotFileWriter()
+
+
+def get_plot_file_writer() -> PlotFileWriter:
+    """Return the process-wide plot file writer."""
+    return _plot_file_writer
+
+
+def wait_for_plot_file(path: Optional[str], timeout: Optional[float] = 10) -> bool:
+    """Wait until the plot file at `path` has been written; return False if there is none."""
+    if not path:
+        return False
+    return get_plot_file_writer().wait(path, timeout=timeout)
@@ -1,9 +1,21 @@
 from typing import TypedDict, Optional
 
+import pandas as pd
+
+from bq_client import ScanBudget
+from result_registry import ResultRegistry
+
 
 class PlotAgentState(TypedDict):
     question: str
     plot_description: list
     messages: list
+    result_registry: Optional[ResultRegistry]
+    data_question_index: Optional[int]
+    scan_budget: Optional[ScanBudget]
+    df_for_plot: Optional[pd.DataFrame]
+    sql_query: Optional[str]
+    plot_png: Optional[bytes]
+    plot_artifact_key: Optional[str]
     plot_analysis: str
     saved_plot_path : Optional[str]
\ No newline at end of file
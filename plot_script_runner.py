@@ -0,0 +1,299 @@
+import contextlib
+import io
+import logging
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, only the timeout applies.
+    resource = None
+
+
+ALLOWED_BUILTINS = {
+    "len": len, "range": range, "min": min, "max": max,
+    "sum": sum, "abs": abs, "round": round, "enumerate": enumerate,
+    "zip": zip, "print": print
+}
+
+
+class PlotScriptError(Exception):
+    """Raised when a plot script fails, times out or exceeds its resource limits."""
+    pass
+
+
+def execute_plot_script(generated_script: str, df: pd.DataFrame, dpi: int = 144) -> bytes:
+    """Run a generated matplotlib script against `df` and return the figure it assigns to `fig` as PNG bytes.
+
+    The script only sees `df`, `plt`, `matplotlib` and a few builtins. The figure is closed after rendering
+    so figures do not accumulate in pyplot's registry.
+
+    Raises:
+        ValueError: If the script does not assign a figure to `fig`.
+        TypeError: If `fig` is not a matplotlib Figure.
+    """
+    import matplotlib
+    try:
+        matplotlib.use("Agg")
+    except Exception:
+        pass
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+
+    ns = {
+        "__builtins__": ALLOWED_BUILTINS,
+        "df": df,
+        "plt": plt,
+        "matplotlib": matplotlib,
+    }
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            exec(generated_script, ns, ns)
+
+        fig = ns.get("fig", None)
+        if fig is None:
+            raise ValueError(
+                "Generated code did not produce a Figure object named `fig`. "
+                "Ensure the script ends with something like: `fig, ax = plt.subplots(...)` and assigns to `fig`."
+            )
+        if not isinstance(fig, Figure):
+            raise TypeError(
+                f"Expected a matplotlib.figure.Figure in `fig`, got {type(fig)}. "
+                "Ensure you assign the Matplotlib Figure object to `fig`."
+            )
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=dpi)
+        return buf.getvalue()
+    finally:
+        plt.close("all")
+
+
+def _warm_up() -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import pyarrow  # noqa: F401
+
+
+def _write_frame(shm: shared_memory.SharedMemory, table: "pyarrow.Table") -> None:
+    import pyarrow as pa
+
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)), table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_frame(shm: shared_memory.SharedMemory, size: int) -> pd.DataFrame:
+    import pyarrow as pa
+
+    # The Arrow table reads the shared memory in place; to_pandas() materializes the frame the script gets,
+    # so no reference to the block outlives this call.
+    return pa.ipc.open_stream(pa.py_buffer(shm.buf[:size])).read_all().to_pandas()
+
+
+def _worker_main(conn, memory_bytes: Optional[int], cpu_seconds: Optional[float]) -> None:
+    """Loop of a worker process: receive (script, shared memory name, size, dpi), reply with PNG bytes or an error."""
+    _warm_up()
+    if resource is not None and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        generated_script, shm_name, size, dpi = request
+
+        if resource is not None and cpu_seconds:
+            # RLIMIT_CPU counts the whole process lifetime, so each script gets its budget on top of the CPU used so far.
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime)
+            hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+            resource.setrlimit(resource.RLIMIT_CPU, (used + int(cpu_seconds) + 1, hard))
+
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            conn.send(("ok", execute_plot_script(generated_script, _read_frame(shm, size), dpi=dpi)))
+        except MemoryError:
+            conn.send(("error", "MemoryError", "The plot script exceeded the memory limit"))
+        except Exception as e:
+            conn.send(("error", type(e).__name__, str(e)))
+        finally:
+            shm.close()
+
+
+class _Worker:
+    def __init__(self, context, memory_bytes: Optional[int], cpu_seconds: Optional[float]) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_bytes, cpu_seconds), daemon=True, name="plot-worker"
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class PlotScriptRunner:
+    """A pool of warm worker processes that execute generated plot scripts and return PNG bytes.
+
+    Workers import matplotlib (Agg backend) and pyarrow once at start. The DataFrame is passed as an Arrow
+    IPC stream in shared memory. Each script runs under a CPU-time limit and the worker's address space is
+    capped; a worker that times out, crashes or hits a limit is killed and replaced. If the replacement cannot
+    be started its slot is left empty and the next run that takes the slot starts a worker again.
+    """
+
+    def __init__(self, workers: int = 2, timeout_seconds: float = 30, cpu_seconds: Optional[float] = 20,
+                 memory_bytes: Optional[int] = 2 * 1024 ** 3, dpi: int = 144) -> None:
+        """Start the worker processes.
+
+        Args:
+            workers: Number of worker processes, i.e. of scripts that can run at the same time.
+            timeout_seconds: Wall-clock time after which a script is aborted.
+            cpu_seconds: CPU time a script may use. None disables the limit.
+            memory_bytes: Address space limit of each worker. None disables the limit.
+            dpi: Resolution of the rendered PNG.
+        """
+        self.workers = workers
+        self.timeout_seconds = timeout_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.dpi = dpi
+
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            # Workers are forked from a server that already imported matplotlib, so replacements start fast.
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(["plot_script_runner", "matplotlib.pyplot", "pyarrow"])
+        else:
+            self._context = multiprocessing.get_context("spawn")
+
+        self._idle_workers = queue.Queue()
+        for _ in range(workers):
+            self._idle_workers.put(self._start_worker())
+
+    def _start_worker(self) -> _Worker:
+        return _Worker(self._context, memory_bytes=self.memory_bytes, cpu_seconds=self.cpu_seconds)
+
+    def _acquire_worker(self) -> _Worker:
+        # The queue holds one entry per slot: an idle worker, or None for a slot whose worker could not be started.
+        worker = self._idle_workers.get()
+        if worker is not None and worker.process.is_alive():
+            return worker
+        if worker is not None:
+            worker.kill()
+        try:
+            return self._start_worker()
+        except Exception as e:
+            self._idle_workers.put(None)
+            raise PlotScriptError(f"Could not start a plot worker: {type(e).__name__}: {e}")
+
+    def _replace_worker(self, worker: _Worker) -> Optional[_Worker]:
+        worker.kill()
+        try:
+            return self._start_worker()
+        except Exception as e:
+            logging.error(f"Failed to start a replacement plot worker: {type(e).__name__}: {e}")
+            return None
+
+    def _release_worker(self, worker: Optional[_Worker]) -> None:
+        # A dead worker is never handed out again; its slot stays empty until the next run starts a new one.
+        if worker is not None and not worker.process.is_alive():
+            worker.kill()
+            worker = None
+        self._idle_workers.put(worker)
+
+    def run(self, generated_script: str, df: pd.DataFrame) -> bytes:
+        """Execute `generated_script` against `df` in a worker and return the rendered PNG bytes.
+
+        Blocks until a worker is free.
+
+        Raises:
+            PlotScriptError: If the script fails, times out or exceeds its resource limits, or no worker can be started.
+        """
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        size_sink = pa.MockOutputStream()
+        with pa.ipc.new_stream(size_sink, table.schema) as writer:
+            writer.write_table(table)
+        size = size_sink.size()
+
+        # The IPC stream is written straight into the shared memory block, which the worker reads without copying.
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            worker = self._acquire_worker()
+        except PlotScriptError:
+            shm.close()
+            shm.unlink()
+            raise
+        try:
+            _write_frame(shm, table)
+            try:
+                worker.conn.send((generated_script, shm.name, size, self.dpi))
+            except OSError as e:
+                # The worker died after it was acquired (BrokenPipeError, ConnectionResetError, ...).
+                worker = self._replace_worker(worker)
+                raise PlotScriptError(f"The plot worker died before it received the script: {type(e).__name__}: {e}")
+
+            if not worker.conn.poll(self.timeout_seconds):
+                worker = self._replace_worker(worker)
+                raise PlotScriptError(f"The plot script did not finish within {self.timeout_seconds} seconds")
+            try:
+                status, *result = worker.conn.recv()
+            except EOFError:
+                # The worker died, most likely killed for exceeding its CPU time.
+                worker = self._replace_worker(worker)
+                raise PlotScriptError(f"The plot script was killed for exceeding its resource limits "
+                                      f"({self.cpu_seconds} CPU seconds, {self.memory_bytes} bytes)")
+        finally:
+            self._release_worker(worker)
+            shm.close()
+            shm.unlink()
+
+        if status == "ok":
+            return result[0]
+        error_type, message = result
+        raise PlotScriptError(f"{error_type}: {message}")
+
+    def close(self) -> None:
+        """Stop all idle workers."""
+        while True:
+            try:
+                worker = self._idle_workers.get_nowait()
+            except queue.Empty:
+                return
+            if worker is not None:
+                worker.kill()
+
+
+_plot_script_runner: Optional[PlotScriptRunner] = None
+_plot_script_runner_lock = threading.Lock()
+
+
+def get_plot_script_runner(workers: int = 2, timeout_seconds: float = 30, cpu_seconds: Optional[float] = 20,
+                           memory_bytes: Optional[int] = 2 * 1024 ** 3, dpi: int = 144) -> PlotScriptRunner:
+    """Return the process-wide plot worker pool, starting it on the first call.
+
+    The arguments only apply when the pool is created by the first call.
+    """
+    global _plot_script_runner
+    with _plot_script_runner_lock:
+        if _plot_script_runner is None:
+            logging.info(f"Starting {workers} plot worker processes")
+            _plot_script_runner = PlotScriptRunner(
+                workers=workers,
+                timeout_seconds=timeout_seconds,
+                cpu_seconds=cpu_seconds,
+                memory_bytes=memory_bytes,
+                dpi=dpi,
+            )
+        return _plot_script_runner
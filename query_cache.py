@@ -0,0 +1,309 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterable, Tuple, Union
+
+import pandas as pd
+
+from sql_tokenizer import tokenize, WORD
+
+
+# BigQuery's reserved keywords. Only these are case-folded in a fingerprint: unquoted table and dataset names are
+# case-sensitive in BigQuery, so other words are kept as written.
+RESERVED_KEYWORDS = frozenset("""
+    all and any array as asc assert_rows_modified at between by case cast collate contains create cross cube current
+    default define desc distinct else end enum escape except exclude exists extract false fetch following for from full
+    group grouping groups hash having if ignore in inner intersect interval into is join lateral left like limit lookup
+    merge natural new no not null nulls of on or order outer over partition preceding proto qualify range recursive
+    respect right rollup rows select set some struct tablesample then to treat true unbounded union unnest using when
+    where window with within
+""".split())
+
+# Functions whose result changes from one call to the next; queries using them are never cached.
+NON_DETERMINISTIC_FUNCTIONS = frozenset((
+    "current_date", "current_datetime", "current_time", "current_timestamp", "rand", "generate_uuid", "session_user",
+))
+
+
+class _CacheEntry:
+    """A cached query result plus the cost it took to produce it.
+
+    The result is either a pandas DataFrame or a pyarrow Table, depending on how it was fetched.
+    """
+
+    __slots__ = ("df", "created_at", "elapsed_seconds", "bytes_processed", "total_rows", "size_bytes")
+
+    def __init__(self, df: Union[pd.DataFrame, "pyarrow.Table"], created_at: float, elapsed_seconds: float,
+                 bytes_processed: int, total_rows: Optional[int] = None) -> None:
+        self.df = df
+        self.created_at = created_at
+        self.elapsed_seconds = elapsed_seconds
+        self.bytes_processed = bytes_processed
+        self.total_rows = len(df) if total_rows is None else total_rows
+        if isinstance(df, pd.DataFrame):
+            self.size_bytes = int(df.memory_usage(deep=True).sum())
+        else:
+            self.size_bytes = int(df.nbytes)
+
+    def copy_result(self) -> Union[pd.DataFrame, "pyarrow.Table"]:
+        # Arrow tables are immutable, so only DataFrames need a defensive copy.
+        return self.df.copy() if isinstance(self.df, pd.DataFrame) else self.df
+
+
+class QueryResultCache:
+    """A two-tier cache for query results keyed by a normalized SQL fingerprint.
+
+    The first tier is an in-memory LRU bounded by entry count and bytes. The optional second tier
+    stores each result as a Parquet file under `cache_dir`, bounded by a byte budget. Both tiers
+    drop entries older than `ttl_seconds`.
+    """
+
+    _metadata_key = b"query_cache"
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of results kept in memory.
+            max_memory_bytes: Maximum total size of the results kept in memory.
+            ttl_seconds: Age after which a cached result is considered stale.
+            cache_dir: Directory for the on-disk Parquet tier. If None, the disk tier is disabled.
+            max_disk_bytes: Maximum total size of the Parquet files in `cache_dir`.
+        """
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "saved_seconds": 0.0,
+            "saved_bytes_processed": 0,
+        }
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(sql_query: str, scope: Iterable[Optional[str]] = ()) -> str:
+        """Return a fingerprint that ignores comments, whitespace and the case of reserved keywords.
+
+        String literals, quoted identifiers and all other words are kept verbatim, since their content (and
+        for table names their case) is significant. A trailing semicolon is ignored as well.
+
+        Args:
+            sql_query: The SQL query.
+            scope: Where the query runs, e.g. (backend, project, dataset). Results of the same SQL run elsewhere
+                get a different fingerprint.
+        """
+        tokens = [
+            token.value.lower() if token.type == WORD and token.value.lower() in RESERVED_KEYWORDS else token.value
+            for token in tokenize(sql_query)
+        ]
+        while tokens and tokens[-1] == ";":
+            tokens.pop()
+        normalized = json.dumps([list(scope), " ".join(tokens)])
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_cacheable(sql_query: str) -> bool:
+        """Return False if the query calls a non-deterministic function such as CURRENT_DATE or RAND."""
+        return not any(
+            token.type == WORD and token.value.lower() in NON_DETERMINISTIC_FUNCTIONS for token in tokenize(sql_query)
+        )
+
+    def get(self, key: str) -> Optional[Union[pd.DataFrame, "pyarrow.Table"]]:
+        """Return a copy of the cached result for `key`, or None on a miss."""
+        cached = self.get_with_total_rows(key)
+        return None if cached is None else cached[0]
+
+    def get_with_total_rows(self, key: str, record_miss: bool = True) -> Optional[Tuple[Union[pd.DataFrame, "pyarrow.Table"], int]]:
+        """Return a copy of the cached result for `key` and the row count of the full query result.
+
+        The two differ when the result was cached from a row-limited fetch. Returns None on a miss;
+        pass `record_miss=False` when probing a key that has a fallback, so the miss is not counted twice.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl_seconds:
+                self._remove_from_memory(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._record_hit(entry, tier="memory_hits")
+                return entry.copy_result(), entry.total_rows
+
+        entry = self._read_from_disk(key, now=now)
+        with self._lock:
+            if entry is None:
+                if record_miss:
+                    self._stats["misses"] += 1
+                return None
+            self._add_to_memory(key, entry)
+            self._record_hit(entry, tier="disk_hits")
+            return entry.copy_result(), entry.total_rows
+
+    def put(self, key: str, df: Union[pd.DataFrame, "pyarrow.Table"], elapsed_seconds: float = 0.0, bytes_processed: int = 0,
+            total_rows: Optional[int] = None) -> None:
+        """Store a copy of `df` under `key` together with what it cost to compute.
+
+        `total_rows` is the row count of the full query result when `df` holds only its first rows.
+        """
+        if isinstance(df, pd.DataFrame):
+            df = df.copy()
+        entry = _CacheEntry(df=df, created_at=time.time(), elapsed_seconds=elapsed_seconds, bytes_processed=bytes_processed,
+                            total_rows=total_rows)
+        with self._lock:
+            self._add_to_memory(key, entry)
+        self._write_to_disk(key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the BigQuery time and bytes saved by cache hits."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop every cached result from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        if self.cache_dir:
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".parquet"):
+                    os.remove(os.path.join(self.cache_dir, file_name))
+
+    def _record_hit(self, entry: _CacheEntry, tier: str) -> None:
+        self._stats["hits"] += 1
+        self._stats[tier] += 1
+        self._stats["saved_seconds"] += entry.elapsed_seconds
+        self._stats["saved_bytes_processed"] += entry.bytes_processed
+
+    def _add_to_memory(self, key: str, entry: _CacheEntry) -> None:
+        if entry.size_bytes > self.max_memory_bytes:
+            return
+        self._remove_from_memory(key)
+        self._entries[key] = entry
+        self._memory_bytes += entry.size_bytes
+        while len(self._entries) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= evicted.size_bytes
+
+    def _remove_from_memory(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size_bytes
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _read_from_disk(self, key: str, now: float) -> Optional[_CacheEntry]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(path)
+            metadata = json.loads((table.schema.metadata or {}).get(self._metadata_key, b"{}"))
+            created_at = metadata.get("created_at", os.path.getmtime(path))
+            if now - created_at > self.ttl_seconds:
+                os.remove(path)
+                return None
+            os.utime(path)
+            return _CacheEntry(
+                df=table.to_pandas(),
+                created_at=created_at,
+                elapsed_seconds=metadata.get("elapsed_seconds", 0.0),
+                bytes_processed=metadata.get("bytes_processed", 0),
+                total_rows=metadata.get("total_rows"),
+            )
+        except Exception as e:
+            logging.error(f"Failed to read cached query result {path}: {str(e)}")
+            return None
+
+    def _write_to_disk(self, key: str, entry: _CacheEntry) -> None:
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if isinstance(entry.df, pd.DataFrame):
+                table = pa.Table.from_pandas(entry.df, preserve_index=False)
+            else:
+                table = entry.df
+            metadata = dict(table.schema.metadata or {})
+            metadata[self._metadata_key] = json.dumps({
+                "created_at": entry.created_at,
+                "elapsed_seconds": entry.elapsed_seconds,
+                "bytes_processed": entry.bytes_processed,
+                "total_rows": entry.total_rows,
+            }).encode("utf-8")
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+            os.replace(tmp_path, path)
+            self._enforce_disk_budget()
+        except Exception as e:
+            logging.error(f"Failed to write cached query result {path}: {str(e)}")
+
+    def _enforce_disk_budget(self) -> None:
+        files = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".parquet"):
+                path = os.path.join(self.cache_dir, file_name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_bytes <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+
+
+_shared_query_cache: Optional[QueryResultCache] = None
+_shared_query_cache_lock = threading.Lock()
+
+
+def get_shared_query_cache() -> QueryResultCache:
+    """Return the process-wide query result cache shared by every BigQueryRunner.
+
+    The on-disk tier is enabled by setting BQ_QUERY_CACHE_DIR; BQ_QUERY_CACHE_TTL_SECONDS
+    overrides the default time to live.
+    """
+    global _shared_query_cache
+    with _shared_query_cache_lock:
+        if _shared_query_cache is None:
+            _shared_query_cache = QueryResultCache(
+                cache_dir=os.getenv("BQ_QUERY_CACHE_DIR") or None,
+                ttl_seconds=float(os.getenv("BQ_QUERY_CACHE_TTL_SECONDS", 3600)),
+            )
+        return _shared_query_cache
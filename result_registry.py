@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from bq_client import QueryResult
+
+
+class SharedResult:
+    """The result of one SQL sub-question, as fetched by the SQL agent."""
+
+    __slots__ = ("question", "sql_query", "data", "total_rows")
+
+    def __init__(self, question: str, sql_query: str, data: pd.DataFrame, total_rows: int) -> None:
+        self.question = question
+        self.sql_query = sql_query
+        self.data = data
+        self.total_rows = total_rows
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.data) < self.total_rows
+
+
+def _resolve(future: asyncio.Future, result: Optional[SharedResult]) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+class ResultRegistry:
+    """Result frames of one turn's SQL sub-questions, shared between the agents that run in parallel.
+
+    The SQL agent answering question `i` publishes its result frame (or marks the question failed), and the
+    plot agent waits for the frame of the question the explorer said covers the plot instead of generating and
+    running its own query. Waiting works from threads (`wait`) and from the event loop (`await_result`).
+    """
+
+    def __init__(self, questions: List[str]) -> None:
+        self.questions = list(questions)
+        self._results: Dict[int, Optional[SharedResult]] = {}
+        self._events = [threading.Event() for _ in self.questions]
+        self._async_waiters: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+
+    def _set(self, index: int, result: Optional[SharedResult]) -> None:
+        with self._lock:
+            if index in self._results:
+                return
+            self._results[index] = result
+            waiters = self._async_waiters.pop(index, [])
+            self._events[index].set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, result)
+
+    def publish(self, index: int, sql_query: str, query_result: QueryResult) -> None:
+        """Share the result of question `index`. Only the first result or failure of a question counts."""
+        data = query_result.data
+        if not isinstance(data, pd.DataFrame):
+            data = data.to_pandas()
+        self._set(index, SharedResult(self.questions[index], sql_query, data, query_result.total_rows))
+
+    def fail(self, index: int) -> None:
+        """Mark question `index` as answered without a result, releasing its waiters."""
+        self._set(index, None)
+
+    def wait(self, index: int, timeout: Optional[float] = None) -> Optional[SharedResult]:
+        """Block until question `index` has a result and return it; None if it failed or `timeout` passed."""
+        if not 0 <= index < len(self.questions):
+            return None
+        self._events[index].wait(timeout)
+        with self._lock:
+            return self._results.get(index)
+
+    async def await_result(self, index: int, timeout: Optional[float] = None) -> Optional[SharedResult]:
+        """Async variant of `wait` that does not hold a thread while waiting."""
+        if not 0 <= index < len(self.questions):
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if index in self._results:
+                return self._results[index]
+            self._async_waiters.setdefault(index, []).append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
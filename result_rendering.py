@@ -0,0 +1,191 @@
+import csv
+import decimal
+import io
+import math
+from typing import List, Optional, Union
+
+import pandas as pd
+
+from schema_pruning import estimate_tokens
+
+
+DEFAULT_MAX_TOKENS = 2000
+FORMATS = ("csv", "markdown")
+
+_INFERRED_TYPES = {
+    "integer": "int",
+    "floating": "float",
+    "mixed-integer-float": "float",
+    "decimal": "decimal",
+    "boolean": "bool",
+    "date": "date",
+    "datetime": "timestamp",
+    "datetime64": "timestamp",
+    "time": "time",
+    "string": "string",
+    "bytes": "bytes",
+    "empty": "null",
+}
+
+
+def column_type(series: pd.Series) -> str:
+    """Return a short type name for a result column: int, float, decimal, bool, date, timestamp, string, ..."""
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "timestamp"
+    # Object columns (BigQuery NUMERIC, DATE, STRING, ...) are typed by their values.
+    return _INFERRED_TYPES.get(pd.api.types.infer_dtype(series, skipna=True), "string")
+
+
+def format_value(value, significant_digits: int = 6) -> str:
+    """Format one cell compactly: numbers rounded to `significant_digits`, midnight timestamps as dates, nulls as ''."""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (float, decimal.Decimal)):
+        value = float(value)
+        if math.isinf(value):
+            return str(value)
+        if value.is_integer() or abs(value) >= 10 ** significant_digits:
+            return str(int(round(value)))
+        return f"{value:.{significant_digits}g}"
+    if isinstance(value, pd.Timestamp):
+        if value.tz is None and value == value.normalize():
+            return value.date().isoformat()
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def render_columns(df: pd.DataFrame) -> str:
+    """Return the columns of a result with their types, e.g. "month (date), orders (int)"."""
+    return ", ".join(f"{name} ({column_type(df[name])})" for name in df.columns)
+
+
+def _render_lines(df: pd.DataFrame, fmt: str, significant_digits: int) -> List[str]:
+    # The header line(s) followed by one string per row, so leading rows can be cut without rendering again.
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+    header = [f"{name} ({column_type(df[name])})" for name in df.columns]
+    rows = [[format_value(value, significant_digits) for value in row] for row in df.itertuples(index=False, name=None)]
+
+    if fmt == "markdown":
+        lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+        return lines + ["| " + " | ".join(cell.replace("|", "\\|").replace("\n", " ") for cell in row) + " |" for row in rows]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    lines = []
+    for row in [header] + rows:
+        writer.writerow(row)
+        lines.append(buffer.getvalue().rstrip("\n"))
+        buffer.seek(0)
+        buffer.truncate()
+    return lines
+
+
+def render_rows(df: pd.DataFrame, fmt: str = "csv", significant_digits: int = 6, header: bool = True) -> str:
+    """Render rows as CSV or a markdown table whose header holds each column's name and type.
+
+    Unlike `DataFrame.to_string`, columns are not padded to a fixed width and numbers are rounded, so wide
+    results cost far fewer prompt tokens. With `header=False` only the rows are rendered, for prompts that already
+    list the columns in order (see `render_columns`).
+    """
+    lines = _render_lines(df, fmt, significant_digits)
+    return "\n".join(lines if header else lines[len(lines) - len(df):])
+
+
+def summarize_columns(df: pd.DataFrame, top_k: int = 5, significant_digits: int = 6) -> List[str]:
+    """Describe every column in one line: non-null count, min/max (and mean for numbers) or the top-k values."""
+    lines = []
+    for name in df.columns:
+        series = df[name]
+        kind = column_type(series)
+        values = series.dropna()
+        line = f"- {name} ({kind}): {len(values)} non-null"
+        if values.empty:
+            lines.append(line)
+            continue
+        if kind in ("int", "float", "decimal"):
+            numbers = pd.to_numeric(values, errors="coerce").dropna()
+            if not numbers.empty:
+                line += (f", min {format_value(numbers.min(), significant_digits)}, "
+                         f"max {format_value(numbers.max(), significant_digits)}, "
+                         f"mean {format_value(numbers.mean(), significant_digits)}")
+        elif kind in ("date", "timestamp", "time"):
+            line += f", min {format_value(values.min())}, max {format_value(values.max())}"
+        else:
+            counts = values.astype(str).value_counts()
+            top = ", ".join(f"{value} ({count})" for value, count in counts.head(top_k).items())
+            line += f", {len(counts)} distinct, top: {top}"
+        lines.append(line)
+    return lines
+
+
+def render_result(data: Union[pd.DataFrame, "pyarrow.Table"], total_rows: Optional[int] = None,
+                  max_tokens: int = DEFAULT_MAX_TOKENS, fmt: str = "csv", significant_digits: int = 6,
+                  top_k: int = 5, max_rows: Optional[int] = None) -> str:
+    """Render a query result for an LLM prompt within a token budget.
+
+    Rows that fit `max_tokens` are rendered whole. Otherwise (or when `max_rows` cuts them) the result is rendered
+    as a per-column summary (count, min/max/mean or top-k values) followed by as many of its first rows as fit.
+
+    Args:
+        data: The result rows (a DataFrame or a pyarrow Table).
+        total_rows: Size of the full result, if only part of it was downloaded. Defaults to the rows given.
+        max_tokens: Token budget of the rendered text (estimated at about four characters per token).
+        fmt: "csv" or "markdown".
+        significant_digits: Significant digits kept for non-integer numbers.
+        top_k: Most frequent values listed per text column in a summary.
+        max_rows: If given, show at most this many rows even if more would fit.
+
+    Returns:
+        The rendered result.
+    """
+    df = data if isinstance(data, pd.DataFrame) else data.to_pandas()
+    total_rows = len(df) if total_rows is None else total_rows
+    shown_limit = len(df) if max_rows is None else min(max_rows, len(df))
+
+    lines = _render_lines(df.head(shown_limit), fmt, significant_digits)
+    header_lines = len(lines) - shown_limit
+
+    def table(count: int) -> str:
+        return "\n".join(lines[:header_lines + count])
+
+    if shown_limit == len(df):
+        label = f"rows: {total_rows}" if len(df) == total_rows else f"rows: {total_rows} (first {len(df)} shown)"
+        text = f"{label}\n{table(shown_limit)}"
+        if estimate_tokens(text) <= max_tokens:
+            return text
+
+    scope = "all rows" if len(df) == total_rows else f"the first {len(df)} rows"
+    summary = "\n".join([f"rows: {total_rows}", f"summary of {scope}:", *summarize_columns(df, top_k, significant_digits)])
+
+    def with_summary(count: int) -> str:
+        return f"{summary}\nfirst {count} rows:\n{table(count)}"
+
+    def rows_only(count: int) -> str:
+        return f"rows: {total_rows} (first {count} shown)\n{table(count)}"
+
+    count = _most_rows_within(with_summary, shown_limit, max_tokens)
+    if count > 0 or shown_limit == 0:
+        return with_summary(count)
+    # A wide result's summary alone can exceed the budget; the leading rows are more useful then.
+    return rows_only(max(1, _most_rows_within(rows_only, shown_limit, max_tokens)))
+
+
+def _most_rows_within(render, limit: int, max_tokens: int) -> int:
+    # Binary search for the most leading rows whose rendering fits the budget.
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(render(middle)) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return low
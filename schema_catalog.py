@@ -0,0 +1,236 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from bq_client import BigQueryRunner, get_big_query_runner
+
+
+TABLES = {
+    "orders": "Customer order information",
+    "order_items": "Individual items within orders",
+    "products": "Product catalog and details",
+    "users": "Customer demographics and information",
+}
+
+
+class SchemaCatalog:
+    """An in-memory catalog of the dataset's table schemas and row examples, rendered for LLM prompts.
+
+    The catalog is loaded once and the rendered text is memoized. At most every `refresh_interval_seconds` it
+    compares the tables' `modified` timestamps with the ones it was built from and rebuilds the stale tables
+    concurrently. The committed summary file is only read, as the seed of a fresh checkout: rebuilt summaries
+    and their timestamps are saved to the (untracked) metadata file, which takes precedence on the next load.
+    """
+
+    def __init__(self, summary_path: str, metadata_path: str, big_query_runner: Optional[BigQueryRunner] = None,
+                 refresh_interval_seconds: float = 3600, sample_rows: int = 100) -> None:
+        """Initialize the catalog. Nothing is read until the first request.
+
+        Args:
+            summary_path: Text file holding the rendered summary of all tables, used when no metadata file exists.
+            metadata_path: JSON file holding the table summaries last built and the `modified` timestamps they
+                were built from.
+            big_query_runner: Runner used to refresh the catalog. If None, uses the shared runner.
+            refresh_interval_seconds: Minimum time between two staleness checks against BigQuery.
+            sample_rows: Number of rows read (without running a query) to pick a row example from.
+        """
+        self.summary_path = summary_path
+        self.metadata_path = metadata_path
+        self.big_query_runner = big_query_runner
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.sample_rows = sample_rows
+
+        self._table_summaries: Dict[str, str] = {}
+        self._table_modified: Dict[str, Optional[str]] = {}
+        self._checked_at = 0.0
+        self._rendered: Optional[str] = None
+        # `_lock` guards the fields above and is never held during BigQuery calls; `_refresh_lock` lets one
+        # thread at a time load or refresh the catalog.
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def get_tables_information(self) -> str:
+        """Return the summary of all tables, refreshing stale tables first if a check is due."""
+        self._ensure_fresh()
+        with self._lock:
+            if self._rendered is None:
+                self._rendered = "\n\n".join(self._table_summaries[table] for table in TABLES if table in self._table_summaries)
+            return self._rendered
+
+    def get_table_summaries(self) -> Dict[str, str]:
+        """Return the summary of each table, keyed by table name."""
+        self.get_tables_information()
+        with self._lock:
+            return dict(self._table_summaries)
+
+    def get_data_version(self) -> str:
+        """Return a version string that changes whenever one of the tables is modified.
+
+        It is derived from the tables' `modified` timestamps as of the last staleness check.
+        """
+        self.get_tables_information()
+        with self._lock:
+            table_modified = json.dumps(self._table_modified, sort_keys=True)
+        return hashlib.sha256(table_modified.encode("utf-8")).hexdigest()[:16]
+
+    def _runner(self) -> BigQueryRunner:
+        return self.big_query_runner or get_big_query_runner()
+
+    def _is_due(self) -> tuple:
+        with self._lock:
+            loaded = bool(self._table_summaries)
+            return loaded, not loaded or time.time() - self._checked_at >= self.refresh_interval_seconds
+
+    def _ensure_fresh(self) -> None:
+        loaded, due = self._is_due()
+        if not due:
+            return
+        # While another thread refreshes a loaded catalog, readers keep getting the current summaries instead
+        # of waiting for BigQuery; only an empty catalog makes them wait for the load.
+        if not self._refresh_lock.acquire(blocking=not loaded):
+            return
+        try:
+            loaded, due = self._is_due()
+            if not loaded:
+                self._load()
+            elif due:
+                self._refresh_stale_tables()
+        finally:
+            self._refresh_lock.release()
+
+    def _load(self) -> None:
+        metadata = {}
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+
+        table_summaries = metadata.get("table_summaries") or {}
+        checked_at = metadata.get("checked_at", 0.0)
+        if not table_summaries and os.path.exists(self.summary_path):
+            with open(self.summary_path, "r", encoding="utf-8") as f:
+                summary = f.read()
+            for table_summary in re.split(r"\n\n(?=Table name: )", summary.strip()):
+                table = table_summary.split("\n", 1)[0][len("Table name: "):].strip()
+                table_summaries[table] = table_summary
+            checked_at = metadata.get("checked_at", os.path.getmtime(self.summary_path))
+
+        with self._lock:
+            self._table_summaries = table_summaries
+            self._table_modified = metadata.get("table_modified", {})
+            self._checked_at = checked_at
+            self._rendered = None
+
+        missing_tables = [table for table in TABLES if table not in table_summaries]
+        if missing_tables:
+            self._rebuild(missing_tables)
+
+    def _refresh_stale_tables(self) -> None:
+        try:
+            runner = self._runner()
+            with ThreadPoolExecutor(max_workers=len(TABLES), thread_name_prefix="schema-check") as executor:
+                modified = dict(zip(TABLES, executor.map(runner.get_table_modified, TABLES)))
+        except Exception as e:
+            # Keep serving the current summaries; the next check is due after another interval.
+            logging.error(f"Failed to check the tables for schema changes: {str(e)}")
+            self._mark_checked()
+            return
+
+        with self._lock:
+            stale_tables = [table for table in TABLES if modified[table] != self._table_modified.get(table)]
+        if stale_tables:
+            logging.info(f"Refreshing schema summaries of tables: {stale_tables}")
+            try:
+                self._rebuild(stale_tables, modified)
+            except Exception as e:
+                logging.error(f"Failed to refresh the schema summaries: {str(e)}")
+                self._mark_checked()
+        else:
+            self._mark_checked()
+            self._save_metadata()
+
+    def _mark_checked(self) -> None:
+        with self._lock:
+            self._checked_at = time.time()
+
+    def _rebuild(self, tables: list, modified: Optional[Dict[str, str]] = None) -> None:
+        # The BigQuery calls run without the lock; the new summaries are swapped in all at once. `modified` holds
+        # the modification times the caller already fetched, so they are not fetched again.
+        runner = self._runner()
+        modified = modified or {}
+
+        def build(table: str) -> tuple:
+            table_modified = modified[table] if table in modified else runner.get_table_modified(table_name=table)
+            return self._build_table_summary(runner, table, table_modified)
+
+        with ThreadPoolExecutor(max_workers=len(tables), thread_name_prefix="schema-refresh") as executor:
+            results = list(executor.map(build, tables))
+
+        with self._lock:
+            table_summaries = dict(self._table_summaries)
+            table_modified = dict(self._table_modified)
+            for table, (table_summary, modified) in zip(tables, results):
+                table_summaries[table] = table_summary
+                table_modified[table] = modified
+            self._table_summaries = table_summaries
+            self._table_modified = table_modified
+            self._checked_at = time.time()
+            self._rendered = None
+        self._save_metadata()
+
+    def _build_table_summary(self, runner: BigQueryRunner, table: str, modified: Optional[str]) -> tuple:
+        schema_info = runner.get_table_schema(table_name=table)
+
+        # Reading rows through the table API costs nothing, unlike a full-table TO_JSON_STRING scan.
+        # The row with the fewest NULLs among the sampled rows is used as the example.
+        df = runner.sample_rows(table_name=table, max_rows=self.sample_rows)
+
+        lines = []
+        lines.append(f"Table name: {table}")
+        lines.append(f"Table description: {TABLES[table]}")
+        lines.append("Table columns information:")
+        for col in schema_info or []:
+            lines.append(f"name: {col.get('name')}, type: {col.get('type')}, mode: {col.get('mode')}")
+
+        lines.append("Row example :")
+        if df is not None and not df.empty:
+            row_dict = df.loc[[df.isna().sum(axis=1).idxmin()]].to_dict(orient="records")[0]
+            lines.append(json.dumps(row_dict, indent=2, default=str))
+        else:
+            lines.append("(no rows returned)")
+
+        return "\n".join(lines), modified
+
+    def _save_metadata(self) -> None:
+        with self._lock:
+            metadata = {
+                "checked_at": self._checked_at,
+                "table_modified": self._table_modified,
+                "table_summaries": self._table_summaries,
+            }
+        tmp_path = f"{self.metadata_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, self.metadata_path)
+
+
+_schema_catalog: Optional[SchemaCatalog] = None
+_schema_catalog_lock = threading.Lock()
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    """Return the process-wide schema catalog backed by SQL_tables_summary.txt."""
+    global _schema_catalog
+    with _schema_catalog_lock:
+        if _schema_catalog is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/")
+            _schema_catalog = SchemaCatalog(
+                summary_path=os.path.join(script_directory, "SQL_tables_summary.txt"),
+                metadata_path=os.path.join(script_directory, "SQL_tables_metadata.json"),
+            )
+        return _schema_catalog
@@ -0,0 +1,139 @@
+import logging
+import re
+from collections import deque
+from typing import Dict, List, Set
+
+
+# Foreign keys between the dataset's tables: (table, column, referenced table, referenced column).
+JOIN_HINTS = [
+    ("order_items", "order_id", "orders", "order_id"),
+    ("order_items", "product_id", "products", "id"),
+    ("order_items", "user_id", "users", "id"),
+    ("orders", "user_id", "users", "id"),
+]
+
+# Business words that point at a table without naming one of its columns.
+TABLE_SYNONYMS = {
+    "orders": {"order", "purchase", "checkout", "shipment", "shipping", "delivery", "deliver", "return", "refund"},
+    "order_items": {"item", "revenue", "sale", "sell", "sold", "price", "unit", "basket", "aov", "gmv", "spend", "income"},
+    "products": {"product", "category", "brand", "catalog", "sku", "department", "cost", "retail", "margin", "profit"},
+    "users": {"user", "customer", "buyer", "client", "shopper", "gender", "age", "country", "city", "state",
+              "traffic", "source", "demographic", "signup", "region", "geography", "geographic", "location"},
+}
+
+
+# Column-name parts too generic to say anything about which table a question needs.
+GENERIC_COLUMN_WORDS = {"id", "at", "of", "num", "name", "first", "last", "created", "code", "street", "address", "distribution"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of LLM tokens in `text` (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _normalize_word(word: str) -> str:
+    word = word.lower()
+    for suffix in ("ies", "es", "s"):
+        if word.endswith(suffix) and len(word) > len(suffix) + 2:
+            return word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def _words(text: str) -> Set[str]:
+    return {_normalize_word(word) for word in re.findall(r"[A-Za-z]+", text)}
+
+
+class SchemaPruner:
+    """Selects the tables a question needs from a lexical index over table names, column names and synonyms.
+
+    Tables joining two selected tables are added so the SQL can still be written, and the join
+    keys are rendered as hints. When nothing in the question matches, every table is kept.
+    """
+
+    def __init__(self, table_summaries: Dict[str, str]) -> None:
+        """Build the index.
+
+        Args:
+            table_summaries: Summary of each table as rendered by the schema catalog, keyed by table name.
+        """
+        self.table_summaries = table_summaries
+        self._index: Dict[str, Dict[str, int]] = {}
+        for table, table_summary in table_summaries.items():
+            weights = {}
+            for column in re.findall(r"^name: (\w+),", table_summary, flags=re.MULTILINE):
+                for word in _words(column.replace("_", " ")) - GENERIC_COLUMN_WORDS:
+                    weights[word] = max(weights.get(word, 0), 1)
+            for word in _words(table.replace("_", " ")) | TABLE_SYNONYMS.get(table, set()):
+                weights[word] = 2
+            self._index[table] = weights
+
+    def select_tables(self, question: str) -> List[str]:
+        """Return the tables relevant to `question`, in catalog order."""
+        # Each question word votes for the table(s) where it matches best, so "gender" picks users
+        # (a synonym) over orders (just a column). Words that tie between tables are only used if
+        # none of the tied tables was already picked by a clearer word.
+        selected = set()
+        tied_matches = []
+        for word in _words(question):
+            best_weight = max(weights.get(word, 0) for weights in self._index.values())
+            if best_weight == 0:
+                continue
+            best_tables = {table for table, weights in self._index.items() if weights.get(word, 0) == best_weight}
+            if len(best_tables) == 1:
+                selected |= best_tables
+            else:
+                tied_matches.append(best_tables)
+        for best_tables in tied_matches:
+            if not best_tables & selected:
+                selected |= best_tables
+
+        if not selected:
+            return list(self.table_summaries)
+
+        selected |= self._connecting_tables(selected)
+        return [table for table in self.table_summaries if table in selected]
+
+    def render(self, question: str) -> str:
+        """Return the schema context for `question`: the relevant table summaries plus their join hints."""
+        tables = self.select_tables(question)
+        blocks = [self.table_summaries[table] for table in tables]
+        join_hints = [
+            f"{table}.{column} = {referenced_table}.{referenced_column}"
+            for table, column, referenced_table, referenced_column in JOIN_HINTS
+            if table in tables and referenced_table in tables
+        ]
+        if join_hints:
+            blocks.append("Join hints:\n" + "\n".join(join_hints))
+        pruned = "\n\n".join(blocks)
+
+        full_tokens = estimate_tokens("\n\n".join(self.table_summaries.values()))
+        pruned_tokens = estimate_tokens(pruned)
+        logging.info(f"Schema context pruned to tables {tables}: ~{pruned_tokens} tokens instead of ~{full_tokens}")
+        return pruned
+
+    def _connecting_tables(self, selected: Set[str]) -> Set[str]:
+        """Return the tables on the shortest join paths between the first selected table and the others."""
+        neighbours = {table: set() for table in self.table_summaries}
+        for table, _, referenced_table, _ in JOIN_HINTS:
+            if table in neighbours and referenced_table in neighbours:
+                neighbours[table].add(referenced_table)
+                neighbours[referenced_table].add(table)
+
+        ordered = [table for table in self.table_summaries if table in selected]
+        start = ordered[0]
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            table = queue.popleft()
+            for neighbour in sorted(neighbours[table]):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+
+        connecting = set()
+        for target in ordered[1:]:
+            table = previous.get(target)
+            while table is not None and table != start:
+                connecting.add(table)
+                table = previous[table]
+        return connecting
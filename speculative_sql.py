@@ -0,0 +1,217 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+
+from bq_client import BigQueryRunner, ScanBudget
+
+
+CANDIDATE_INSTRUCTION = (
+    "Candidate {number} of {count}: every candidate query is validated on its own and the first valid one is used. "
+    "Where the question allows more than one correct query, take a different approach from the other candidates."
+)
+
+
+class SqlCandidate(NamedTuple):
+    """One generated SQL query of a speculative round and what became of it."""
+    index: int
+    response: Any
+    sql_query: Optional[str]
+    bytes_processed: int = 0
+    error: Optional[Exception] = None
+
+
+class SpeculativeOutcome(NamedTuple):
+    """The result of a speculative round.
+
+    `result` is what `execute` returned for the winning candidate (None if every candidate failed), `candidates`
+    holds the candidates that finished in the order they finished, and `failures` those of them that were rejected
+    or failed to execute.
+    """
+    winner: Optional[SqlCandidate]
+    result: Any
+    candidates: List[SqlCandidate]
+
+    @property
+    def failures(self) -> List[SqlCandidate]:
+        return [c for c in self.candidates if c.error is not None and c.sql_query is not None]
+
+
+class SpeculativeSqlGenerator:
+    """Generates several SQL candidates at once and executes the first one that validates.
+
+    Instead of the serial generate, execute, fail, regenerate loop, a round asks the LLM for `candidates` queries
+    in parallel calls, validates each with a dry run (syntax, schema and scan budget) as soon as it arrives and
+    executes the first valid one. Once a candidate wins, the other candidates are cancelled: async LLM calls are
+    cancelled outright, and candidates whose call cannot be interrupted (sync calls already running in a worker
+    thread) skip their dry run and are ignored. Each call gets its candidate number in the question, so the
+    candidates differ and are cached separately.
+    """
+
+    def __init__(self, llm: BaseChatModel, big_query_runner: BigQueryRunner, candidates: int) -> None:
+        """Initialize the generator.
+
+        Args:
+            llm: The chat model writing the queries.
+            big_query_runner: The runner used for the dry runs.
+            candidates: Number of candidate queries per round.
+        """
+        if candidates < 1:
+            raise ValueError("candidates must be at least 1")
+        self.llm = llm
+        self.big_query_runner = big_query_runner
+        self.candidates = candidates
+
+    def candidate_messages(self, messages: list, index: int) -> list:
+        """Return `messages` with the candidate instruction appended to the last (human) message."""
+        if self.candidates == 1:
+            return messages
+        question = messages[-1]
+        instruction = CANDIDATE_INSTRUCTION.format(number=index + 1, count=self.candidates)
+        return messages[:-1] + [HumanMessage(f"{question.content}\n\n{instruction}", id=question.id)]
+
+    def _validate(self, candidate: SqlCandidate, scan_budget: Optional[ScanBudget],
+                  cancelled: threading.Event) -> SqlCandidate:
+        if cancelled.is_set():
+            # Another candidate already won the round; its result makes this dry run useless.
+            return candidate._replace(error=CancelledError())
+        try:
+            bytes_processed = self.big_query_runner.dry_run(candidate.sql_query)
+            if scan_budget is not None and bytes_processed > scan_budget.max_bytes_per_query:
+                # reserve() rejects it before charging anything, with the error the serial loop feeds back to the LLM.
+                scan_budget.reserve(bytes_processed)
+        except Exception as e:
+            return candidate._replace(error=e)
+        return candidate._replace(bytes_processed=bytes_processed)
+
+    @staticmethod
+    def _reserve(candidate: SqlCandidate, scan_budget: Optional[ScanBudget]) -> SqlCandidate:
+        if scan_budget is None:
+            return candidate
+        try:
+            scan_budget.reserve(candidate.bytes_processed)
+        except Exception as e:
+            return candidate._replace(error=e)
+        return candidate
+
+    @staticmethod
+    def _release(candidate: SqlCandidate, scan_budget: Optional[ScanBudget]) -> None:
+        if scan_budget is not None:
+            scan_budget.release(candidate.bytes_processed)
+
+    def _execute(self, candidate: SqlCandidate, execute: Callable[[str], Any],
+                 scan_budget: Optional[ScanBudget]) -> tuple:
+        candidate = self._reserve(candidate, scan_budget)
+        if candidate.error is not None:
+            return candidate, None
+        try:
+            return candidate, execute(candidate.sql_query)
+        except Exception as e:
+            self._release(candidate, scan_budget)
+            return candidate._replace(error=e), None
+
+    async def _aexecute(self, candidate: SqlCandidate, execute: Callable[[str], Awaitable[Any]],
+                        scan_budget: Optional[ScanBudget]) -> tuple:
+        candidate = self._reserve(candidate, scan_budget)
+        if candidate.error is not None:
+            return candidate, None
+        try:
+            return candidate, await execute(candidate.sql_query)
+        except Exception as e:
+            self._release(candidate, scan_budget)
+            return candidate._replace(error=e), None
+
+    def _generate_and_validate(self, messages: list, index: int, scan_budget: Optional[ScanBudget],
+                               cancelled: threading.Event) -> SqlCandidate:
+        if cancelled.is_set():
+            return SqlCandidate(index, None, None, error=CancelledError())
+        try:
+            response = self.llm.invoke(self.candidate_messages(messages, index))
+        except Exception as e:
+            return SqlCandidate(index, None, None, error=e)
+        return self._validate(SqlCandidate(index, response, response.content), scan_budget, cancelled)
+
+    async def _agenerate_and_validate(self, messages: list, index: int, scan_budget: Optional[ScanBudget],
+                                      cancelled: threading.Event) -> SqlCandidate:
+        try:
+            response = await self.llm.ainvoke(self.candidate_messages(messages, index))
+        except Exception as e:
+            return SqlCandidate(index, None, None, error=e)
+        return await asyncio.to_thread(self._validate, SqlCandidate(index, response, response.content), scan_budget,
+                                       cancelled)
+
+    @staticmethod
+    def _raise_if_no_query(candidates: List[SqlCandidate]) -> None:
+        # Without a single generated query the LLM itself failed, as it would have in the serial loop.
+        if candidates and all(c.sql_query is None for c in candidates):
+            raise candidates[0].error
+
+    def run(self, messages: list, execute: Callable[[str], Any],
+            scan_budget: Optional[ScanBudget] = None) -> SpeculativeOutcome:
+        """Run one speculative round.
+
+        Args:
+            messages: The SQL generation prompt, system message first and the question last.
+            execute: Runs a validated query and returns its result. Pass it no scan budget: the bytes of the
+                candidate's dry run are charged to `scan_budget` here (and given back if the query fails).
+            scan_budget: If given, candidates that would scan more than its per-query budget are rejected.
+
+        Returns:
+            The SpeculativeOutcome of the round.
+        """
+        candidates = []
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.candidates, thread_name_prefix='sql-candidate')
+        # Every worker runs in its own copy of this thread's context, so callbacks and tracing propagate.
+        contexts = [contextvars.copy_context() for _ in range(self.candidates)]
+        futures = [
+            executor.submit(context.run, self._generate_and_validate, messages, index, scan_budget, cancelled)
+            for index, context in enumerate(contexts)
+        ]
+        try:
+            for future in as_completed(futures):
+                candidate, result = future.result(), None
+                if candidate.error is None:
+                    candidate, result = self._execute(candidate, execute, scan_budget)
+                candidates.append(candidate)
+                if candidate.error is None:
+                    return SpeculativeOutcome(candidate, result, candidates)
+        finally:
+            # LLM calls already running in a worker thread cannot be interrupted; they finish in the background
+            # without a dry run, and their results are never read.
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._raise_if_no_query(candidates)
+        return SpeculativeOutcome(None, None, candidates)
+
+    async def arun(self, messages: list, execute: Callable[[str], Awaitable[Any]],
+                   scan_budget: Optional[ScanBudget] = None) -> SpeculativeOutcome:
+        """Async variant of `run`; `execute` is a coroutine function."""
+        candidates = []
+        cancelled = threading.Event()
+        tasks = [
+            asyncio.create_task(self._agenerate_and_validate(messages, index, scan_budget, cancelled))
+            for index in range(self.candidates)
+        ]
+        try:
+            for next_candidate in asyncio.as_completed(tasks):
+                candidate, result = await next_candidate, None
+                if candidate.error is None:
+                    candidate, result = await self._aexecute(candidate, execute, scan_budget)
+                candidates.append(candidate)
+                if candidate.error is None:
+                    return SpeculativeOutcome(candidate, result, candidates)
+        finally:
+            cancelled.set()
+            for task in tasks:
+                task.cancel()
+            # Wait until the cancelled tasks are done, so no LLM call of this round outlives it.
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._raise_if_no_query(candidates)
+        return SpeculativeOutcome(None, None, candidates)
@@ -1,4 +1,5 @@
 from .agent import SqlAgent
+from .evidence import QueryEvidence, build_query_evidence
 from .state import SqlAgentState
 
-__all__ = ['SqlAgent','SqlAgentState']
\ No newline at end of file
+__all__ = ['SqlAgent','SqlAgentState','QueryEvidence','build_query_evidence']
\ No newline at end of file
@@ -1,13 +1,19 @@
+import asyncio
 import logging
 from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import START, END, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 
 from helper_functions import *
+from result_rendering import render_result
+from speculative_sql import SpeculativeOutcome, SpeculativeSqlGenerator
+from .evidence import build_query_evidence
 from .state import SqlAgentState
 
 
@@ -15,10 +21,18 @@ class SqlAgent:
     def __init__(self):
         self.script_directory = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/")
         self.system_prompt_dict = self._get_system_prompt_dict()
-        self.max_execution_attempts,self.sota_llm_name,self.llm_name = self._get_config()
-        self.llm = self._get_llm(model_name = self.llm_name)
-        self.sota_llm = self._get_llm(model_name=self.sota_llm_name)
-        self.big_query_runner = BigQueryRunner()
+        (self.max_execution_attempts,self.sota_llm_name,self.llm_name,self.max_result_rows,
+         self.max_bytes_per_query,self.max_bytes_per_conversation,self.prune_schema,
+         self.llm_cache_bypass_nodes,self.direct_evidence,self.evidence_max_rows,
+         self.speculative_sql_candidates,self.result_max_tokens) = self._get_config()
+        self.llm_cache = get_shared_llm_cache().for_agent('SQL agent', bypass_nodes=self.llm_cache_bypass_nodes)
+        self.llm = self._get_llm(model_name = self.llm_name, cache=self.llm_cache)
+        self.sota_llm = self._get_llm(model_name=self.sota_llm_name, cache=self.llm_cache)
+        self.big_query_runner = get_big_query_runner()
+        # With more than one candidate, each attempt generates and dry-runs that many queries in parallel.
+        self.speculative_sql = None
+        if self.speculative_sql_candidates > 1:
+            self.speculative_sql = SpeculativeSqlGenerator(self.sota_llm, self.big_query_runner, self.speculative_sql_candidates)
 
     def _get_system_prompt_dict(self):
         system_prompt_dict_path = os.path.join(self.script_directory, 'files','system_prompts.json')
@@ -30,78 +44,217 @@ class SqlAgent:
         config_path = os.path.join(self.script_directory, 'files','config.json')
         with open(config_path, 'rb') as f:
             config = json.load(f)
-        return config['max_execution_attempts'],config['sota_llm_name'],config['llm_name']
+        return (config['max_execution_attempts'],config['sota_llm_name'],config['llm_name'],config['max_result_rows'],
+                config['max_bytes_per_query'],config['max_bytes_per_conversation'],config['prune_schema'],
+                config['llm_cache_bypass_nodes'],config['direct_evidence'],config['evidence_max_rows'],
+                config['speculative_sql_candidates'],config['result_max_tokens'])
 
     @staticmethod
-    def _get_llm(model_name:str):
+    def _get_llm(model_name:str, cache:AgentLLMCache):
         load_dotenv()
-        return ChatGoogleGenerativeAI(model=model_name)
-
-    def _llm_node_sql_query_generator(self,state:SqlAgentState)-> SqlAgentState:
+        return ChatGoogleGenerativeAI(model=model_name, cache=cache)
+
+    def _scan_budget(self, state) -> ScanBudget:
+        # The data analysis agent passes the budget of its conversation; a direct invocation gets one of its own.
+        if state.get('scan_budget') is None:
+            state['scan_budget'] = ScanBudget(
+                max_bytes_per_query=self.max_bytes_per_query,
+                max_bytes_per_conversation=self.max_bytes_per_conversation
+            )
+        return state['scan_budget']
 
+    def _sql_query_generator_context(self, state: SqlAgentState) -> tuple:
         sql_query_generator_prompt_template = PromptTemplate(
             input_variables=['tables_information',"recent_attempts","current_time"],
             template=self.system_prompt_dict['sql_query_generator']
         )
-        tables_information = get_tables_information()
+        if self.prune_schema:
+            tables_information = get_relevant_tables_information(state['question'])
+        else:
+            tables_information = get_tables_information()
         current_time = datetime.now().strftime("%Y-%d-%m %H:%M")
         human_msg = HumanMessage(state['question'],id="1")
         state['messages'].append(human_msg)
 
-        attempt = 1
+        return sql_query_generator_prompt_template, tables_information, current_time, human_msg
+
+    @staticmethod
+    def _sql_query_generator_messages(state: SqlAgentState, context: tuple, previous_attempts: list) -> list:
+        sql_query_generator_prompt_template, tables_information, current_time, human_msg = context
+        attempt_context = "\n\n".join(previous_attempts) if previous_attempts else "None"
+
+        sql_query_generator_prompt = sql_query_generator_prompt_template.format(
+            tables_information=tables_information,
+            recent_attempts=attempt_context,
+            current_time = current_time
+        )
+
+        system_msg = SystemMessage(content=sql_query_generator_prompt,id="2")
+        state['messages'].append(system_msg)
+        return [system_msg,human_msg]
+
+    @staticmethod
+    def _record_generated_sql_query(state: SqlAgentState, response) -> str:
+        log_token_usage(" SQL agent | SQL query generator", response)
+        generated_sql_query = response.content
+        state["messages"].append(AIMessage(content=generated_sql_query,id="3"))
+        return generated_sql_query
+
+    def _record_query_result(self, state: SqlAgentState, generated_sql_query: str, query_result: QueryResult) -> str:
+        # Compact CSV with typed columns; results over the token budget are summarized (see result_rendering.py).
+        execution_result = render_result(query_result.data, total_rows=query_result.total_rows, max_tokens=self.result_max_tokens)
+        state["messages"].append(AIMessage(content=f"Query: {generated_sql_query}\n Query execution result:\n{execution_result}",id="3"))
+        state['sql_query'] = generated_sql_query
+        state['query_result'] = query_result
+        # The plot agent may be waiting for this frame instead of querying the same data itself.
+        if state.get('result_registry') is not None:
+            state['result_registry'].publish(state['question_index'], generated_sql_query, query_result)
+        return execution_result
+
+    @staticmethod
+    def _record_failed_attempt(attempt: int, generated_sql_query: str, error: Exception, previous_attempts: list) -> tuple:
+        err_msg = f"{type(error).__name__}: {error}"
+        previous_attempts.append(f"Attempt {attempt} SQL:\n{generated_sql_query}\nError:\n{err_msg}")
+        logging.error(f" SQl agent | Execution failed for attempt {attempt}. | Error:\n{err_msg} ")
+        return generated_sql_query, err_msg
+
+    @staticmethod
+    def _record_failed_query(state: SqlAgentState, last_sql: str, last_error: str) -> None:
+        state["messages"].append(AIMessage(
+            content=f"Failed to query the SQL database and reached the maximum attempts.\nLast SQL:\n{last_sql}\n\nLast error:\n{last_error}"
+            , id="3"
+        )
+        )
+        if state.get('result_registry') is not None:
+            state['result_registry'].fail(state['question_index'])
+
+    def _record_speculative_outcome(self, state: SqlAgentState, attempt: int, outcome: SpeculativeOutcome,
+                                    previous_attempts: list) -> Optional[tuple]:
+        last_failure = None
+        for candidate in outcome.failures:
+            generated_sql_query = self._record_generated_sql_query(state, candidate.response)
+            last_failure = self._record_failed_attempt(f"{attempt}.{candidate.index + 1}", generated_sql_query,
+                                                       candidate.error, previous_attempts)
+        if outcome.winner is not None:
+            generated_sql_query = self._record_generated_sql_query(state, outcome.winner.response)
+            self._record_query_result(state, generated_sql_query, outcome.result)
+        return last_failure
+
+    def _speculative_sql_query_generator(self, state: SqlAgentState) -> SqlAgentState:
+        context = self._sql_query_generator_context(state)
         previous_attempts = []
-        execution_result = None
         last_sql = None
         last_error = None
 
-        while attempt <= self.max_execution_attempts:
+        for attempt in range(1, self.max_execution_attempts + 1):
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            outcome = self.speculative_sql.run(
+                messages,
+                execute=lambda sql_query: self.big_query_runner.fetch_rows(sql_query=sql_query, max_rows=self.max_result_rows),
+                scan_budget=self._scan_budget(state)
+            )
+            last_sql, last_error = self._record_speculative_outcome(state, attempt, outcome, previous_attempts) or (last_sql, last_error)
+            if outcome.winner is not None:
+                return state
+
+        self._record_failed_query(state, last_sql, last_error)
+        return state
 
-            attempt_context = "\n\n".join(previous_attempts) if previous_attempts else "None"
+    async def _aspeculative_sql_query_generator(self, state: SqlAgentState) -> SqlAgentState:
+        context = await asyncio.to_thread(self._sql_query_generator_context, state)
+        previous_attempts = []
+        last_sql = None
+        last_error = None
 
-            sql_query_generator_prompt = sql_query_generator_prompt_template.format(
-                tables_information=tables_information,
-                recent_attempts=attempt_context,
-                current_time = current_time
+        for attempt in range(1, self.max_execution_attempts + 1):
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            outcome = await self.speculative_sql.arun(
+                messages,
+                execute=lambda sql_query: self.big_query_runner.afetch_rows(sql_query=sql_query, max_rows=self.max_result_rows),
+                scan_budget=self._scan_budget(state)
             )
+            last_sql, last_error = self._record_speculative_outcome(state, attempt, outcome, previous_attempts) or (last_sql, last_error)
+            if outcome.winner is not None:
+                return state
 
-            system_msg = SystemMessage(content=sql_query_generator_prompt,id="2")
-            state['messages'].append(system_msg)
+        self._record_failed_query(state, last_sql, last_error)
+        return state
+
+    def _llm_node_sql_query_generator(self,state:SqlAgentState)-> SqlAgentState:
+        if self.speculative_sql is not None:
+            return self._speculative_sql_query_generator(state)
 
-            response = self.sota_llm.invoke([system_msg,human_msg])
-            generated_sql_query = response.content
-            state["messages"].append(AIMessage(content=generated_sql_query,id="3"))
+        context = self._sql_query_generator_context(state)
+
+        attempt = 1
+        previous_attempts = []
+        execution_result = None
+        last_sql = None
+        last_error = None
+
+        while attempt <= self.max_execution_attempts:
+
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            response = self.sota_llm.invoke(messages)
+            generated_sql_query = self._record_generated_sql_query(state, response)
 
             try:
-                result_df = self.big_query_runner.execute_query(sql_query=generated_sql_query)
-                execution_result = result_df.head(100).to_string(index=False)
-                state["messages"].append(AIMessage(content=f"Query: {generated_sql_query}\n Query execution result :\n {execution_result}",id="3"))
+                # Only the first rows reach the prompt, so only those are downloaded.
+                query_result = self.big_query_runner.fetch_rows(
+                    sql_query=generated_sql_query,
+                    max_rows=self.max_result_rows,
+                    scan_budget=self._scan_budget(state)
+                )
+                execution_result = self._record_query_result(state, generated_sql_query, query_result)
                 break
 
             except Exception as e:
+                last_sql, last_error = self._record_failed_attempt(attempt, generated_sql_query, e, previous_attempts)
+                attempt += 1
 
-                err_msg = f"{type(e).__name__}: {e}"
+        if execution_result is None:
+            self._record_failed_query(state, last_sql, last_error)
 
-                last_error = err_msg
-                last_sql = generated_sql_query
-                previous_attempts.append(f"Attempt {attempt} SQL:\n{generated_sql_query}\nError:\n{err_msg}")
+        return state
 
-                logging.error(f" SQl agent | Execution failed for attempt {attempt}. | Error:\n{err_msg} ")
+    async def _allm_node_sql_query_generator(self,state:SqlAgentState)-> SqlAgentState:
+        if self.speculative_sql is not None:
+            return await self._aspeculative_sql_query_generator(state)
 
-                attempt += 1
+        # The schema catalog may refresh itself from BigQuery, so it is read in a worker thread.
+        context = await asyncio.to_thread(self._sql_query_generator_context, state)
+
+        attempt = 1
+        previous_attempts = []
+        execution_result = None
+        last_sql = None
+        last_error = None
+
+        while attempt <= self.max_execution_attempts:
 
+            messages = self._sql_query_generator_messages(state, context, previous_attempts)
+            response = await self.sota_llm.ainvoke(messages)
+            generated_sql_query = self._record_generated_sql_query(state, response)
 
+            try:
+                query_result = await self.big_query_runner.afetch_rows(
+                    sql_query=generated_sql_query,
+                    max_rows=self.max_result_rows,
+                    scan_budget=self._scan_budget(state)
+                )
+                execution_result = self._record_query_result(state, generated_sql_query, query_result)
+                break
+
+            except Exception as e:
+                last_sql, last_error = self._record_failed_attempt(attempt, generated_sql_query, e, previous_attempts)
+                attempt += 1
 
         if execution_result is None:
-            state["messages"].append(AIMessage(
-                content=f"Failed to query the SQL database and reached the maximum attempts.\nLast SQL:\n{last_sql}\n\nLast error:\n{last_error}"
-                , id="3"
-            )
-            )
+            self._record_failed_query(state, last_sql, last_error)
 
         return state
 
-    def _llm_node_final_answer_generator(self,state:SqlAgentState)-> SqlAgentState:
-
+    def _final_answer_generator_messages(self, state: SqlAgentState) -> list:
         final_answer_generator_prompt_template = PromptTemplate(
             input_variables=['query_execution_result'],
             template=self.system_prompt_dict['final_answer_generator']
@@ -114,8 +267,10 @@ class SqlAgent:
         state['messages'].append(system_msg)
 
         human_msg = HumanMessage(state['question'], id="1")
+        return [system_msg, human_msg]
 
-        response = self.llm.invoke([system_msg, human_msg])
+    @staticmethod
+    def _record_final_answer(state: SqlAgentState, response) -> SqlAgentState:
         sql_agent_response = response.content
 
         state["messages"].append(AIMessage(content=sql_agent_response, id="3"))
@@ -123,14 +278,44 @@ class SqlAgent:
 
         return state
 
+    def _llm_node_final_answer_generator(self,state:SqlAgentState)-> SqlAgentState:
+        response = self.llm.invoke(self._final_answer_generator_messages(state))
+        return self._record_final_answer(state, response)
+
+    async def _allm_node_final_answer_generator(self,state:SqlAgentState)-> SqlAgentState:
+        response = await self.llm.ainvoke(self._final_answer_generator_messages(state))
+        return self._record_final_answer(state, response)
+
+    def _evidence_node(self, state: SqlAgentState) -> SqlAgentState:
+        # Direct evidence mode: the result itself is the answer, and the data analysis agent's final answer
+        # reads it without a second LLM round trip per sub-question.
+        if state.get('query_result') is None:
+            state["response"] = state['messages'][-1].content
+            return state
+
+        evidence = build_query_evidence(state['sql_query'], state['query_result'], max_rows=self.evidence_max_rows)
+        state['evidence'] = evidence
+        state["response"] = evidence.render()
+        state["messages"].append(AIMessage(content=state["response"], id="3"))
+        return state
+
+    async def _aevidence_node(self, state: SqlAgentState) -> SqlAgentState:
+        return self._evidence_node(state)
+
     def get_sql_agent(self)->CompiledStateGraph:
         builder = StateGraph(SqlAgentState)
 
-        builder.add_node('SQL query generator',self._llm_node_sql_query_generator)
-        builder.add_node('Final answer generator', self._llm_node_final_answer_generator)
-
+        # Every node has a sync and an async variant, so the graph runs with invoke and with ainvoke/astream.
+        builder.add_node('SQL query generator',RunnableLambda(self._llm_node_sql_query_generator, afunc=self._allm_node_sql_query_generator))
         builder.add_edge(START, "SQL query generator")
-        builder.add_edge("SQL query generator",'Final answer generator')
-        builder.add_edge('Final answer generator',END)
+
+        if self.direct_evidence:
+            builder.add_node('Evidence formatter', RunnableLambda(self._evidence_node, afunc=self._aevidence_node))
+            builder.add_edge("SQL query generator",'Evidence formatter')
+            builder.add_edge('Evidence formatter',END)
+        else:
+            builder.add_node('Final answer generator', RunnableLambda(self._llm_node_final_answer_generator, afunc=self._allm_node_final_answer_generator))
+            builder.add_edge("SQL query generator",'Final answer generator')
+            builder.add_edge('Final answer generator',END)
 
         return builder.compile()
@@ -0,0 +1,171 @@
+from typing import List, NamedTuple, Set, Tuple
+
+import pandas as pd
+
+from bq_client import BigQueryRunner, QueryResult
+from result_rendering import column_type, format_value, render_rows
+from sql_tokenizer import NUMBER, PUNCTUATION, QUOTED_IDENTIFIER, WORD, SqlTokenizeError, Token, tokenize
+
+
+# Functions that may wrap an aggregate without changing what adding it up means, e.g. ROUND(SUM(x), 2).
+_WRAPPERS = {"ROUND", "CAST", "SAFE_CAST", "COALESCE", "IFNULL"}
+# Words allowed between the aggregate and the alias, e.g. the target type of CAST(SUM(x) AS INT64).
+_WRAPPER_WORDS = {"AS", "INT64", "INTEGER", "FLOAT64", "NUMERIC", "BIGNUMERIC", "DECIMAL"}
+
+
+class QueryEvidence(NamedTuple):
+    """The compact, structured result of one SQL sub-question, handed to the final answer as is."""
+    sql_query: str
+    columns: List[Tuple[str, str]]
+    top_rows: pd.DataFrame
+    fetched_rows: int
+    total_rows: int
+    totals: dict
+    ranges: dict
+
+    def render(self) -> str:
+        """Render the evidence as the plain text the data analysis agent's final answer prompt reads."""
+        lines = [f"Query: {self.sql_query}", f"Result: {self.total_rows} rows"]
+        if self.top_rows.empty:
+            columns = ", ".join(f"{name} ({dtype})" for name, dtype in self.columns)
+            lines.append(f"No rows returned; columns: {columns}")
+        else:
+            # The table header holds the column names and types.
+            shown = len(self.top_rows)
+            label = "All rows" if shown == self.total_rows else f"First {shown} rows"
+            lines.append(f"{label}:")
+            lines.append(render_rows(self.top_rows))
+        scope = "all rows" if self.fetched_rows == self.total_rows else f"the first {self.fetched_rows} rows"
+        if self.totals:
+            totals = ", ".join(f"{name}={format_value(value)}" for name, value in self.totals.items())
+            lines.append(f"Totals of the summed and counted columns over {scope}: {totals}")
+        if self.ranges:
+            ranges = "; ".join(
+                f"{name} min={format_value(low)}, max={format_value(high)}, mean={format_value(mean)}"
+                for name, (low, high, mean) in self.ranges.items()
+            )
+            lines.append(f"Ranges of the other numeric columns over {scope}: {ranges}")
+        return "\n".join(lines)
+
+
+def _top_level_select_items(tokens: List[Token]) -> List[List[Token]]:
+    # The items of the first SELECT outside parentheses (after any WITH clause), split at top-level commas.
+    depth, start = 0, None
+    for i, token in enumerate(tokens):
+        if token.type == PUNCTUATION and token.value in "()":
+            depth += 1 if token.value == "(" else -1
+        elif depth == 0 and token.type == WORD and token.value.upper() == "SELECT":
+            start = i + 1
+            break
+    if start is None:
+        return []
+
+    items, item, depth = [], [], 0
+    for token in tokens[start:]:
+        if token.type == PUNCTUATION and token.value in "()":
+            depth += 1 if token.value == "(" else -1
+        if depth == 0 and token.type == WORD and token.value.upper() == "FROM":
+            break
+        if depth == 0 and token.type == PUNCTUATION and token.value == ",":
+            items.append(item)
+            item = []
+        else:
+            item.append(token)
+    return items + [item] if item else items
+
+
+def _summed_column(item: List[Token]):
+    # Returns the output name of a select item that is a plain SUM(...) or COUNT(...), possibly rounded or
+    # cast, or None. COUNT(DISTINCT ...) is left out: distinct counts of several groups do not add up.
+    if len(item) < 2 or item[-1].type not in (WORD, QUOTED_IDENTIFIER):
+        return None
+    name = item[-1].value.strip("`")
+    expression = item[:-2] if item[-2].type == WORD and item[-2].value.upper() == "AS" else item[:-1]
+
+    i = 0
+    while (i + 1 < len(expression) and expression[i].type == WORD and expression[i].value.upper() in _WRAPPERS
+           and expression[i + 1].value == "("):
+        i += 2
+    if not (i + 1 < len(expression) and expression[i].type == WORD and expression[i + 1].value == "("):
+        return None
+    function = expression[i].value.upper()
+    if function not in ("SUM", "COUNT"):
+        return None
+    if function == "COUNT" and i + 2 < len(expression) and expression[i + 2].value.upper() == "DISTINCT":
+        return None
+
+    depth, end = 0, None
+    for j in range(i + 1, len(expression)):
+        if expression[j].value == "(":
+            depth += 1
+        elif expression[j].value == ")":
+            depth -= 1
+            if depth == 0:
+                end = j
+                break
+    if end is None:
+        return None
+    # Only the closing of the wrappers may follow: their arguments, the CAST target type and parentheses.
+    for token in expression[end + 1:]:
+        if token.type == WORD and token.value.upper() not in _WRAPPER_WORDS:
+            return None
+        if token.type == PUNCTUATION and token.value not in "),":
+            return None
+        if token.type not in (WORD, NUMBER, PUNCTUATION):
+            return None
+    return name
+
+
+def summed_columns(sql_query: str) -> Set[str]:
+    """Return the output columns of a query that are plain SUM or COUNT aggregates, whose values add up.
+
+    Columns such as ids, years, averages, ratios and running totals (window functions) are not included.
+    """
+    try:
+        tokens = tokenize(BigQueryRunner.strip_sql_fence(text=sql_query))
+    except SqlTokenizeError:
+        return set()
+    return {name for name in map(_summed_column, _top_level_select_items(tokens)) if name is not None}
+
+
+def _total(column: pd.Series):
+    total = column.sum()
+    if pd.isna(total):
+        return None
+    return int(total) if pd.api.types.is_integer_dtype(column) else round(float(total), 4)
+
+
+def build_query_evidence(sql_query: str, query_result: QueryResult, max_rows: int) -> QueryEvidence:
+    """Summarize a query result as its columns and types, its first `max_rows` rows and a summary of its numbers.
+
+    Columns the query computes with SUM or COUNT get their total; the other numeric columns (ids, years, averages,
+    ratios, ...) get their min, max and mean, since adding them up would be meaningless. Both are computed over the
+    downloaded rows; `fetched_rows` and `total_rows` tell whether that is all of them.
+    """
+    data = query_result.data
+    if not isinstance(data, pd.DataFrame):
+        data = data.to_pandas()
+
+    numeric_columns = [
+        name for name in data.columns
+        if pd.api.types.is_numeric_dtype(data[name]) and not pd.api.types.is_bool_dtype(data[name])
+    ]
+    totals, ranges = {}, {}
+    # A single row already shows its values; totals and ranges only help when there are several.
+    if len(data) > 1:
+        summed = summed_columns(sql_query)
+        for name in numeric_columns:
+            if name in summed:
+                totals[name] = _total(data[name])
+            elif data[name].notna().any():
+                ranges[name] = (data[name].min(), data[name].max(), data[name].mean())
+
+    return QueryEvidence(
+        sql_query=sql_query,
+        columns=[(str(name), column_type(data[name])) for name in data.columns],
+        top_rows=data.head(max_rows),
+        fetched_rows=len(data),
+        total_rows=query_result.total_rows,
+        totals=totals,
+        ranges=ranges,
+    )
@@ -1,7 +1,17 @@
-from typing import TypedDict
+from typing import TypedDict, Optional
+
+from bq_client import QueryResult, ScanBudget
+from result_registry import ResultRegistry
+from .evidence import QueryEvidence
 
 
 class SqlAgentState(TypedDict):
     question: str
     messages: list
-    response: str
\ No newline at end of file
+    response: str
+    result_registry: Optional[ResultRegistry]
+    question_index: Optional[int]
+    scan_budget: Optional[ScanBudget]
+    sql_query: Optional[str]
+    query_result: Optional[QueryResult]
+    evidence: Optional[QueryEvidence]
@@ -0,0 +1,318 @@
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple
+
+from sql_tokenizer import tokenize, Token, WORD, QUOTED_IDENTIFIER, STRING, NUMBER, PUNCTUATION
+
+
+AGGREGATE_FUNCTIONS = frozenset({
+    "COUNT", "SUM", "AVG", "MIN", "MAX", "COUNTIF", "APPROX_COUNT_DISTINCT", "STDDEV", "VARIANCE",
+})
+
+# BigQuery types and the DuckDB types they are cast to.
+_TYPES = {
+    "INT64": "BIGINT", "INTEGER": "BIGINT", "FLOAT64": "DOUBLE", "FLOAT": "DOUBLE", "NUMERIC": "DECIMAL(38, 9)",
+    "BIGNUMERIC": "DOUBLE", "STRING": "VARCHAR", "BYTES": "BLOB", "BOOL": "BOOLEAN", "DATETIME": "TIMESTAMP",
+    "TIMESTAMP": "TIMESTAMPTZ",
+}
+
+# Functions that only differ in name.
+_RENAMED_FUNCTIONS = {
+    "COUNTIF": "count_if", "LOGICAL_AND": "bool_and", "LOGICAL_OR": "bool_or",
+}
+
+_TWO_CHAR_OPERATORS = frozenset({">=", "<=", "<>", "!=", "||", "=>", "<<", ">>"})
+
+
+class DuckDBTranslation(NamedTuple):
+    """A BigQuery query rewritten for DuckDB.
+
+    `tables` holds the dataset tables the query reads; `external_references` is True if it also names a table
+    of another project or dataset, which a local snapshot cannot serve.
+    """
+    sql: str
+    tables: FrozenSet[str]
+    external_references: bool
+
+
+def _word(value: str) -> Token:
+    return Token(WORD, value)
+
+
+def _punct(value: str) -> Token:
+    return Token(PUNCTUATION, value)
+
+
+def _string(value: str) -> Token:
+    return Token(STRING, "'" + value.replace("'", "''") + "'")
+
+
+def _matching_paren(tokens: List[Token], open_index: int) -> int:
+    depth = 0
+    for i in range(open_index, len(tokens)):
+        if tokens[i].type == PUNCTUATION and tokens[i].value == "(":
+            depth += 1
+        elif tokens[i].type == PUNCTUATION and tokens[i].value == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced parentheses")
+
+
+def _split_arguments(tokens: List[Token]) -> List[List[Token]]:
+    arguments, depth = [[]], 0
+    for token in tokens:
+        if token.type == PUNCTUATION and token.value in "([":
+            depth += 1
+        elif token.type == PUNCTUATION and token.value in ")]":
+            depth -= 1
+        if depth == 0 and token.type == PUNCTUATION and token.value == ",":
+            arguments.append([])
+        else:
+            arguments[-1].append(token)
+    return arguments if arguments != [[]] else []
+
+
+def _join_arguments(arguments: List[List[Token]]) -> List[Token]:
+    joined = []
+    for i, argument in enumerate(arguments):
+        if i:
+            joined.append(_punct(","))
+        joined.extend(argument)
+    return joined
+
+
+def _call(name: str, arguments: List[List[Token]]) -> List[Token]:
+    return [_word(name), _punct("(")] + _join_arguments(arguments) + [_punct(")")]
+
+
+def _parenthesized(tokens: List[Token]) -> List[Token]:
+    return [_punct("(")] + tokens + [_punct(")")]
+
+
+def _cast(tokens: List[Token], type_name: str) -> List[Token]:
+    return [_word("CAST"), _punct("(")] + tokens + [_word("AS"), _word(type_name), _punct(")")]
+
+
+def _part(tokens: List[Token]) -> str:
+    # A date part such as DAY, or WEEK(MONDAY).
+    return " ".join(token.value for token in tokens).upper().replace(" ", "")
+
+
+def _date_arithmetic(operator: str) -> Callable[[List[List[Token]]], List[Token]]:
+    def translate(arguments: List[List[Token]]) -> List[Token]:
+        # DATE_SUB(d, INTERVAL 7 DAY) -> (d - INTERVAL 7 DAY)
+        value, interval = arguments
+        return _parenthesized(value + [_punct(operator)] + interval)
+    return translate
+
+
+def _truncate(result_type: str = None) -> Callable[[List[List[Token]]], List[Token]]:
+    def translate(arguments: List[List[Token]]) -> List[Token]:
+        value, part = arguments[0], _part(arguments[1])
+        if part == "WEEK" or part == "WEEK(SUNDAY)":
+            # BigQuery weeks start on Sunday, DuckDB's on Monday.
+            shifted = _call("date_trunc", [[_string("week")], value + [_punct("+"), _word("INTERVAL"), Token(NUMBER, "1"), _word("DAY")]])
+            truncated = _parenthesized(shifted + [_punct("-"), _word("INTERVAL"), Token(NUMBER, "1"), _word("DAY")])
+        else:
+            unit = "week" if part in ("ISOWEEK", "WEEK(MONDAY)") else part.lower()
+            truncated = _call("date_trunc", [[_string(unit)], value])
+        return _cast(truncated, result_type) if result_type else truncated
+    return translate
+
+
+def _difference(function_name: str) -> Callable[[List[List[Token]]], List[Token]]:
+    def translate(arguments: List[List[Token]]) -> List[Token]:
+        # BigQuery: DATE_DIFF(end, start, part); DuckDB: date_diff('part', start, end).
+        end, start, part = arguments
+        unit = _part(part).lower()
+        unit = "week" if unit.startswith("week") or unit == "isoweek" else unit
+        return _call(function_name, [[_string(unit)], start, end])
+    return translate
+
+
+def _format(arguments: List[List[Token]]) -> List[Token]:
+    # FORMAT_DATE(format, value) -> strftime(value, format)
+    return _call("strftime", [arguments[1], arguments[0]])
+
+
+def _parse(result_type: str = None) -> Callable[[List[List[Token]]], List[Token]]:
+    def translate(arguments: List[List[Token]]) -> List[Token]:
+        parsed = _call("strptime", [arguments[1], arguments[0]])
+        return _cast(parsed, result_type) if result_type else parsed
+    return translate
+
+
+def _safe_divide(arguments: List[List[Token]]) -> List[Token]:
+    numerator, denominator = arguments
+    return _parenthesized(numerator + [_punct("/")] + _call("NULLIF", [denominator, [Token(NUMBER, "0")]]))
+
+
+def _date(arguments: List[List[Token]]) -> List[Token]:
+    if len(arguments) == 3:
+        return _call("make_date", arguments)
+    return _cast(arguments[0], "DATE")
+
+
+def _timestamp(arguments: List[List[Token]]) -> List[Token]:
+    return _cast(arguments[0], "TIMESTAMPTZ")
+
+
+def _cast_function(name: str) -> Callable[[List[List[Token]]], List[Token]]:
+    def translate(arguments: List[List[Token]]) -> List[Token]:
+        tokens = arguments[0]
+        if len(tokens) >= 2 and tokens[-2].type == WORD and tokens[-2].value.upper() == "AS":
+            type_name = _TYPES.get(tokens[-1].value.upper(), tokens[-1].value)
+            tokens = tokens[:-1] + [_word(type_name)]
+        return _call(name, [tokens])
+    return translate
+
+
+def _extract(arguments: List[List[Token]]) -> List[Token]:
+    tokens = arguments[0]
+    part = tokens[0].value.upper() if tokens else ""
+    value = tokens[2:] if len(tokens) > 2 and tokens[1].type == WORD and tokens[1].value.upper() == "FROM" else None
+    if value is None:
+        return _call("EXTRACT", arguments)
+    if part == "DAYOFWEEK":
+        # BigQuery numbers days 1 (Sunday) to 7, DuckDB's dow 0 (Sunday) to 6.
+        return _parenthesized(_call("EXTRACT", [[_word("dow"), _word("FROM")] + value]) + [_punct("+"), Token(NUMBER, "1")])
+    if part == "DATE":
+        return _cast(value, "DATE")
+    part = {"DAYOFYEAR": "doy", "ISOWEEK": "week", "ISOYEAR": "isoyear"}.get(part, part)
+    return _call("EXTRACT", [[_word(part), _word("FROM")] + value])
+
+
+def _no_arguments(name: str) -> Callable[[List[List[Token]]], List[Token]]:
+    return lambda arguments: [_word(name)]
+
+
+_FUNCTIONS: Dict[str, Callable[[List[List[Token]]], List[Token]]] = {
+    "DATE_SUB": _date_arithmetic("-"), "DATE_ADD": _date_arithmetic("+"),
+    "TIMESTAMP_SUB": _date_arithmetic("-"), "TIMESTAMP_ADD": _date_arithmetic("+"),
+    "DATETIME_SUB": _date_arithmetic("-"), "DATETIME_ADD": _date_arithmetic("+"),
+    "DATE_TRUNC": _truncate("DATE"), "TIMESTAMP_TRUNC": _truncate(), "DATETIME_TRUNC": _truncate("TIMESTAMP"),
+    "DATE_DIFF": _difference("date_diff"), "TIMESTAMP_DIFF": _difference("date_sub"),
+    "DATETIME_DIFF": _difference("date_sub"),
+    "FORMAT_DATE": _format, "FORMAT_TIMESTAMP": _format, "FORMAT_DATETIME": _format,
+    "PARSE_DATE": _parse("DATE"), "PARSE_TIMESTAMP": _parse(), "PARSE_DATETIME": _parse("TIMESTAMP"),
+    "SAFE_DIVIDE": _safe_divide, "DATE": _date, "TIMESTAMP": _timestamp,
+    "CAST": _cast_function("CAST"), "SAFE_CAST": _cast_function("TRY_CAST"),
+    "EXTRACT": _extract,
+    "CURRENT_DATE": _no_arguments("current_date"), "CURRENT_TIMESTAMP": _no_arguments("current_timestamp"),
+    "CURRENT_DATETIME": _no_arguments("CAST(current_timestamp AS TIMESTAMP)"),
+}
+
+
+class _Translator:
+    def __init__(self, table_names: Iterable[str], dataset_names: Iterable[str]) -> None:
+        self.table_names = {name.lower() for name in table_names}
+        self.dataset_names = {name.lower() for name in dataset_names}
+        self.tables = set()
+        self.external_references = False
+
+    def _identifier(self, token: Token) -> List[Token]:
+        # `project.dataset.table`, `dataset.table` or `table` -> table, when it is one of the snapshot tables.
+        parts = token.value.strip("`").split(".")
+        if parts[-1].lower() in self.table_names and all(part.lower() in self.dataset_names for part in parts[:-1]):
+            self.tables.add(parts[-1].lower())
+            return [_word(parts[-1])]
+        if len(parts) > 1:
+            self.external_references = True
+        return [Token(QUOTED_IDENTIFIER, ".".join('"' + part.replace('"', '""') + '"' for part in parts))]
+
+    def translate(self, tokens: List[Token]) -> List[Token]:
+        out = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+            if token.type == QUOTED_IDENTIFIER:
+                out.extend(self._identifier(token))
+                i += 1
+                continue
+
+            # Unquoted dataset.table (e.g. thelook_ecommerce.orders).
+            if (token.type == WORD and token.value.lower() in self.dataset_names and following is not None
+                    and following.value == "." and i + 2 < len(tokens) and tokens[i + 2].type == WORD
+                    and tokens[i + 2].value.lower() in self.table_names):
+                self.tables.add(tokens[i + 2].value.lower())
+                out.append(_word(tokens[i + 2].value))
+                i += 3
+                continue
+
+            if token.type == WORD and token.value.lower() in self.table_names and (not out or out[-1].value != "."):
+                self.tables.add(token.value.lower())
+
+            # SELECT * EXCEPT (...) is SELECT * EXCLUDE (...) in DuckDB.
+            if token.type == WORD and token.value.upper() == "EXCEPT" and out and out[-1].value == "*":
+                out.append(_word("EXCLUDE"))
+                i += 1
+                continue
+
+            if token.type == WORD and following is not None and following.type == PUNCTUATION and following.value == "(":
+                name = token.value.upper()
+                end = _matching_paren(tokens, i + 1)
+                arguments = [self.translate(argument) for argument in _split_arguments(tokens[i + 2:end])]
+                if name in _FUNCTIONS:
+                    try:
+                        out.extend(_FUNCTIONS[name](arguments))
+                    except (ValueError, IndexError):
+                        raise ValueError(f"No matching signature for function {name} with {len(arguments)} arguments")
+                else:
+                    out.extend(_call(_RENAMED_FUNCTIONS.get(name, token.value), arguments))
+                i = end + 1
+                continue
+
+            out.append(token)
+            i += 1
+        return out
+
+
+def render(tokens: List[Token]) -> str:
+    """Join tokens back into SQL text."""
+    parts = []
+    for token in tokens:
+        if parts and token.type == PUNCTUATION and (parts[-1] + token.value) in _TWO_CHAR_OPERATORS:
+            parts[-1] += token.value
+        elif parts and (token.value in (".", ",", ")") or parts[-1].endswith((".", "("))):
+            parts[-1] += token.value
+        else:
+            parts.append(token.value)
+    return " ".join(parts)
+
+
+def translate_to_duckdb(sql: str, table_names: Iterable[str],
+                        dataset_names: Iterable[str] = ("bigquery-public-data", "thelook_ecommerce")) -> DuckDBTranslation:
+    """Rewrite a BigQuery Standard SQL query for DuckDB.
+
+    Dataset-qualified table names (backtick-quoted or not) become the bare table names, and the common
+    BigQuery-only functions (DATE_SUB/DATE_ADD, DATE_TRUNC/TIMESTAMP_TRUNC, DATE_DIFF/TIMESTAMP_DIFF,
+    FORMAT_DATE, PARSE_DATE, SAFE_DIVIDE, EXTRACT(DAYOFWEEK ...), CAST to BigQuery types, COUNTIF, ...)
+    are rewritten to their DuckDB equivalents. Everything else is passed through unchanged.
+
+    Args:
+        sql: The BigQuery query.
+        table_names: Names of the tables available in DuckDB.
+        dataset_names: Project and dataset names that may qualify those tables.
+
+    Raises:
+        SqlTokenizeError: If the query cannot be tokenized.
+        ValueError: If its parentheses are unbalanced or a translated function has the wrong number of arguments.
+    """
+    translator = _Translator(table_names, dataset_names)
+    tokens = translator.translate(tokenize(sql))
+    return DuckDBTranslation(render(tokens), frozenset(translator.tables), translator.external_references)
+
+
+def is_aggregate_query(sql: str) -> bool:
+    """Return whether a query aggregates (GROUP BY or an aggregate function), so its result is small."""
+    tokens = tokenize(sql)
+    for token, following in zip(tokens, tokens[1:]):
+        if token.type != WORD:
+            continue
+        word = token.value.upper()
+        if word == "GROUP" and following.type == WORD and following.value.upper() == "BY":
+            return True
+        if word in AGGREGATE_FUNCTIONS and following.type == PUNCTUATION and following.value == "(":
+            return True
+    return False
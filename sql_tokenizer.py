@@ -0,0 +1,117 @@
+from typing import List, NamedTuple
+
+
+WORD = "word"
+QUOTED_IDENTIFIER = "quoted_identifier"
+STRING = "string"
+NUMBER = "number"
+PUNCTUATION = "punctuation"
+
+
+class SqlTokenizeError(ValueError):
+    """Raised when a SQL text has an unterminated string, quoted identifier or comment."""
+    pass
+
+
+class Token(NamedTuple):
+    type: str
+    value: str
+
+
+_STRING_PREFIXES = {"r", "b", "rb", "br"}
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Split a BigQuery SQL text into tokens in a single linear pass.
+
+    Whitespace and comments (`--`, `#` and `/* */`) are dropped. String literals (including
+    triple-quoted, raw and bytes literals) and backtick-quoted identifiers are returned as single
+    tokens, so keywords inside them are never mistaken for SQL.
+
+    Raises:
+        SqlTokenizeError: If a string, quoted identifier or block comment is not terminated.
+    """
+    tokens = []
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+
+        if ch.isspace():
+            i += 1
+
+        elif ch == "#" or sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end + 1
+
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            if end == -1:
+                raise SqlTokenizeError("Unterminated block comment")
+            i = end + 2
+
+        elif ch in ("'", '"'):
+            end = _find_string_end(sql, i)
+            tokens.append(Token(STRING, sql[i:end]))
+            i = end
+
+        elif ch == "`":
+            end = sql.find("`", i + 1)
+            if end == -1:
+                raise SqlTokenizeError("Unterminated quoted identifier")
+            tokens.append(Token(QUOTED_IDENTIFIER, sql[i:end + 1]))
+            i = end + 1
+
+        elif ch.isalpha() or ch == "_":
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] == "_"):
+                j += 1
+            if j < n and sql[j] in ("'", '"') and sql[i:j].lower() in _STRING_PREFIXES:
+                end = _find_string_end(sql, j, raw="r" in sql[i:j].lower())
+                tokens.append(Token(STRING, sql[i:end]))
+                i = end
+            else:
+                tokens.append(Token(WORD, sql[i:j]))
+                i = j
+
+        elif ch.isdigit() or (ch == "." and i + 1 < n and sql[i + 1].isdigit()):
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] == "." or (sql[j] in "+-" and sql[j - 1] in "eE")):
+                j += 1
+            tokens.append(Token(NUMBER, sql[i:j]))
+            i = j
+
+        else:
+            tokens.append(Token(PUNCTUATION, ch))
+            i += 1
+
+    return tokens
+
+
+def _find_string_end(sql: str, start: int, raw: bool = False) -> int:
+    """Return the index just past the string literal whose opening quote is at `start`."""
+    quote = sql[start]
+    delimiter = quote * 3 if sql.startswith(quote * 3, start) else quote
+    i = start + len(delimiter)
+    n = len(sql)
+    while i < n:
+        if sql[i] == "\\" and not raw:
+            i += 2
+        elif sql.startswith(delimiter, i):
+            return i + len(delimiter)
+        elif sql[i] == "\n" and len(delimiter) == 1:
+            break
+        else:
+            i += 1
+    raise SqlTokenizeError("Unterminated string literal")
+
+
+def split_statements(tokens: List[Token]) -> List[List[Token]]:
+    """Group tokens into statements separated by `;`, dropping empty statements."""
+    statements = [[]]
+    for token in tokens:
+        if token.type == PUNCTUATION and token.value == ";":
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return [statement for statement in statements if statement]
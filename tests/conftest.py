@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The agents and shared modules are imported from the project root, as the apps and benchmarks do.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+@pytest.fixture
+def e2e_corpus() -> list:
+    with open(os.path.join(PROJECT_ROOT, "benchmarks", "files", "e2e_corpus.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def scripted_graph(e2e_corpus, tmp_path, monkeypatch):
+    """The data analysis graph on the benchmark's scripted LLM and a small DuckDB snapshot.
+
+    Returns the compiled graph and the query client. The module globals `build_graph` replaces are restored afterwards.
+    """
+    import data_analysis_agent.agent
+    import plot_agent.agent
+    import plot_agent.artifact_store
+    import sql_agent.agent
+    from benchmarks.bench_end_to_end import build_graph
+    from benchmarks.fakes import write_synthetic_snapshot
+    from bq_client import get_big_query_runner
+    from schema_catalog import get_schema_catalog
+
+    runner = get_big_query_runner()
+    for module in (sql_agent.agent, plot_agent.agent, data_analysis_agent.agent):
+        monkeypatch.setattr(module, "ChatGoogleGenerativeAI", module.ChatGoogleGenerativeAI)
+    monkeypatch.setattr(runner, "_client", runner._client)
+    monkeypatch.setattr(runner, "backend", runner.backend)
+    monkeypatch.setattr(get_schema_catalog(), "refresh_interval_seconds", get_schema_catalog().refresh_interval_seconds)
+    monkeypatch.setattr(plot_agent.artifact_store, "_plot_artifact_store", plot_agent.artifact_store._plot_artifact_store)
+
+    snapshot_dir = write_synthetic_snapshot(str(tmp_path / "snapshot"), users=200, orders=500, products=50)
+    graph, client = build_graph(e2e_corpus, snapshot_dir, str(tmp_path / "plots"), llm_latency_seconds=0.0,
+                                node_latency_seconds={}, job_latency_seconds=0.0)
+    runner.query_cache.clear()
+    return graph, client
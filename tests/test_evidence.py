@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from bq_client import QueryResult
+from sql_agent.evidence import build_query_evidence, summed_columns
+
+
+SQL = """
+SELECT o.user_id, EXTRACT(YEAR FROM o.created_at) AS year, COUNT(*) AS orders, ROUND(SUM(oi.sale_price), 2) AS revenue,
+       AVG(oi.sale_price) AS avg_price, COUNT(DISTINCT oi.product_id) AS products
+FROM orders o JOIN order_items oi ON o.order_id = oi.order_id
+GROUP BY 1, 2
+"""
+
+
+def _result(total_rows=None):
+    data = pd.DataFrame({
+        "user_id": [101, 205, 307],
+        "year": [2023, 2024, 2024],
+        "orders": [2, 5, 1],
+        "revenue": [10.5, 20.25, 4.0],
+        "avg_price": [5.25, 4.05, 4.0],
+        "products": [2, 3, 1],
+    })
+    return QueryResult(data=data, total_rows=total_rows or len(data))
+
+
+@pytest.mark.parametrize("sql_query, expected", [
+    (SQL, {"orders", "revenue"}),
+    ("SELECT SUM(x) total FROM t", {"total"}),
+    ("SELECT CAST(SUM(x) AS INT64) AS total, COUNT(1) AS n FROM t", {"total", "n"}),
+    ("SELECT `day`, SUM(x) AS `units` FROM t GROUP BY 1", {"units"}),
+    ("SELECT SUM(a) / SUM(b) AS ratio FROM t", set()),
+    ("SELECT day, SUM(x) OVER (ORDER BY day) AS running FROM t", set()),
+    ("WITH s AS (SELECT SUM(x) AS a FROM t) SELECT a FROM s", set()),
+    ("SELECT MAX(x) AS m, id FROM t", set()),
+    ("```sql\nSELECT COUNT(*) AS n FROM t\n```", {"n"}),
+    ("SELECT 'unterminated FROM t", set()),
+])
+def test_summed_columns(sql_query, expected):
+    assert summed_columns(sql_query) == expected
+
+
+def test_totals_only_for_summed_and_counted_columns():
+    evidence = build_query_evidence(SQL, _result(), max_rows=2)
+
+    assert evidence.totals == {"orders": 8, "revenue": 34.75}
+    assert set(evidence.ranges) == {"user_id", "year", "avg_price", "products"}
+    assert evidence.ranges["year"][:2] == (2023, 2024)
+    assert evidence.fetched_rows == 3
+    assert len(evidence.top_rows) == 2
+
+
+def test_render_labels_totals_and_ranges():
+    text = build_query_evidence(SQL, _result(total_rows=10), max_rows=2).render()
+
+    assert "Result: 10 rows" in text
+    assert "First 2 rows:" in text
+    assert "Totals of the summed and counted columns over the first 3 rows: orders=8, revenue=34.75" in text
+    assert "Ranges of the other numeric columns over the first 3 rows: user_id min=101, max=307" in text
+    assert "year=" not in text
+
+
+def test_single_row_has_no_totals_or_ranges():
+    data = pd.DataFrame({"orders": [8], "revenue": [34.75]})
+    evidence = build_query_evidence(SQL, QueryResult(data=data, total_rows=1), max_rows=5)
+
+    assert evidence.totals == {}
+    assert evidence.ranges == {}
+    assert "Totals" not in evidence.render()
+
+
+def test_empty_result_lists_columns():
+    data = pd.DataFrame({"orders": pd.Series([], dtype="int64")})
+    text = build_query_evidence(SQL, QueryResult(data=data, total_rows=0), max_rows=5).render()
+
+    assert "No rows returned; columns: orders (int)" in text
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from plot_script_runner import PlotScriptError, PlotScriptRunner
+
+PNG_SIGNATURE = b"\x89PNG"
+PLOT_SCRIPT = "fig, ax = plt.subplots()\nax.plot(df['x'], df['y'])\n"
+SLOW_SCRIPT = "while True:\n    pass\n"
+
+
+@pytest.fixture
+def runner():
+    runner = PlotScriptRunner(workers=1, timeout_seconds=2, cpu_seconds=None, memory_bytes=None)
+    yield runner
+    runner.close()
+
+
+@pytest.fixture
+def df() -> pd.DataFrame:
+    return pd.DataFrame({"x": [1, 2, 3], "y": [3, 1, 2]})
+
+
+def test_script_is_rendered_to_png(runner, df):
+    assert runner.run(PLOT_SCRIPT, df).startswith(PNG_SIGNATURE)
+
+
+def test_failing_script_raises_and_keeps_the_worker(runner, df):
+    with pytest.raises(PlotScriptError, match="KeyError"):
+        runner.run("df['missing']", df)
+    assert runner.run(PLOT_SCRIPT, df).startswith(PNG_SIGNATURE)
+
+
+def test_timed_out_worker_is_replaced(runner, df):
+    with pytest.raises(PlotScriptError, match="did not finish"):
+        runner.run(SLOW_SCRIPT, df)
+    assert runner.run(PLOT_SCRIPT, df).startswith(PNG_SIGNATURE)
+
+
+def test_dead_worker_is_not_reused_when_its_replacement_fails_to_start(runner, df, monkeypatch):
+    start_worker = runner._start_worker
+
+    def fail_to_start():
+        raise OSError("no more processes")
+
+    monkeypatch.setattr(runner, "_start_worker", fail_to_start)
+    with pytest.raises(PlotScriptError, match="did not finish"):
+        runner.run(SLOW_SCRIPT, df)
+    # The empty slot retries the start on every run instead of handing out the killed worker.
+    with pytest.raises(PlotScriptError, match="Could not start a plot worker"):
+        runner.run(PLOT_SCRIPT, df)
+
+    monkeypatch.setattr(runner, "_start_worker", start_worker)
+    assert runner.run(PLOT_SCRIPT, df).startswith(PNG_SIGNATURE)
+
+
+def test_worker_that_died_while_idle_is_replaced(runner, df):
+    worker = runner._idle_workers.get()
+    worker.kill()
+    runner._idle_workers.put(worker)
+    assert runner.run(PLOT_SCRIPT, df).startswith(PNG_SIGNATURE)
+
+
+def test_worker_that_dies_after_it_was_acquired_is_replaced(runner, df, monkeypatch):
+    acquire_worker = runner._acquire_worker
+
+    def acquire_dying_worker():
+        worker = acquire_worker()
+        worker.process.kill()
+        worker.process.join()
+        return worker
+
+    monkeypatch.setattr(runner, "_acquire_worker", acquire_dying_worker)
+    with pytest.raises(PlotScriptError, match="died before it received the script"):
+        runner.run(PLOT_SCRIPT, df)
+
+    monkeypatch.setattr(runner, "_acquire_worker", acquire_worker)
+    assert runner.run(PLOT_SCRIPT, df).startswith(PNG_SIGNATURE)
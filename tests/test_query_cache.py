@@ -0,0 +1,89 @@
+import pandas as pd
+
+from bq_client import BigQueryRunner
+from query_cache import QueryResultCache
+from benchmarks.fakes import FakeBigQueryClient
+
+
+def make_runner(cache: QueryResultCache, **kwargs) -> BigQueryRunner:
+    runner = BigQueryRunner(query_cache=cache, **kwargs)
+    runner._client = FakeBigQueryClient(job_latency_seconds=0)
+    return runner
+
+
+def test_fingerprint_ignores_whitespace_comments_keyword_case_and_semicolon():
+    a = "SELECT id FROM `project.dataset.users` WHERE age > 30"
+    b = "select id\n  from `project.dataset.users` -- adults\n  where age > 30;"
+    assert QueryResultCache.fingerprint(a) == QueryResultCache.fingerprint(b)
+
+
+def test_fingerprint_keeps_identifier_and_literal_case():
+    assert (QueryResultCache.fingerprint("SELECT * FROM dataset.Users")
+            != QueryResultCache.fingerprint("SELECT * FROM dataset.users"))
+    assert (QueryResultCache.fingerprint("SELECT * FROM `dataset.Users`")
+            != QueryResultCache.fingerprint("SELECT * FROM `dataset.users`"))
+    assert (QueryResultCache.fingerprint("SELECT * FROM t WHERE country = 'Brazil'")
+            != QueryResultCache.fingerprint("SELECT * FROM t WHERE country = 'brazil'"))
+
+
+def test_fingerprint_depends_on_scope():
+    sql_query = "SELECT COUNT(*) FROM users"
+    duckdb_key = QueryResultCache.fingerprint(sql_query, scope=("duckdb", None, "thelook"))
+    bigquery_key = QueryResultCache.fingerprint(sql_query, scope=("bigquery", None, "thelook"))
+    other_dataset_key = QueryResultCache.fingerprint(sql_query, scope=("bigquery", None, "other"))
+    assert len({duckdb_key, bigquery_key, other_dataset_key}) == 3
+
+
+def test_non_deterministic_queries_are_not_cacheable():
+    assert not QueryResultCache.is_cacheable("SELECT * FROM orders WHERE created_at > CURRENT_DATE() - 7")
+    assert not QueryResultCache.is_cacheable("SELECT * FROM orders ORDER BY rand() LIMIT 10")
+    assert QueryResultCache.is_cacheable("SELECT 'current_date' AS label FROM orders")
+    assert QueryResultCache.is_cacheable("SELECT COUNT(*) FROM orders")
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("query_cache.time.time", lambda: now[0])
+    cache = QueryResultCache(ttl_seconds=60)
+    cache.put("key", pd.DataFrame({"a": [1, 2]}))
+
+    now[0] += 59
+    assert cache.get("key") is not None
+    now[0] += 2
+    assert cache.get("key") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_cached_result_is_a_copy():
+    cache = QueryResultCache()
+    cache.put("key", pd.DataFrame({"a": [1, 2]}))
+    cache.get("key")["a"] = 0
+    assert cache.get("key")["a"].tolist() == [1, 2]
+
+
+def test_runner_serves_repeated_query_from_cache():
+    runner = make_runner(QueryResultCache())
+    first = runner.execute_query("SELECT label, value FROM t")
+    second = runner.execute_query("select label, value from t;")
+    pd.testing.assert_frame_equal(first, second)
+    assert runner.client.queries == 1
+
+
+def test_runners_on_different_backends_or_datasets_do_not_share_results():
+    cache = QueryResultCache()
+    runners = [
+        make_runner(cache, dataset_id="project.first"),
+        make_runner(cache, dataset_id="project.second"),
+        make_runner(cache, dataset_id="project.first", backend="duckdb", snapshot_dir="/unused"),
+    ]
+    for runner in runners:
+        runner.execute_query("SELECT label, value FROM t")
+        assert runner.client.queries == 1
+
+
+def test_runner_does_not_cache_non_deterministic_query():
+    runner = make_runner(QueryResultCache())
+    runner.execute_query("SELECT label, value FROM t WHERE day = CURRENT_DATE()")
+    runner.execute_query("SELECT label, value FROM t WHERE day = CURRENT_DATE()")
+    assert runner.client.queries == 2
+    assert runner.query_cache.stats()["memory_entries"] == 0
@@ -0,0 +1,142 @@
+from datetime import date
+
+import pytest
+
+from data_analysis_agent.question_cache import QuestionCache, normalize_question, resolve_date_window
+
+TODAY = date(2025, 11, 11)
+
+STORED = (
+    "For female customers located in Brazil, how many completed orders did they place per month over the last 6 "
+    "months, and what was the revenue of those completed orders per month, so that the monthly development of "
+    "order count and revenue for this customer group can be compared across the period"
+)
+
+
+def cache_with(question: str) -> QuestionCache:
+    cache = QuestionCache()
+    cache.store(question, chat_response="answer", plot_file_path=None, plot_agent_response=None,
+                data_version="v1", today=TODAY)
+    return cache
+
+
+def lookup(cache: QuestionCache, question: str, data_version: str = "v1"):
+    return cache.lookup(question, data_version=data_version, today=TODAY)
+
+
+@pytest.mark.parametrize("question", [
+    STORED,
+    "For female customers located in Brazil, how many completed orders did they place per month over the past six "
+    "months, and what was the revenue of those completed orders per month, so that the monthly development of "
+    "order count and revenue for this customer group can be compared across the period",
+    "Female users in Brazil: the number of completed orders they placed each month in the last 6 months and the "
+    "revenue of those completed orders per month, to compare the monthly development of the order count and "
+    "revenue of this user group",
+])
+def test_rephrased_question_is_a_hit(question):
+    cache = cache_with(STORED)
+    assert lookup(cache, question).chat_response == "answer"
+
+
+@pytest.mark.parametrize("old, new", [
+    ("Brazil", "Japan"),
+    ("female", "male"),
+    ("completed orders", "returned orders"),
+    ("last 6", "last 3"),
+    ("revenue of those", "profit of those"),
+])
+def test_question_with_a_swapped_entity_is_a_miss(old, new):
+    cache = cache_with(STORED)
+    assert lookup(cache, STORED.replace(old, new)) is None
+    assert cache.stats()["hit_rate"] == 0.0
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Daily orders for the last 14 days", "Show the orders per day over the past two weeks"),
+    ("Top 5 products by revenue", "Show me the top five products by revenue"),
+])
+def test_short_near_duplicates_are_hits(stored, asked):
+    assert lookup(cache_with(stored), asked) is not None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Top 5 products by revenue", "Top 10 products by revenue"),
+    ("Daily orders for the last 14 days", "Daily orders for the last 30 days"),
+    ("Revenue per category", "Revenue per brand"),
+])
+def test_different_numbers_windows_or_dimensions_are_misses(stored, asked):
+    assert lookup(cache_with(stored), asked) is None
+
+
+@pytest.mark.parametrize("text, today, window", [
+    ("orders in the last month", date(2024, 3, 31), ("2024-02-29", "2024-03-31")),
+    ("orders in the last 2 quarters", date(2025, 11, 11), ("2025-05-11", "2025-11-11")),
+    ("orders in the past year", date(2024, 2, 29), ("2023-02-28", "2024-02-29")),
+    ("orders over the past two weeks", date(2025, 11, 11), ("2025-10-28", "2025-11-11")),
+])
+def test_relative_windows_count_calendar_months(text, today, window):
+    assert resolve_date_window(text, today)[0] == window
+
+
+def test_answer_on_an_older_data_version_is_stale():
+    cache = cache_with(STORED)
+    assert lookup(cache, STORED, data_version="v2") is None
+    assert cache.stats()["stale"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_key_holds_the_entity_words():
+    _, female_key = normalize_question("completed orders of female users in Brazil", TODAY)
+    _, male_key = normalize_question("completed orders of male users in Brazil", TODAY)
+    _, women_key = normalize_question("complete orders placed by women customers in Brazil", TODAY)
+    assert female_key != male_key
+    assert female_key == women_key
+
+
+FAILING_QUESTION = {
+    "question": "How many gift cards were redeemed last week?",
+    "explorer": {"questions_for_sql_agent": ["Gift cards redeemed last week"], "plot_description": "",
+                 "plot_data_question_index": None},
+    # Every attempt queries a table the dataset does not have, so the SQL agent runs out of attempts.
+    "sql": {"Gift cards redeemed last week": [
+        "SELECT COUNT(*) AS redeemed FROM `bigquery-public-data.thelook_ecommerce.gift_cards`"
+    ]},
+}
+
+
+@pytest.fixture
+def caching_agent(scripted_graph, e2e_corpus):
+    from data_analysis_agent.agent import DataAnalysisAgent
+
+    # The scripted models read the corpus when an agent creates them.
+    e2e_corpus.append(FAILING_QUESTION)
+    agent = DataAnalysisAgent()
+    agent.question_cache.clear()
+    yield agent
+    agent.question_cache.clear()
+
+
+def test_answer_after_sql_agent_ran_out_of_attempts_is_not_cached(caching_agent):
+    from helper_functions import get_data_version
+    from sql_agent import SqlAgent
+
+    assert caching_agent.question_cache_enabled and not SqlAgent().direct_evidence
+    graph = caching_agent.get_data_analysis_agent()
+
+    final = graph.invoke({"user_question": FAILING_QUESTION["question"], "messages": []})
+
+    assert final["sql_agent_failed"]
+    # Without direct evidence the failure reaches the final answer as the SQL agent's prose.
+    answer = final["sql_agent_response"][0]["Gift cards redeemed last week"]
+    assert not answer.startswith("Failed to query the SQL database")
+    assert caching_agent.question_cache.lookup(final["supervisor_decision"].explore, get_data_version()) is None
+
+
+def test_answer_after_sql_agent_succeeded_is_cached(caching_agent, e2e_corpus):
+    from helper_functions import get_data_version
+
+    graph = caching_agent.get_data_analysis_agent()
+
+    final = graph.invoke({"user_question": e2e_corpus[2]["question"], "messages": []})
+
+    assert not final["sql_agent_failed"]
+    assert caching_agent.question_cache.lookup(final["supervisor_decision"].explore, get_data_version()) is not None
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from result_rendering import render_columns, render_result, render_rows
+
+
+FRAMES = {
+    "aggregate": pd.DataFrame({"month": pd.to_datetime(["2024-01-01", "2024-02-01"]), "orders": [120, 98],
+                               "revenue": [10234.5678, 8812.25]}),
+    "wide": pd.DataFrame({f"column_{i}": [f"value {i}", f"other {i}"] for i in range(15)}
+                         | {"sale_price": [19.990000001, 5.0], "created_at": pd.to_datetime(["2024-01-01 10:30", "2024-01-02 00:00"])}),
+}
+
+
+def test_render_rows_with_and_without_header():
+    df = FRAMES["aggregate"]
+
+    assert render_rows(df).splitlines()[0] == "month (timestamp),orders (int),revenue (float)"
+    assert render_rows(df, header=False) == "2024-01-01,120,10234.6\n2024-02-01,98,8812.25"
+    assert render_rows(df.head(1), fmt="markdown", header=False) == "| 2024-01-01 | 120 | 10234.6 |"
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_plot_prompt_parts_are_not_larger_than_to_string(name):
+    df = FRAMES[name]
+    old = str(df.columns) + df.head(1).to_string()
+    new = render_columns(df) + render_rows(df.head(1), header=False)
+
+    assert len(new) <= len(old)
+
+
+def test_render_result_summarizes_over_budget():
+    df = pd.DataFrame({"id": range(500), "category": ["a", "b"] * 250})
+
+    text = render_result(df, max_tokens=100)
+
+    assert text.startswith("rows: 500\nsummary of all rows:")
+    assert "- category (string): 500 non-null, 2 distinct, top: a (250), b (250)" in text
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+from bq_client import BigQueryRunner, QueryBudgetExceededError, ScanBudget
+from query_cache import QueryResultCache
+from benchmarks.fakes import FakeBigQueryClient
+
+MB = 1024 ** 2
+
+
+class FailingQueryClient(FakeBigQueryClient):
+    """Dry runs succeed; the query itself fails."""
+
+    def query(self, sql_query, job_config=None):
+        if job_config is not None and getattr(job_config, "dry_run", False):
+            return super().query(sql_query, job_config)
+        raise RuntimeError("query failed")
+
+
+def make_runner(client) -> BigQueryRunner:
+    runner = BigQueryRunner(query_cache=QueryResultCache())
+    runner._client = client
+    return runner
+
+
+def test_reserve_charges_the_conversation():
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=25 * MB)
+    budget.reserve(10 * MB)
+    budget.reserve(10 * MB)
+    assert budget.used_bytes == 20 * MB
+
+
+def test_query_over_the_per_query_budget_is_rejected_without_charge():
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=100 * MB)
+    with pytest.raises(QueryBudgetExceededError, match="per-query budget"):
+        budget.reserve(11 * MB)
+    assert budget.used_bytes == 0
+
+
+def test_query_over_the_remaining_conversation_budget_is_rejected():
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=15 * MB)
+    budget.reserve(10 * MB)
+    with pytest.raises(QueryBudgetExceededError, match="conversation budget"):
+        budget.reserve(10 * MB)
+    assert budget.used_bytes == 10 * MB
+
+
+def test_release_gives_bytes_back_and_never_goes_negative():
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=15 * MB)
+    budget.reserve(10 * MB)
+    budget.release(10 * MB)
+    budget.reserve(10 * MB)
+    budget.release(20 * MB)
+    assert budget.used_bytes == 0
+
+
+def test_runner_charges_dry_run_bytes_and_skips_cache_hits():
+    runner = make_runner(FakeBigQueryClient(job_latency_seconds=0, bytes_processed=3 * MB))
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=100 * MB)
+    runner.execute_query("SELECT label, value FROM t", scan_budget=budget)
+    runner.execute_query("SELECT label, value FROM t", scan_budget=budget)
+    assert budget.used_bytes == 3 * MB
+
+
+def test_runner_releases_the_reservation_of_a_failed_query():
+    runner = make_runner(FailingQueryClient(bytes_processed=3 * MB))
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=100 * MB)
+    with pytest.raises(RuntimeError):
+        runner.execute_query("SELECT label, value FROM t", scan_budget=budget)
+    assert budget.used_bytes == 0
+
+
+def test_runner_rejects_query_over_budget_before_running_it():
+    client = FakeBigQueryClient(job_latency_seconds=0, bytes_processed=30 * MB)
+    runner = make_runner(client)
+    budget = ScanBudget(max_bytes_per_query=10 * MB, max_bytes_per_conversation=100 * MB)
+    with pytest.raises(QueryBudgetExceededError):
+        runner.execute_query("SELECT label, value FROM t", scan_budget=budget)
+    assert client.queries == 0
+
+
+def test_one_budget_is_shared_by_the_sub_agents_and_the_turns_of_a_conversation(scripted_graph, e2e_corpus):
+    graph, client = scripted_graph
+    first = graph.invoke({"user_question": e2e_corpus[0]["question"], "messages": []})
+    budget = first["scan_budget"]
+    assert isinstance(budget, ScanBudget)
+    used_after_first_turn = budget.used_bytes
+    assert used_after_first_turn > 0
+
+    second = graph.invoke({"user_question": e2e_corpus[2]["question"], "messages": [],
+                           "memory": first["memory"], "scan_budget": budget})
+    assert second["scan_budget"] is budget
+    assert budget.used_bytes > used_after_first_turn
+
+    # A new conversation starts without a budget and gets a fresh one.
+    other = graph.invoke({"user_question": e2e_corpus[0]["question"], "messages": []})
+    assert other["scan_budget"] is not budget
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+
+import pandas as pd
+
+from schema_catalog import TABLES, SchemaCatalog
+
+
+class FakeRunner:
+    """Answers the catalog's table API calls; `get_table_modified` can be held until `release` is set."""
+
+    def __init__(self, modified: str = "v1") -> None:
+        self.modified = modified
+        self.release = threading.Event()
+        self.release.set()
+        self.checking = threading.Event()
+        self.modified_calls = []
+
+    def get_table_modified(self, table_name: str) -> str:
+        self.modified_calls.append(table_name)
+        self.checking.set()
+        self.release.wait(timeout=5)
+        return self.modified
+
+    def get_table_schema(self, table_name: str) -> list:
+        return [{"name": "id", "type": "INTEGER", "mode": "NULLABLE"}]
+
+    def sample_rows(self, table_name: str, max_rows: int) -> pd.DataFrame:
+        return pd.DataFrame({"id": [1]})
+
+
+def write_seed(path) -> str:
+    path.write_text("\n\n".join(f"Table name: {table}\nseed summary" for table in TABLES), encoding="utf-8")
+    return path.read_text(encoding="utf-8")
+
+
+def test_seed_summary_is_read_without_bigquery(tmp_path):
+    write_seed(tmp_path / "summary.txt")
+    runner = FakeRunner()
+    runner.release.clear()
+    catalog = SchemaCatalog(str(tmp_path / "summary.txt"), str(tmp_path / "metadata.json"), big_query_runner=runner,
+                            refresh_interval_seconds=float("inf"))
+    assert "seed summary" in catalog.get_tables_information()
+    assert not runner.checking.is_set()
+
+
+def test_refresh_saves_to_metadata_and_leaves_the_seed_untouched(tmp_path):
+    seed = write_seed(tmp_path / "summary.txt")
+    catalog = SchemaCatalog(str(tmp_path / "summary.txt"), str(tmp_path / "metadata.json"), big_query_runner=FakeRunner(),
+                            refresh_interval_seconds=0)
+    catalog.get_tables_information()
+    # The first call loads the seed; the next one finds the check due and rebuilds every table.
+    text = catalog.get_tables_information()
+    assert "seed summary" not in text and "name: id, type: INTEGER" in text
+    assert (tmp_path / "summary.txt").read_text(encoding="utf-8") == seed
+
+    metadata = json.loads((tmp_path / "metadata.json").read_text(encoding="utf-8"))
+    assert metadata["table_modified"] == {table: "v1" for table in TABLES}
+    reloaded = SchemaCatalog(str(tmp_path / "summary.txt"), str(tmp_path / "metadata.json"),
+                             big_query_runner=FakeRunner(), refresh_interval_seconds=float("inf"))
+    assert reloaded.get_tables_information() == text
+
+
+def test_readers_are_served_while_a_refresh_waits_for_bigquery(tmp_path):
+    write_seed(tmp_path / "summary.txt")
+    runner = FakeRunner()
+    catalog = SchemaCatalog(str(tmp_path / "summary.txt"), str(tmp_path / "metadata.json"), big_query_runner=runner,
+                            refresh_interval_seconds=float("inf"))
+    catalog.get_tables_information()
+
+    runner.release.clear()
+    catalog.refresh_interval_seconds = 0
+    refresher = threading.Thread(target=catalog.get_tables_information)
+    refresher.start()
+    assert runner.checking.wait(timeout=5)
+
+    start = time.perf_counter()
+    assert "seed summary" in catalog.get_tables_information()
+    assert time.perf_counter() - start < 1
+
+    runner.release.set()
+    refresher.join(timeout=5)
+    assert "seed summary" not in catalog.get_tables_information()
+
+
+def test_refresh_fetches_each_modification_time_once(tmp_path):
+    write_seed(tmp_path / "summary.txt")
+    runner = FakeRunner()
+    catalog = SchemaCatalog(str(tmp_path / "summary.txt"), str(tmp_path / "metadata.json"), big_query_runner=runner,
+                            refresh_interval_seconds=0)
+    catalog.get_tables_information()
+    assert "name: id, type: INTEGER" in catalog.get_tables_information()
+    assert sorted(runner.modified_calls) == sorted(TABLES)
@@ -0,0 +1,97 @@
+import asyncio
+import re
+import time
+from types import SimpleNamespace
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from speculative_sql import SpeculativeSqlGenerator
+
+
+MESSAGES = [SystemMessage("Write BigQuery SQL."), HumanMessage("How many orders were placed?")]
+
+
+class CandidateLLM:
+    """Answers candidate n with `queries[n - 1]` after `delays[n - 1]` seconds, and records cancelled calls."""
+
+    def __init__(self, queries: list, delays: list) -> None:
+        self.queries = queries
+        self.delays = delays
+        self.cancelled = []
+
+    def _candidate(self, messages: list) -> int:
+        return int(re.search(r"Candidate (\d+) of", messages[-1].content).group(1)) - 1
+
+    def invoke(self, messages: list) -> SimpleNamespace:
+        index = self._candidate(messages)
+        time.sleep(self.delays[index])
+        return SimpleNamespace(content=self.queries[index])
+
+    async def ainvoke(self, messages: list) -> SimpleNamespace:
+        index = self._candidate(messages)
+        try:
+            await asyncio.sleep(self.delays[index])
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        return SimpleNamespace(content=self.queries[index])
+
+
+class DryRunner:
+    def __init__(self) -> None:
+        self.dry_runs = []
+
+    def dry_run(self, sql_query: str) -> int:
+        self.dry_runs.append(sql_query)
+        if "bad" in sql_query:
+            raise ValueError(f"invalid query: {sql_query}")
+        return 100
+
+
+def test_first_valid_candidate_wins_and_the_others_skip_their_dry_run():
+    llm, runner = CandidateLLM(["SELECT 1", "SELECT 2", "SELECT 3"], [0.0, 0.3, 0.3]), DryRunner()
+    generator = SpeculativeSqlGenerator(llm, runner, candidates=3)
+
+    outcome = generator.run(MESSAGES, execute=lambda sql: f"rows of {sql}")
+
+    assert outcome.winner.sql_query == "SELECT 1"
+    assert outcome.result == "rows of SELECT 1"
+    # The losing sync calls finish in the background without dry running their queries.
+    time.sleep(0.5)
+    assert runner.dry_runs == ["SELECT 1"]
+
+
+def test_invalid_candidates_are_reported_as_failures():
+    llm, runner = CandidateLLM(["SELECT bad", "SELECT 2"], [0.0, 0.1]), DryRunner()
+    generator = SpeculativeSqlGenerator(llm, runner, candidates=2)
+
+    outcome = generator.run(MESSAGES, execute=lambda sql: "rows")
+
+    assert outcome.winner.sql_query == "SELECT 2"
+    assert [c.sql_query for c in outcome.failures] == ["SELECT bad"]
+
+
+def test_async_round_cancels_the_losing_llm_calls():
+    llm, runner = CandidateLLM(["SELECT 1", "SELECT 2", "SELECT 3"], [0.0, 5.0, 5.0]), DryRunner()
+    generator = SpeculativeSqlGenerator(llm, runner, candidates=3)
+
+    async def execute(sql_query: str) -> str:
+        return f"rows of {sql_query}"
+
+    start = time.perf_counter()
+    outcome = asyncio.run(generator.arun(MESSAGES, execute=execute))
+
+    assert outcome.winner.sql_query == "SELECT 1"
+    assert sorted(llm.cancelled) == [1, 2]
+    assert runner.dry_runs == ["SELECT 1"]
+    assert time.perf_counter() - start < 2
+
+
+def test_all_candidates_failing_returns_no_winner():
+    llm, runner = CandidateLLM(["SELECT bad 1", "SELECT bad 2"], [0.0, 0.0]), DryRunner()
+    generator = SpeculativeSqlGenerator(llm, runner, candidates=2)
+
+    outcome = generator.run(MESSAGES, execute=lambda sql: "rows")
+
+    assert outcome.winner is None
+    assert len(outcome.failures) == 2
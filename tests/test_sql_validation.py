@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+
+from bq_client import BigQueryRunner, InvalidSQLQueryError
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "files",
+                           "sql_validation_corpus.json")
+with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize("query", CORPUS["accepted"])
+def test_corpus_query_is_accepted(query):
+    assert BigQueryRunner.validate_sql_query(query) == query
+
+
+@pytest.mark.parametrize("query", CORPUS["rejected"])
+def test_corpus_query_is_rejected(query):
+    with pytest.raises(InvalidSQLQueryError):
+        BigQueryRunner.validate_sql_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT 'DROP TABLE users' AS note FROM t",
+    "SELECT `delete` FROM t",
+    "SELECT id FROM t -- DELETE FROM t\n",
+    "SELECT REPLACE(name, 'a', 'b') FROM t",
+    "WITH x AS (SELECT 1 AS a) SELECT a FROM x",
+    "```sql\nSELECT 1\n```",
+    "SELECT 1;",
+])
+def test_keywords_in_strings_comments_identifiers_and_function_calls_are_allowed(query):
+    BigQueryRunner.validate_sql_query(query)
+
+
+@pytest.mark.parametrize("query, message", [
+    ("", "empty"),
+    ("SELECT 1; DROP TABLE t", "more than one statement"),
+    ("DELETE FROM t WHERE true", "disallowed command: DELETE"),
+    ("(INSERT INTO t VALUES (1))", "disallowed command: INSERT"),
+    ("SELECT * FROM (DELETE FROM t)", "disallowed command: DELETE"),
+    ("SHOW TABLES", "Only read-only"),
+    ("SELECT 'unterminated", "could not be parsed"),
+])
+def test_invalid_queries_are_rejected_with_a_reason(query, message):
+    with pytest.raises(InvalidSQLQueryError, match=message):
+        BigQueryRunner.validate_sql_query(query)
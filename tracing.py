@@ -0,0 +1,344 @@
+"""Spans of the graph nodes, LLM calls, BigQuery queries and plot renders of each answered question.
+
+`TracingCallbackHandler` turns LangChain callbacks into spans: one root span per graph run, one span per graph node
+(named by its graph path, e.g. "SQL agent/SQL query generator") and one span per chat model call with its token
+usage. Other code adds spans with `get_tracer().span(...)`; they become children of the graph node they run in
+(and are dropped outside a traced run).
+Finished traces are kept in memory for the debug panel and, when `TRACE_EXPORT_PATH` is set, appended to that file
+as OTLP JSON (one `ExportTraceServiceRequest` per line, as read by the OpenTelemetry collector's otlpjsonfile receiver).
+"""
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import var_child_runnable_config
+
+# OTLP span kinds.
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+# OTLP status codes.
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns", "attributes",
+                 "status_code", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns if self.end_ns is not None else self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status_code, "message": self.status_message} if self.status_code else {},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Collects spans into traces, keeps the last `max_traces` finished traces and exports them as OTLP JSON."""
+
+    def __init__(self, service_name: str = "data-analysis-agent", max_traces: int = 20,
+                 export_path: Optional[str] = None) -> None:
+        """Initialize the tracer.
+
+        Args:
+            service_name: `service.name` resource attribute of the exported spans.
+            max_traces: Number of finished traces kept in memory.
+            export_path: If set, every finished trace is appended to this file as one line of OTLP JSON.
+        """
+        self.service_name = service_name
+        self.export_path = export_path
+        self._open_traces: Dict[str, List[Span]] = {}
+        self._finished_traces: deque = deque(maxlen=max_traces)
+        self._run_spans: Dict[Any, Span] = {}
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, parent: Optional[Span] = None,
+                   attributes: Optional[Dict[str, Any]] = None, root: bool = False) -> Span:
+        """Start a span under `parent` (by default the current span); it is recorded when `end_span` is called.
+
+        Args:
+            name: Name of the span.
+            kind: SPAN_KIND_INTERNAL or SPAN_KIND_CLIENT.
+            parent: Parent span. If None, the current span, or a new trace if there is none.
+            attributes: Initial attributes.
+            root: If True, always start a new trace.
+        """
+        if parent is None and not root:
+            parent = self.current_span()
+        if parent is None:
+            span = Span(name, trace_id=secrets.token_hex(16), kind=kind, attributes=attributes)
+        else:
+            span = Span(name, trace_id=parent.trace_id, parent_span_id=parent.span_id, kind=kind, attributes=attributes)
+        with self._lock:
+            self._open_traces.setdefault(span.trace_id, []).append(span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """End `span`. Ending the root span of a trace finishes the trace."""
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.set_error(error)
+        elif span.status_code == STATUS_UNSET:
+            span.status_code = STATUS_OK
+        if span.parent_span_id is not None:
+            return
+
+        with self._lock:
+            spans = self._open_traces.pop(span.trace_id, [])
+            self._finished_traces.append(spans)
+        if self.export_path:
+            self._export([spans])
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+        """Run the body of the `with` block in a span, which becomes the current span for code it calls.
+
+        Outside a traced graph run (no current span) the span is not recorded.
+        """
+        parent = self.current_span()
+        if parent is None:
+            yield Span(name, trace_id="", kind=kind, attributes=attributes)
+            return
+        span = self.start_span(name, kind=kind, parent=parent, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current_span.reset(token)
+            self.end_span(span, error=e)
+            raise
+        _current_span.reset(token)
+        self.end_span(span)
+
+    def current_span(self) -> Optional[Span]:
+        """Return the innermost open span: the one of an enclosing `span` block, else the graph node running now."""
+        span = _current_span.get()
+        if span is not None and span.end_ns is None:
+            return span
+        # LangChain puts the callback manager of the running node into the context; its parent run is the node.
+        config = var_child_runnable_config.get() or {}
+        run_id = getattr(config.get("callbacks"), "parent_run_id", None)
+        if run_id is None:
+            return None
+        with self._lock:
+            return self._run_spans.get(run_id)
+
+    def callback_handler(self) -> "TracingCallbackHandler":
+        """Return a LangChain callback handler recording the graph runs it is passed to into this tracer."""
+        return TracingCallbackHandler(self)
+
+    def _bind_run(self, run_id: Any, span: Span) -> None:
+        with self._lock:
+            self._run_spans[run_id] = span
+
+    def _unbind_run(self, run_id: Any) -> Optional[Span]:
+        with self._lock:
+            return self._run_spans.pop(run_id, None)
+
+    def _run_span(self, run_id: Any) -> Optional[Span]:
+        with self._lock:
+            return self._run_spans.get(run_id)
+
+    def traces(self) -> List[List[Span]]:
+        """Return the finished traces kept in memory, oldest first."""
+        with self._lock:
+            return list(self._finished_traces)
+
+    def to_otlp(self, traces: List[List[Span]]) -> dict:
+        """Return `traces` as an OTLP `ExportTraceServiceRequest`."""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for spans in traces for span in spans],
+                }],
+            }]
+        }
+
+    def export(self, path: str, traces: Optional[List[List[Span]]] = None) -> None:
+        """Append `traces` (by default all finished traces in memory) to `path` as one line of OTLP JSON."""
+        traces = self.traces() if traces is None else traces
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_otlp(traces)) + "\n")
+
+    def _export(self, traces: List[List[Span]]) -> None:
+        try:
+            self.export(self.export_path, traces)
+        except Exception as e:
+            logging.error(f"Failed to export trace to {self.export_path}: {str(e)}")
+
+    def summary(self, trace: Optional[List[Span]] = None) -> List[dict]:
+        """Summarize a trace (by default the last finished one) per span name, slowest first.
+
+        Each row holds the span name, the number of spans, their total and maximum duration in milliseconds, the
+        number of failed spans and the summed token counts, scanned bytes and rows where spans report them.
+        """
+        if trace is None:
+            traces = self.traces()
+            trace = traces[-1] if traces else []
+        rows: Dict[str, dict] = {}
+        for span in trace:
+            row = rows.setdefault(span.name, {"span": span.name, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+            duration_ms = span.duration_ms or 0.0
+            row["count"] += 1
+            row["total_ms"] = round(row["total_ms"] + duration_ms, 1)
+            row["max_ms"] = round(max(row["max_ms"], duration_ms), 1)
+            row["errors"] += span.status_code == STATUS_ERROR
+            for key in ("gen_ai.usage.input_tokens", "gen_ai.usage.output_tokens", "bigquery.bytes_processed",
+                        "bigquery.rows"):
+                if key in span.attributes:
+                    row[key] = row.get(key, 0) + span.attributes[key]
+        return sorted(rows.values(), key=lambda row: row["total_ms"], reverse=True)
+
+
+def _node_path(metadata: dict) -> str:
+    namespace = metadata.get("langgraph_checkpoint_ns", "").split("|")[:-1]
+    return "/".join([part.split(":")[0] for part in namespace if ":" in part] + [metadata["langgraph_node"]])
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records a span per graph run, graph node and chat model call.
+
+    Runs that are neither (the runnables inside a node, nested graphs invoked by a node) get no span of their own;
+    their children are attached to the span of the nearest enclosing node.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracer: Tracer) -> None:
+        self.tracer = tracer
+        self._owned_runs = set()
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: Any, span: Span) -> None:
+        self.tracer._bind_run(run_id, span)
+        with self._lock:
+            self._owned_runs.add(run_id)
+
+    def _end(self, run_id: Any, error: Optional[BaseException] = None) -> None:
+        span = self.tracer._unbind_run(run_id)
+        with self._lock:
+            owned = run_id in self._owned_runs
+            self._owned_runs.discard(run_id)
+        if span is not None and owned:
+            self.tracer.end_span(span, error=error)
+
+    def on_chain_start(self, serialized: Any, inputs: Any, *, run_id: Any, parent_run_id: Any = None,
+                       metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        name = kwargs.get("name") or "graph"
+        parent = self.tracer._run_span(parent_run_id) if parent_run_id is not None else None
+
+        if parent_run_id is None:
+            self._start(run_id, self.tracer.start_span(name, root=True))
+        elif "langgraph_node" in metadata and name == metadata["langgraph_node"]:
+            path = _node_path(metadata)
+            self._start(run_id, self.tracer.start_span(path, parent=parent, attributes={
+                "langgraph.node": metadata["langgraph_node"], "langgraph.step": metadata.get("langgraph_step"),
+            }))
+        elif parent is not None:
+            # Not a span of its own; its children belong to the enclosing node.
+            self.tracer._bind_run(run_id, parent)
+
+    def on_chain_end(self, outputs: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: Any, parent_run_id: Any = None,
+                            metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        model = (kwargs.get("invocation_params") or {}).get("model") or metadata.get("ls_model_name") or "chat model"
+        parent = self.tracer._run_span(parent_run_id) if parent_run_id is not None else None
+        self._start(run_id, self.tracer.start_span(f"llm {model}", kind=SPAN_KIND_CLIENT, parent=parent, attributes={
+            "gen_ai.request.model": model,
+            "langgraph.node": metadata.get("langgraph_node"),
+        }))
+
+    def on_llm_end(self, response: Any, *, run_id: Any, **kwargs: Any) -> None:
+        span = self.tracer._run_span(run_id)
+        if span is not None:
+            generations = response.generations[0] if response.generations else []
+            message = getattr(generations[0], "message", None) if generations else None
+            usage = getattr(message, "usage_metadata", None) or {}
+            span.set_attribute("gen_ai.usage.input_tokens", usage.get("input_tokens"))
+            span.set_attribute("gen_ai.usage.output_tokens", usage.get("output_tokens"))
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, created on first call.
+
+    Traces are exported to the file named by the `TRACE_EXPORT_PATH` environment variable, if it is set.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(export_path=os.getenv("TRACE_EXPORT_PATH") or None)
+        return _tracer